@@ -0,0 +1,310 @@
+"""
+Health record attachments: streaming uploads into a content-addressed
+store on local disk.
+
+An upload is read straight off the request body: a small multipart
+reader picks out the file part and hands its bytes to a BlobWriter,
+which writes them to a temp file in ATTACHMENT_CHUNK_BYTES chunks and
+hashes them (SHA-256) as it goes, so memory per upload stays around one
+chunk whatever the file size. The finished file is renamed to a path
+derived from its hash; if that path already exists the same content
+is stored already, and the temp file is simply dropped. So the same
+vaccine certificate uploaded for three pets is kept once.
+
+Downloads are served by FileResponse, which answers Range requests;
+the strong ETag is the content hash.
+
+Blobs no record points to any more are removed by
+`python cascade.py sweep` (see sweep_unreferenced).
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from config import settings
+from models import Attachment, HealthRecord
+
+logger = logging.getLogger("petpal.attachments")
+
+# The longest header block a part may have
+MAX_PART_HEADER_BYTES = 16 * 1024
+
+# A blob unused for this long, and not referenced, may be swept. Covers
+# the gap between storing a blob and pointing a record at it.
+UNREFERENCED_GRACE = timedelta(hours=1)
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        f"Attachments are limited to {settings.ATTACHMENT_MAX_BYTES} bytes.",
+    )
+
+
+# --- Storage ---
+
+def blob_path(digest: str) -> str:
+    # Two levels of fan-out keep directories small
+    return os.path.join(settings.ATTACHMENT_DIR, digest[:2], digest[2:4], digest)
+
+class BlobWriter:
+    """
+    Receives an upload's bytes, writes them to a temp file one chunk at
+    a time (in a thread, so the event loop never waits on the disk) and
+    hashes them on the way.
+    """
+
+    def __init__(self):
+        tmp_dir = os.path.join(settings.ATTACHMENT_DIR, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        self.file = os.fdopen(fd, "wb", buffering=0)
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.pending = bytearray()
+
+    async def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > settings.ATTACHMENT_MAX_BYTES:
+            raise _too_large()
+        self.pending += data
+        if len(self.pending) >= settings.ATTACHMENT_CHUNK_BYTES:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        if self.pending:
+            chunk, self.pending = self.pending, bytearray()
+            await asyncio.to_thread(self._write_chunk, chunk)
+
+    def _write_chunk(self, chunk: bytearray) -> None:
+        self.hasher.update(chunk)
+        self.file.write(chunk)
+
+    def _close(self) -> None:
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+    async def finish(self) -> str:
+        """Flushes and closes the temp file; returns the content hash."""
+        await self._flush()
+        await asyncio.to_thread(self._close)
+        return self.hasher.hexdigest()
+
+    def discard(self) -> None:
+        if not self.file.closed:
+            self.file.close()
+        try:
+            os.unlink(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+async def store(writer: BlobWriter, content_type: str) -> Dict:
+    """
+    Upserts the Attachment document of a finished upload, then moves the
+    file to its content address (or drops it if that content is stored
+    already). Document first: the sweeper only finds files through their
+    documents, so a file must never exist without one.
+    """
+    digest = await writer.finish()
+    path = blob_path(digest)
+    now = datetime.utcnow()
+    await Attachment.get_motor_collection().update_one(
+        {"_id": digest},
+        {
+            "$set": {"last_used_at": now},
+            "$setOnInsert": {"size": writer.size, "content_type": content_type, "created_at": now},
+        },
+        upsert=True,
+    )
+
+    def place() -> bool:
+        if os.path.exists(path):
+            os.unlink(writer.tmp_path)
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(writer.tmp_path, path)
+        return True
+
+    created = await asyncio.to_thread(place)
+    if not created:
+        logger.info("Attachment %s already stored; deduplicated", digest)
+    return {"id": digest, "size": writer.size, "deduplicated": not created}
+
+
+async def claim(digest: str) -> bool:
+    """
+    Marks a stored blob as in use again, so the sweeper leaves it be
+    while a record is pointed at it. False if there is no such blob.
+    """
+    result = await Attachment.get_motor_collection().update_one(
+        {"_id": digest}, {"$set": {"last_used_at": datetime.utcnow()}}
+    )
+    return result.matched_count > 0
+
+# The path of health.download_attachment, under whatever prefix
+_UPLOAD_URL = re.compile(r"/records/([0-9a-f]{24})/attachment$")
+
+def is_upload_url(url: Optional[str], record_id: Optional[str] = None) -> bool:
+    """
+    Whether `url` is the download URL of an uploaded file (of record
+    `record_id`, if given) rather than a client's own link.
+    """
+    match = _UPLOAD_URL.search(url or "")
+    return match is not None and record_id in (None, match.group(1))
+
+
+# --- Multipart ---
+
+def _boundary(content_type: Optional[str]) -> bytes:
+    if content_type and content_type.lower().startswith("multipart/form-data"):
+        for param in content_type.split(";")[1:]:
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "boundary" and value:
+                return value.strip('"').encode("latin-1")
+    raise HTTPException(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, "Expected a multipart/form-data upload.")
+
+def _part_headers(raw: bytes) -> Tuple[Optional[str], Optional[str], str]:
+    """(field name, filename, content type) of a part."""
+    name = filename = None
+    content_type = "application/octet-stream"
+    for line in raw.decode("latin-1").split("\r\n"):
+        key, _, value = line.partition(":")
+        key = key.strip().lower()
+        if key == "content-disposition":
+            for param in value.split(";")[1:]:
+                k, _, v = param.strip().partition("=")
+                if k.lower() == "name":
+                    name = v.strip('"')
+                elif k.lower() == "filename":
+                    filename = v.strip('"')
+        elif key == "content-type":
+            content_type = value.strip()
+    return name, filename, content_type
+
+async def read_file_field(
+    request: Request, field: str, write: Callable[[bytes], Awaitable[None]]
+) -> Optional[Tuple[str, str]]:
+    """
+    Streams the body of a multipart request, passing the bytes of the
+    first part named `field` to `write` as they arrive; other parts are
+    skipped. Returns that part's (filename, content type), or None if
+    the request has no such part.
+    """
+    delimiter = b"\r\n--" + _boundary(request.headers.get("content-type"))
+    keep = len(delimiter) - 1  # a delimiter may be split across chunks
+    bad = HTTPException(status.HTTP_400_BAD_REQUEST, "Malformed multipart body.")
+
+    # A leading CRLF lets the first boundary match like any other
+    buffer = b"\r\n"
+    state = "data"  # data -> boundary -> headers -> data ... -> done
+    target = False
+    found = None
+
+    async for chunk in request.stream():
+        buffer += chunk
+        while state != "done":
+            if state == "data":
+                index = buffer.find(delimiter)
+                if index == -1:
+                    safe = len(buffer) - keep
+                    if safe > 0:
+                        if target:
+                            await write(buffer[:safe])
+                        buffer = buffer[safe:]
+                    break
+                if target:
+                    await write(buffer[:index])
+                buffer = buffer[index + len(delimiter):]
+                target = False
+                state = "boundary"
+
+            elif state == "boundary":
+                if len(buffer) < 2:
+                    break
+                if buffer.startswith(b"--"):
+                    state = "done"
+                elif buffer.startswith(b"\r\n"):
+                    buffer = buffer[2:]
+                    state = "headers"
+                else:
+                    raise bad
+
+            elif state == "headers":
+                index = buffer.find(b"\r\n\r\n")
+                if index == -1:
+                    if len(buffer) > MAX_PART_HEADER_BYTES:
+                        raise bad
+                    break
+                name, filename, content_type = _part_headers(buffer[:index])
+                buffer = buffer[index + 4:]
+                target = found is None and name == field
+                if target:
+                    found = (filename or field, content_type)
+                state = "data"
+
+        if state == "done":
+            break
+
+    if state != "done":
+        raise bad
+    return found
+
+
+# --- Sweeping ---
+
+async def _remove_blob(digest: str) -> bool:
+    """
+    Deletes the file of a swept blob, unless it was uploaded again in the
+    meantime. The file is moved aside before the document is looked up:
+    store() upserts the document before it looks for the file, so an
+    upload that found the file still in place is always seen here, and
+    the file goes back.
+    """
+    path = blob_path(digest)
+    aside = f"{path}.swept"
+    try:
+        await asyncio.to_thread(os.replace, path, aside)
+    except FileNotFoundError:
+        return False
+    if await Attachment.get_motor_collection().find_one({"_id": digest}, {"_id": 1}):
+        await asyncio.to_thread(os.replace, aside, path)
+        return False
+    await asyncio.to_thread(os.unlink, aside)
+    return True
+
+async def sweep_unreferenced(batch_size: int, pause: float) -> int:
+    """
+    Deletes stored blobs that no health record points to (and that
+    nobody uploaded recently). Returns how many were removed.
+    """
+    blobs = Attachment.get_motor_collection()
+    records = HealthRecord.get_motor_collection()
+    cutoff = datetime.utcnow() - UNREFERENCED_GRACE
+    removed = 0
+    last_id = None
+    while True:
+        filters = {"last_used_at": {"$lt": cutoff}}
+        if last_id:
+            filters["_id"] = {"$gt": last_id}
+        docs = await blobs.find(filters, {"_id": 1}).sort("_id", 1).limit(batch_size).to_list(None)
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+
+        ids = [doc["_id"] for doc in docs]
+        used = set(await records.distinct("attachment_id", {"attachment_id": {"$in": ids}}))
+        for digest in ids:
+            if digest in used:
+                continue
+            # Conditional, so a blob re-uploaded just now survives
+            if await blobs.find_one_and_delete({"_id": digest, "last_used_at": {"$lt": cutoff}}):
+                removed += await _remove_blob(digest)
+        await asyncio.sleep(pause)
+    return removed
@@ -60,7 +60,7 @@ async def login_user(form_data: UserLogin):
         )
         
     # 3. User exists, NOW check the password
-    if not verify_password(form_data.password, user.password_hash):
+    if not await verify_password(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect password. Please try again.", # A more specific error
@@ -97,7 +97,7 @@ async def login_user(form_data: UserLogin):
     user = await User.find_one(User.email == form_data.email)
     
     # 2. Check if user exists AND if the password is correct
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user or not await verify_password(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
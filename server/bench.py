@@ -0,0 +1,634 @@
+"""
+Small load-generation scripts for the PetPal API.
+
+Run them against a live server, e.g.:
+
+    python bench.py login --email me@example.com --password secret
+
+Every scenario prints one JSON line with its numbers, so results can
+be appended to a file and compared between commits.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import httpx
+
+
+# --- Helpers ---
+
+def percentile(samples, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def latency_summary(samples) -> dict:
+    """Summarizes a list of latencies (seconds) in milliseconds."""
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2) if samples else 0.0,
+    }
+
+def report(scenario: str, **numbers):
+    print(json.dumps({"scenario": scenario, **numbers}))
+
+
+class FakePlacesServer:
+    """
+    A tiny local HTTP server that answers every request with a canned
+    Places-style JSON body after `latency` seconds, and counts requests.
+    A share `error_rate` of requests get a 503 instead. Both can be
+    changed while it runs.
+    """
+
+    def __init__(self, latency: float = 0.2, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                self.requests += 1
+                await asyncio.sleep(self.latency)
+                status, body = self.respond()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def respond(self):
+        if random.random() < self.error_rate:
+            return "503 Service Unavailable", b'{"status": "UNAVAILABLE"}'
+        body = json.dumps({"status": "OK", "results": [
+            {"place_id": "fake-1", "name": "Happy Paws Clinic", "vicinity": "Main St",
+             "geometry": {"location": {"lat": 0.0, "lng": 0.0}}, "rating": 4.7},
+        ]}).encode()
+        return "200 OK", body
+
+
+# --- Scenarios ---
+
+async def bench_login(args):
+    """
+    Hammers /api/auth/login while a probe keeps calling a cheap endpoint.
+    If password hashing blocks the event loop, the probe's p99 explodes.
+    """
+    login_url = f"{args.base_url}{args.login_path}"
+    probe_url = f"{args.base_url}{args.probe_path}"
+    deadline = time.perf_counter() + args.duration
+    logins_ok = 0
+    login_latencies = []
+    probe_latencies = []
+
+    async with httpx.AsyncClient(timeout=30) as client:
+
+        async def login_worker():
+            nonlocal logins_ok
+            body = {"email": args.email, "password": args.password}
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.post(login_url, json=body)
+                login_latencies.append(time.perf_counter() - start)
+                if response.status_code == 200:
+                    logins_ok += 1
+
+        async def probe_worker():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await client.get(probe_url)
+                probe_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(args.probe_interval)
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(login_worker() for _ in range(args.concurrency)),
+            probe_worker(),
+        )
+        elapsed = time.perf_counter() - started
+
+    report(
+        "login",
+        concurrency=args.concurrency,
+        logins_per_sec=round(logins_ok / elapsed, 2),
+        login=latency_summary(login_latencies),
+        probe=latency_summary(probe_latencies),
+    )
+
+
+async def bench_hydration(args):
+    """
+    In-process: rows/sec of the Beanie list path (document -> *Public ->
+    response_model validation -> JSON) against fastpath's raw path.
+    Seeds throwaway health records under a random owner and removes them.
+    """
+    from datetime import date, timedelta
+    from beanie import PydanticObjectId
+    from pydantic import TypeAdapter
+    from typing import List
+
+    import fastpath
+    from database import init_db
+    from models import HealthRecord
+    from health import HealthRecordPublic, RECORD_VIEW, map_record_to_public
+
+    await init_db()
+    collection = HealthRecord.get_motor_collection()
+    adapter = TypeAdapter(List[HealthRecordPublic])
+    sort = [("date", -1), ("_id", -1)]
+
+    for size in args.sizes:
+        owner_id = PydanticObjectId()
+        pet_id = PydanticObjectId()
+        docs = [
+            HealthRecord(
+                owner_id=owner_id, pet_id=pet_id,
+                title=f"Checkup #{i}", date=date(2020, 1, 1) + timedelta(days=i % 2000),
+                notes="Routine visit, all good.", tags=["checkup"],
+            )
+            for i in range(size)
+        ]
+        for start in range(0, size, 10_000):
+            await HealthRecord.insert_many(docs[start:start + 10_000])
+        del docs
+
+        try:
+            filters = {"owner_id": owner_id}
+
+            start = time.perf_counter()
+            records = await HealthRecord.find(filters).sort(sort).to_list()
+            adapter.dump_json(adapter.validate_python(
+                [map_record_to_public(r).model_dump() for r in records]
+            ))
+            beanie_secs = time.perf_counter() - start
+            del records
+
+            start = time.perf_counter()
+            await fastpath.list_response(HealthRecord, RECORD_VIEW, filters, sort)
+            raw_secs = time.perf_counter() - start
+        finally:
+            await collection.delete_many({"owner_id": owner_id})
+
+        report(
+            "hydration",
+            rows=size,
+            beanie_rows_per_sec=round(size / beanie_secs),
+            raw_rows_per_sec=round(size / raw_secs),
+            speedup=round(beanie_secs / raw_secs, 2),
+        )
+
+
+async def bench_coalesce(args):
+    """
+    Fires N identical concurrent lookups through a SingleFlight at a local
+    fake Places server. Expect exactly one upstream request per key.
+    """
+    from singleflight import SingleFlight
+
+    flight = SingleFlight()
+    async with FakePlacesServer(latency=args.latency) as upstream, \
+            httpx.AsyncClient(timeout=30) as client:
+
+        async def fetch():
+            response = await client.get(f"{upstream.url}/nearbysearch/json")
+            response.raise_for_status()
+            return response.json()
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(flight.do("nearby:ttnfuc:5000", fetch) for _ in range(args.requests))
+        )
+        elapsed = time.perf_counter() - start
+
+    report(
+        "coalesce",
+        requests=args.requests,
+        upstream_requests=upstream.requests,
+        coalesced=flight.coalesced,
+        identical_results=all(r == results[0] for r in results),
+        elapsed_ms=round(elapsed * 1000, 2),
+    )
+
+
+async def bench_upstream(args):
+    """
+    Drives the shared upstream client (upstream.py) through a healthy
+    phase, a slow phase, an outage and a recovery against a local fake
+    server, and reports per phase how calls ended and how long they took.
+    During the outage the breaker should open and turn slow failures into
+    instant ones; after the reset window one probe closes it again.
+    """
+    import metrics
+    import upstream
+    from config import settings
+
+    settings.UPSTREAM_READ_TIMEOUT = args.read_timeout
+    settings.UPSTREAM_BREAKER_RESET_SECONDS = args.reset
+    client = upstream.build_http_client()
+
+    async with FakePlacesServer(latency=args.latency) as fake:
+        url = f"{fake.url}/nearbysearch/json"
+
+        async def call():
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+                outcome = f"http_{response.status_code}"
+            except upstream.UpstreamUnavailable:
+                outcome = "breaker_open"
+            except httpx.TimeoutException:
+                outcome = "timeout"
+            return outcome, time.perf_counter() - start
+
+        async def phase(name, latency, error_rate):
+            fake.latency, fake.error_rate = latency, error_rate
+            upstream_before = fake.requests
+            results = []
+            for _ in range(args.requests // args.concurrency):
+                results += await asyncio.gather(*(call() for _ in range(args.concurrency)))
+            outcomes = {}
+            for outcome, _ in results:
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            report(
+                "upstream",
+                phase=name,
+                outcomes=outcomes,
+                upstream_requests=fake.requests - upstream_before,
+                latency=latency_summary([secs for _, secs in results]),
+                breaker=metrics.snapshot()["upstream"]["127.0.0.1"]["breaker"]["state"],
+            )
+
+        await phase("healthy", args.latency, 0.0)
+        await phase("slow", args.read_timeout * 2, 0.0)
+        await asyncio.sleep(args.reset)
+        await phase("outage", args.latency, 1.0)
+        await asyncio.sleep(args.reset)
+        await phase("recovered", args.latency, 0.0)
+
+    await client.aclose()
+
+
+async def bench_bulk(args):
+    """
+    Creates N reminders and N health records for a throwaway pet, once
+    through the single-item routes (concurrency requests in flight) and
+    once through the bulk routes, and compares items/sec. Cleans up with
+    the bulk delete routes and deletes the pet.
+    """
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        response = await client.post(args.login_path, json={"email": args.email, "password": args.password})
+        response.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+        response = await client.post(f"{args.pets_path}/", json={"name": "Bench", "species": "dog"})
+        response.raise_for_status()
+        pet_id = response.json()["id"]
+
+        kinds = {
+            "reminders": (args.reminders_path, lambda i: {
+                "pet_id": pet_id, "title": f"Dose #{i}", "due_date": "2030-01-01", "recurrence": "monthly",
+            }),
+            "records": (args.records_path, lambda i: {
+                "pet_id": pet_id, "title": f"Visit #{i}", "date": "2020-01-01", "tags": ["checkup"],
+            }),
+        }
+        try:
+            for kind, (path, make_item) in kinds.items():
+                items = [make_item(i) for i in range(args.items)]
+                created = []
+
+                semaphore = asyncio.Semaphore(args.concurrency)
+
+                async def create_one(item):
+                    async with semaphore:
+                        r = await client.post(f"{path}/", json=item)
+                        r.raise_for_status()
+                        created.append(r.json()["id"])
+
+                start = time.perf_counter()
+                await asyncio.gather(*(create_one(item) for item in items))
+                single_secs = time.perf_counter() - start
+
+                start = time.perf_counter()
+                for offset in range(0, len(items), args.batch_size):
+                    r = await client.post(f"{path}/bulk", json={"items": items[offset:offset + args.batch_size]})
+                    r.raise_for_status()
+                    created += [x["id"] for x in r.json()["results"] if x["id"]]
+                bulk_secs = time.perf_counter() - start
+
+                for offset in range(0, len(created), args.batch_size):
+                    await client.post(f"{path}/bulk/delete", json={"ids": created[offset:offset + args.batch_size]})
+
+                report(
+                    "bulk",
+                    kind=kind,
+                    items=args.items,
+                    single_items_per_sec=round(args.items / single_secs, 1),
+                    bulk_items_per_sec=round(args.items / bulk_secs, 1),
+                    speedup=round(single_secs / bulk_secs, 2),
+                )
+        finally:
+            await client.delete(f"{args.pets_path}/{pet_id}")
+
+
+def _rss_bytes(pid: int) -> int:
+    """Current resident set size of a process (Linux /proc)."""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+async def bench_uploads(args):
+    """
+    Uploads `--files` attachments of `--size-mb` each concurrently and
+    samples the server's RSS (pass its pid; Linux only) meanwhile. With
+    streaming uploads the peak should grow by about one chunk per upload,
+    not by the file size. The bodies are generated on the fly, so the
+    client's memory stays flat too. `--same-file` sends identical
+    content, which the server stores once.
+    """
+    block = random.randbytes(1024 * 1024)
+    boundary = "petpalbench"
+
+    async def body(index: int):
+        yield (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"bench-{index}.bin\"\r\n"
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        if not args.same_file:
+            yield index.to_bytes(8, "big")  # makes each file's hash different
+        for _ in range(args.size_mb):
+            yield block
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=600) as client:
+        response = await client.post(args.login_path, json={"email": args.email, "password": args.password})
+        response.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+        response = await client.post(f"{args.pets_path}/", json={"name": "Bench", "species": "dog"})
+        response.raise_for_status()
+        pet_id = response.json()["id"]
+        try:
+            record_ids = []
+            for i in range(args.files):
+                r = await client.post(f"{args.records_path}/", json={"pet_id": pet_id, "title": f"Upload #{i}", "date": "2020-01-01"})
+                r.raise_for_status()
+                record_ids.append(r.json()["id"])
+
+            baseline = _rss_bytes(args.server_pid)
+            peak = baseline
+            done = asyncio.Event()
+
+            async def sample():
+                nonlocal peak
+                while not done.is_set():
+                    peak = max(peak, _rss_bytes(args.server_pid))
+                    await asyncio.sleep(0.05)
+
+            async def upload(index: int, record_id: str):
+                r = await client.put(
+                    f"{args.records_path}/{record_id}/attachment",
+                    content=body(index),
+                    headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+                )
+                r.raise_for_status()
+
+            sampler = asyncio.create_task(sample())
+            start = time.perf_counter()
+            await asyncio.gather(*(upload(i, record_id) for i, record_id in enumerate(record_ids)))
+            elapsed = time.perf_counter() - start
+            done.set()
+            await sampler
+        finally:
+            await client.delete(f"{args.pets_path}/{pet_id}")
+
+    total_mb = args.files * args.size_mb
+    report(
+        "uploads",
+        files=args.files,
+        size_mb=args.size_mb,
+        same_file=args.same_file,
+        mb_per_sec=round(total_mb / elapsed, 1),
+        server_rss_baseline_mb=round(baseline / 2**20, 1),
+        server_rss_peak_mb=round(peak / 2**20, 1),
+        server_rss_growth_mb=round((peak - baseline) / 2**20, 1),
+    )
+
+
+def _drive(url: str, token: str, concurrency: int, duration: float):
+    """
+    Runs in a client process: GETs `url` as the user of `token` from
+    `concurrency` loops for `duration` seconds. Returns (ok, errors,
+    latencies).
+    """
+    async def run():
+        ok = errors = 0
+        latencies = []
+        deadline = time.perf_counter() + duration
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        headers = {"Authorization": f"Bearer {token}"}
+        async with httpx.AsyncClient(timeout=30, limits=limits, headers=headers) as client:
+
+            async def loop():
+                nonlocal ok, errors
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        response = await client.get(url)
+                        if response.status_code < 400:
+                            ok += 1
+                        else:
+                            errors += 1
+                    except httpx.HTTPError:
+                        errors += 1
+                    latencies.append(time.perf_counter() - start)
+
+            await asyncio.gather(*(loop() for _ in range(concurrency)))
+        return ok, errors, latencies
+
+    return asyncio.run(run())
+
+
+async def _wait_until_up(url: str, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(timeout=2) as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"Server didn't come up at {url}")
+            await asyncio.sleep(0.2)
+
+
+async def bench_workers(args):
+    """
+    Starts serve.py once per worker count (SERVER_WORKERS), logs in as
+    `--email`, drives `--path` (by default the pet list, so every request
+    pays for auth and a Mongo read) from `--client-procs` client
+    processes for `--duration` seconds, then stops it with SIGTERM.
+    Reports requests/sec and latency per worker count, and how long the
+    drain + shutdown took. The server reads the usual settings from the
+    environment / .env; the user must exist in its database.
+    Clients share the machine: use one with more cores than the largest
+    worker count, or the numbers measure the clients.
+    """
+    import multiprocessing
+    import os
+    import signal
+    import subprocess
+    import sys
+    from concurrent.futures import ProcessPoolExecutor
+
+    serve = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py")
+    base_url = f"http://127.0.0.1:{args.port}"
+    url = f"{base_url}{args.path}"
+    loop = asyncio.get_running_loop()
+
+    for workers in args.workers:
+        env = {**os.environ, "SERVER_HOST": "127.0.0.1", "SERVER_PORT": str(args.port), "SERVER_WORKERS": str(workers)}
+        server = subprocess.Popen([sys.executable, serve], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            await _wait_until_up(f"{base_url}/", args.startup_timeout)
+            async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+                response = await client.post(args.login_path, json={"email": args.email, "password": args.password})
+                response.raise_for_status()
+                token = response.json()["access_token"]
+            with ProcessPoolExecutor(args.client_procs, mp_context=multiprocessing.get_context("spawn")) as pool:
+                results = await asyncio.gather(*(
+                    loop.run_in_executor(pool, _drive, url, token, args.concurrency, args.duration)
+                    for _ in range(args.client_procs)
+                ))
+        finally:
+            start = time.perf_counter()
+            server.send_signal(signal.SIGTERM)
+            try:
+                await asyncio.to_thread(server.wait, args.stop_timeout)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            shutdown_secs = time.perf_counter() - start
+
+        report(
+            "workers",
+            workers=workers,
+            requests_per_sec=round(sum(r[0] for r in results) / args.duration, 1),
+            errors=sum(r[1] for r in results),
+            latency=latency_summary([secs for r in results for secs in r[2]]),
+            shutdown_secs=round(shutdown_secs, 2),
+        )
+
+
+# --- CLI ---
+
+def main():
+    parser = argparse.ArgumentParser(description="PetPal API benchmarks")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    sub = parser.add_subparsers(dest="scenario", required=True)
+
+    login = sub.add_parser("login", help="login throughput vs. other endpoint latency")
+    login.add_argument("--email", required=True)
+    login.add_argument("--password", required=True)
+    login.add_argument("--concurrency", type=int, default=16)
+    login.add_argument("--duration", type=float, default=10.0)
+    login.add_argument("--login-path", default="/api/auth/api/auth/login")
+    login.add_argument("--probe-path", default="/")
+    login.add_argument("--probe-interval", type=float, default=0.01)
+    login.set_defaults(run=bench_login)
+
+    hydration = sub.add_parser("hydration", help="list rows/sec: Beanie models vs raw fast path")
+    hydration.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    hydration.set_defaults(run=bench_hydration)
+
+    coalesce = sub.add_parser("coalesce", help="single-flight against a local fake Places server")
+    coalesce.add_argument("--requests", type=int, default=500)
+    coalesce.add_argument("--latency", type=float, default=0.2)
+    coalesce.set_defaults(run=bench_coalesce)
+
+    upstream = sub.add_parser("upstream", help="retries and circuit breaker against a flaky fake server")
+    upstream.add_argument("--requests", type=int, default=200)
+    upstream.add_argument("--concurrency", type=int, default=10)
+    upstream.add_argument("--latency", type=float, default=0.02)
+    upstream.add_argument("--read-timeout", type=float, default=0.5)
+    upstream.add_argument("--reset", type=float, default=2.0)
+    upstream.set_defaults(run=bench_upstream)
+
+    bulk = sub.add_parser("bulk", help="items/sec: single-item create routes vs. bulk routes")
+    bulk.add_argument("--email", required=True)
+    bulk.add_argument("--password", required=True)
+    bulk.add_argument("--items", type=int, default=500)
+    bulk.add_argument("--batch-size", type=int, default=500)
+    bulk.add_argument("--concurrency", type=int, default=8)
+    bulk.add_argument("--login-path", default="/api/auth/api/auth/login")
+    bulk.add_argument("--pets-path", default="/api/pets/api/pets")
+    bulk.add_argument("--reminders-path", default="/api/reminders/api/reminders")
+    bulk.add_argument("--records-path", default="/api/health/api/records")
+    bulk.set_defaults(run=bench_bulk)
+
+    uploads = sub.add_parser("uploads", help="server peak RSS during concurrent large attachment uploads")
+    uploads.add_argument("--email", required=True)
+    uploads.add_argument("--password", required=True)
+    uploads.add_argument("--server-pid", type=int, required=True)
+    uploads.add_argument("--files", type=int, default=4)
+    uploads.add_argument("--size-mb", type=int, default=200)
+    uploads.add_argument("--same-file", action="store_true")
+    uploads.add_argument("--login-path", default="/api/auth/api/auth/login")
+    uploads.add_argument("--pets-path", default="/api/pets/api/pets")
+    uploads.add_argument("--records-path", default="/api/health/api/records")
+    uploads.set_defaults(run=bench_uploads)
+
+    workers = sub.add_parser("workers", help="requests/sec of serve.py vs. number of workers")
+    workers.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    workers.add_argument("--email", required=True)
+    workers.add_argument("--password", required=True)
+    workers.add_argument("--login-path", default="/api/auth/api/auth/login")
+    workers.add_argument("--path", default="/api/pets/api/pets/")
+    workers.add_argument("--port", type=int, default=8099)
+    workers.add_argument("--client-procs", type=int, default=4)
+    workers.add_argument("--concurrency", type=int, default=32)
+    workers.add_argument("--duration", type=float, default=10.0)
+    workers.add_argument("--startup-timeout", type=float, default=60.0)
+    workers.add_argument("--stop-timeout", type=float, default=60.0)
+    workers.set_defaults(run=bench_workers)
+
+    args = parser.parse_args()
+    asyncio.run(args.run(args))
+
+
+if __name__ == "__main__":
+    main()
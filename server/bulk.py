@@ -0,0 +1,178 @@
+"""
+Shared plumbing for the bulk create/update/delete routes.
+
+A bulk request is validated item by item, ownership is checked for all
+items with one query, and the writes go out as one unordered
+insert_many / bulk_write. Every item gets its own result (status, id,
+error), so one bad item never fails the rest.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Type
+
+from beanie import Document, PydanticObjectId
+from beanie.odm.utils.encoder import Encoder
+from fastapi import status
+from pydantic import BaseModel, Field, ValidationError
+from pymongo import DeleteOne
+from pymongo.errors import BulkWriteError
+
+from versions import record_deletions
+
+# Upper bound on items per bulk request
+MAX_BULK_ITEMS = 500
+
+_encoder = Encoder(to_db=True)
+
+
+# --- Schemas ---
+
+class BulkRequest(BaseModel):
+    """Items are validated one by one, so they arrive as plain objects."""
+    items: List[Dict[str, Any]] = Field(..., min_length=1, max_length=MAX_BULK_ITEMS)
+
+class BulkDeleteRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=MAX_BULK_ITEMS)
+
+class BulkItemResult(BaseModel):
+    index: int                      # position in the request
+    status: int                     # HTTP-style status for this item
+    id: Optional[str] = None
+    error: Optional[Any] = None
+
+class BulkResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BulkItemResult]
+
+
+class BulkResults:
+    """Collects one result per request item."""
+
+    def __init__(self):
+        self._by_index: Dict[int, BulkItemResult] = {}
+
+    def ok(self, index: int, status_code: int, id=None) -> None:
+        self._by_index[index] = BulkItemResult(
+            index=index, status=status_code, id=str(id) if id is not None else None
+        )
+
+    def fail(self, index: int, status_code: int, error: Any, id=None) -> None:
+        self._by_index[index] = BulkItemResult(
+            index=index, status=status_code, error=error, id=str(id) if id is not None else None
+        )
+
+    def failed(self, index: int) -> bool:
+        result = self._by_index.get(index)
+        return result is not None and result.status >= 400
+
+    def response(self) -> BulkResponse:
+        results = [self._by_index[i] for i in sorted(self._by_index)]
+        failed = sum(1 for r in results if r.status >= 400)
+        return BulkResponse(succeeded=len(results) - failed, failed=failed, results=results)
+
+
+# --- Helpers ---
+
+def parse_items(
+    schema: Type[BaseModel], items: List[dict], results: BulkResults
+) -> List[Tuple[int, BaseModel]]:
+    """Validates each item against `schema`; invalid ones are failed with 422."""
+    parsed = []
+    for index, item in enumerate(items):
+        try:
+            parsed.append((index, schema.model_validate(item)))
+        except ValidationError as e:
+            results.fail(index, status.HTTP_422_UNPROCESSABLE_ENTITY, e.errors(include_url=False, include_context=False))
+    return parsed
+
+def parse_id(index: int, value: Any, results: BulkResults, what: str) -> Optional[PydanticObjectId]:
+    try:
+        return PydanticObjectId(value)
+    except Exception:
+        results.fail(index, status.HTTP_400_BAD_REQUEST, f"Invalid {what} ID format.")
+        return None
+
+async def owned_ids(
+    model: Type[Document], ids: Iterable[PydanticObjectId], owner_id: PydanticObjectId
+) -> Set[PydanticObjectId]:
+    """Which of `ids` exist and belong to `owner_id`, in one query."""
+    ids = list(set(ids))
+    if not ids:
+        return set()
+    cursor = model.get_motor_collection().find(
+        {"_id": {"$in": ids}, "owner_id": owner_id}, {"_id": 1}
+    )
+    return {doc["_id"] async for doc in cursor}
+
+def encode(fields: dict) -> dict:
+    """Turns model field values into what Mongo stores (dates, ids...)."""
+    return _encoder.encode(fields)
+
+async def insert_many(
+    model: Type[Document], docs: List[Tuple[int, Document]], results: BulkResults
+) -> None:
+    """Unordered insert_many; items whose insert fails are failed with 500."""
+    if not docs:
+        return
+    for _, doc in docs:
+        doc.id = doc.id or PydanticObjectId()
+    write_errors = {}
+    try:
+        await model.insert_many([doc for _, doc in docs], ordered=False)
+    except BulkWriteError as e:
+        write_errors = {err["index"]: err.get("errmsg", "Write failed") for err in e.details["writeErrors"]}
+    for position, (index, doc) in enumerate(docs):
+        if position in write_errors:
+            results.fail(index, status.HTTP_500_INTERNAL_SERVER_ERROR, write_errors[position])
+        else:
+            results.ok(index, status.HTTP_201_CREATED, doc.id)
+
+async def bulk_write(
+    model: Type[Document], ops: List[Tuple[int, PydanticObjectId, Any]], results: BulkResults
+) -> int:
+    """
+    Unordered bulk_write of (index, id, operation) triples. The targets
+    were checked beforehand, so an operation that doesn't fail succeeded.
+    Returns how many documents matched; callers whose filters carry a
+    precondition compare it with len(ops).
+    """
+    if not ops:
+        return 0
+    write_errors = {}
+    try:
+        result = await model.get_motor_collection().bulk_write([op for _, _, op in ops], ordered=False)
+        matched = result.matched_count + result.deleted_count
+    except BulkWriteError as e:
+        write_errors = {err["index"]: err.get("errmsg", "Write failed") for err in e.details["writeErrors"]}
+        matched = e.details.get("nMatched", 0) + e.details.get("nRemoved", 0)
+    for position, (index, id, _) in enumerate(ops):
+        if position in write_errors:
+            results.fail(index, status.HTTP_500_INTERNAL_SERVER_ERROR, write_errors[position], id)
+        else:
+            results.ok(index, status.HTTP_200_OK, id)
+    return matched
+
+async def bulk_delete(
+    model: Type[Document], ids: List[str], owner_id: PydanticObjectId, what: str, kind: str
+) -> BulkResponse:
+    """
+    Deletes the owner's documents among `ids`; the rest are failed with
+    404. Their tombstones (of `kind`) are written first, as cascade does.
+    """
+    results = BulkResults()
+    parsed = [(i, parse_id(i, value, results, what)) for i, value in enumerate(ids)]
+    parsed = [(i, obj_id) for i, obj_id in parsed if obj_id is not None]
+
+    owned = await owned_ids(model, (obj_id for _, obj_id in parsed), owner_id)
+    ops, seen = [], set()
+    for index, obj_id in parsed:
+        if obj_id not in owned:
+            results.fail(index, status.HTTP_404_NOT_FOUND, f"{what} not found.", obj_id)
+        elif obj_id in seen:
+            results.ok(index, status.HTTP_200_OK, obj_id)  # listed twice, deleted once
+        else:
+            seen.add(obj_id)
+            ops.append((index, obj_id, DeleteOne({"_id": obj_id, "owner_id": owner_id})))
+
+    await record_deletions(owner_id, kind, seen)
+    await bulk_write(model, ops, results)
+    return results.response()
@@ -0,0 +1,217 @@
+"""
+Cascading pet deletes, and a sweeper for the orphans left before them.
+
+Deleting a pet removes the Pet document at once and queues a
+DeletionJob. The job removes the pet's health records and reminders in
+batches of CASCADE_BATCH_SIZE (ids read through the pet_id indexes,
+then one delete_many), pausing CASCADE_PAUSE_SECONDS in between. Each
+batch leaves tombstones for delta sync (before it is deleted), bumps the
+owner's version and updates the job, which clients poll at
+GET /api/pets/deletions/{id}.
+
+Jobs live in Mongo, so one cut short by a restart or a dead worker is
+resumed at startup; deleting again is harmless.
+
+A record or reminder created for a pet while it is being deleted can
+still slip through; the sweeper finds those and anything older, and
+removes attachment and photo files nothing uses any more:
+
+    python cascade.py sweep [--batch-size N] [--pause SECONDS]
+"""
+import argparse
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from beanie import PydanticObjectId
+from pymongo import ReturnDocument
+
+import attachments
+import photos
+from config import settings
+from models import Pet, HealthRecord, Reminder, DeletionJob
+from versions import bump_version, bump_versions, record_deletions
+
+logger = logging.getLogger("petpal.cascade")
+
+# Everything that hangs off a pet, as (tombstone kind, model)
+CHILDREN = (("record", HealthRecord), ("reminder", Reminder))
+
+
+async def _delete_batch(
+    model, kind: str, owner_id: PydanticObjectId, filters: dict, limit: int
+) -> List[PydanticObjectId]:
+    """
+    Deletes up to `limit` documents matching `filters`; returns their ids.
+    Tombstones are written first: if we die in between, the documents
+    are still there for the resumed job, instead of gone without a trace
+    for delta-sync clients.
+    """
+    collection = model.get_motor_collection()
+    ids = [doc["_id"] async for doc in collection.find(filters, {"_id": 1}).limit(limit)]
+    if ids:
+        await record_deletions(owner_id, kind, ids)
+        await collection.delete_many({**filters, "_id": {"$in": ids}})
+    return ids
+
+
+# --- Jobs ---
+
+async def create_job(owner_id: PydanticObjectId, pet_id: PydanticObjectId) -> DeletionJob:
+    job = DeletionJob(owner_id=owner_id, pet_id=pet_id)
+    await job.insert()
+    return job
+
+async def _claim(job_id: PydanticObjectId) -> Optional[dict]:
+    """Marks the job running, unless another worker is running it."""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=settings.CASCADE_STALE_SECONDS)
+    return await DeletionJob.get_motor_collection().find_one_and_update(
+        {
+            "_id": job_id,
+            "$or": [
+                {"status": {"$in": ["pending", "failed"]}},
+                {"status": "running", "heartbeat_at": {"$lt": stale}},
+            ],
+        },
+        {"$set": {"status": "running", "heartbeat_at": now, "error": None}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+async def run_job(job_id: PydanticObjectId) -> None:
+    job = await _claim(job_id)
+    if job is None:
+        return
+    jobs = DeletionJob.get_motor_collection()
+    owner_id = job["owner_id"]
+    try:
+        for kind, model in CHILDREN:
+            filters = {"pet_id": job["pet_id"], "owner_id": owner_id}
+            while True:
+                ids = await _delete_batch(model, kind, owner_id, filters, settings.CASCADE_BATCH_SIZE)
+                if ids:
+                    await bump_version(owner_id)
+                await jobs.update_one(
+                    {"_id": job_id},
+                    {"$inc": {f"deleted.{kind}": len(ids)}, "$set": {"heartbeat_at": datetime.utcnow()}},
+                )
+                if len(ids) < settings.CASCADE_BATCH_SIZE:
+                    break
+                await asyncio.sleep(settings.CASCADE_PAUSE_SECONDS)
+    except Exception as e:
+        logger.exception("Deletion job %s failed", job_id)
+        await jobs.update_one({"_id": job_id}, {"$set": {"status": "failed", "error": str(e)}})
+        return
+    await jobs.update_one(
+        {"_id": job_id}, {"$set": {"status": "done", "finished_at": datetime.utcnow()}}
+    )
+
+
+class CascadeRunner:
+    """Runs deletion jobs as tasks of this process."""
+
+    def __init__(self):
+        self._tasks: Dict[PydanticObjectId, asyncio.Task] = {}
+
+    def start(self, job_id: PydanticObjectId) -> None:
+        if job_id in self._tasks:
+            return
+        task = asyncio.create_task(run_job(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def resume(self) -> int:
+        """Starts every job that isn't done and isn't being run elsewhere."""
+        stale = datetime.utcnow() - timedelta(seconds=settings.CASCADE_STALE_SECONDS)
+        cursor = DeletionJob.get_motor_collection().find(
+            {"$or": [
+                {"status": {"$in": ["pending", "failed"]}},
+                {"status": "running", "heartbeat_at": {"$lt": stale}},
+            ]},
+            {"_id": 1},
+        )
+        count = 0
+        async for doc in cursor:
+            self.start(doc["_id"])
+            count += 1
+        return count
+
+    async def close(self) -> None:
+        """Cancels running jobs; they are resumed at the next startup."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+runner = CascadeRunner()
+
+
+# --- Orphan Sweeper ---
+
+async def sweep_orphans(batch_size: int, pause: float) -> Dict[str, int]:
+    """
+    Walks each child collection in _id order, `batch_size` documents at
+    a time, and deletes the ones whose pet no longer exists. Returns
+    how many were removed per kind.
+    """
+    pets = Pet.get_motor_collection()
+    removed = {}
+    for kind, model in CHILDREN:
+        collection = model.get_motor_collection()
+        removed[kind] = 0
+        last_id = None
+        while True:
+            filters = {"_id": {"$gt": last_id}} if last_id else {}
+            docs = await collection.find(filters, {"pet_id": 1, "owner_id": 1}).sort("_id", 1).limit(batch_size).to_list(None)
+            if not docs:
+                break
+            last_id = docs[-1]["_id"]
+
+            pet_ids = list({doc["pet_id"] for doc in docs})
+            alive = {doc["_id"] async for doc in pets.find({"_id": {"$in": pet_ids}}, {"_id": 1})}
+            by_owner = defaultdict(list)
+            for doc in docs:
+                if doc["pet_id"] not in alive:
+                    by_owner[doc["owner_id"]].append(doc["_id"])
+
+            if by_owner:
+                # Tombstones first, as in _delete_batch
+                for owner_id, ids in by_owner.items():
+                    await record_deletions(owner_id, kind, ids)
+                orphans = [doc_id for ids in by_owner.values() for doc_id in ids]
+                result = await collection.delete_many({"_id": {"$in": orphans}})
+                removed[kind] += result.deleted_count
+                await bump_versions(by_owner)
+                logger.info("Swept %d orphaned %ss", result.deleted_count, kind)
+
+            await asyncio.sleep(pause)
+    return removed
+
+
+async def _sweep(batch_size: int, pause: float) -> None:
+    from database import init_db
+    await init_db()
+    removed = await sweep_orphans(batch_size, pause)
+    print("Removed orphans: " + ", ".join(f"{count} {kind}s" for kind, count in removed.items()))
+    blobs = await attachments.sweep_unreferenced(batch_size, pause)
+    print(f"Removed {blobs} unreferenced attachment files")
+    photo_files = await photos.sweep_unreferenced(batch_size, pause)
+    print(f"Removed {photo_files} unreferenced photo files")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PetPal cascading deletes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sweep = sub.add_parser("sweep", help="remove records and reminders whose pet is gone, and unused attachment and photo files")
+    sweep.add_argument("--batch-size", type=int, default=settings.CASCADE_BATCH_SIZE)
+    sweep.add_argument("--pause", type=float, default=settings.CASCADE_PAUSE_SECONDS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_sweep(args.batch_size, args.pause))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 
 class Settings(BaseSettings):
     """
@@ -17,6 +18,88 @@ class Settings(BaseSettings):
     # --- ADD THIS LINE ---
     GOOGLE_PLACES_API_KEY: str
 
+    # --- Auth principal cache (security.py) ---
+    PRINCIPAL_CACHE_SIZE: int = 4096
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+
+    # --- /api/metrics (metrics.py): disabled unless a token is set ---
+    METRICS_TOKEN: Optional[str] = None
+
+    # --- Production server (serve.py) ---
+    SERVER_APP: str = "main:app"
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0                  # 0: one per usable CPU
+    SERVER_DRAIN_SECONDS: int = 20           # on SIGTERM, in-flight requests get this long
+    SERVER_KEEPALIVE_SECONDS: int = 5
+    SERVER_BACKLOG: int = 2048
+    SERVER_ACCESS_LOG: bool = False
+
+    # --- bcrypt thread pool (security.py) ---
+    PASSWORD_HASH_WORKERS: int = 4
+
+    # --- List endpoints: raw Motor reads, no per-row models (fastpath.py) ---
+    FAST_LIST_READS: bool = True
+
+    # --- Reminder scheduler (scheduler.py) ---
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_HORIZON_SECONDS: int = 300     # how far ahead we load due reminders
+    SCHEDULER_RELOAD_SECONDS: int = 15       # how often the horizon is re-read
+    SCHEDULER_BATCH_SIZE: int = 100
+    SCHEDULER_LEASE_SECONDS: int = 30
+    REMINDER_SINK: str = "log"               # "log" or "webhook"
+    REMINDER_WEBHOOK_URL: Optional[str] = None
+
+    # --- Cascading pet deletes and the orphan sweeper (cascade.py) ---
+    CASCADE_BATCH_SIZE: int = 500
+    CASCADE_PAUSE_SECONDS: float = 0.05      # between batches, to spare the primary
+    CASCADE_STALE_SECONDS: int = 60          # a running job silent this long is resumed
+
+    # --- Health record attachments (attachments.py) ---
+    ATTACHMENT_DIR: str = "attachments"
+    ATTACHMENT_MAX_BYTES: int = 256 * 1024 * 1024
+    ATTACHMENT_CHUNK_BYTES: int = 1024 * 1024
+
+    # --- Pet photos (photos.py); resizing needs Pillow ---
+    PHOTO_DIR: str = "photos"
+    PHOTO_WORKERS: int = 2                   # processes
+    PHOTO_MAX_BYTES: int = 15 * 1024 * 1024
+    PHOTO_MAX_PIXELS: int = 50_000_000       # refuses decompression bombs
+    PHOTO_JPEG_QUALITY: int = 82
+
+    # --- Vets cache (vets.py): in-memory LRU in front of VetCache ---
+    VET_CACHE_SOFT_TTL_SECONDS: int = 900               # served as is
+    VET_CACHE_TTL_SECONDS: int = 3600                   # served stale, refreshed in the background
+    VET_CACHE_FALLBACK_SECONDS: int = 7 * 24 * 3600     # served only when Google fails
+    VET_REFRESH_CONCURRENCY: int = 4
+    VET_REFRESH_QUEUE_SIZE: int = 256
+    VET_CACHE_MEMORY_SIZE: int = 2048
+    VET_CACHE_MEMORY_TTL_SECONDS: int = 300
+
+    # --- Vet details prefetch (vets.py), off unless enabled ---
+    VET_PREFETCH_DETAILS: bool = False
+    VET_PREFETCH_TOP_K: int = 5
+    VET_PREFETCH_CONCURRENCY: int = 2
+    VET_PREFETCH_PER_MINUTE: int = 60        # for all workers together (see serve.py)
+
+    # --- Outbound HTTP client (upstream.py) ---
+    UPSTREAM_MAX_CONNECTIONS: int = 100
+    UPSTREAM_MAX_KEEPALIVE: int = 20
+    UPSTREAM_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    UPSTREAM_CONNECT_TIMEOUT: float = 3.0
+    UPSTREAM_READ_TIMEOUT: float = 5.0
+    UPSTREAM_WRITE_TIMEOUT: float = 5.0
+    UPSTREAM_POOL_TIMEOUT: float = 2.0
+    UPSTREAM_HTTP2: bool = False            # needs the optional 'h2' package
+    UPSTREAM_RETRIES: int = 2               # GET/HEAD only
+    UPSTREAM_RETRY_BACKOFF_SECONDS: float = 0.2
+    UPSTREAM_BREAKER_FAILURES: int = 5
+    UPSTREAM_BREAKER_RESET_SECONDS: float = 30.0
+
+    # --- Local vet index (vet_places.py) ---
+    VET_LOCAL_INDEX_ENABLED: bool = True
+    VET_COVERAGE_MAX_AGE_SECONDS: int = 7 * 24 * 3600
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,58 @@
+import asyncio
+from typing import List
+
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel
+from pymongo import ASCENDING, DESCENDING
+
+import fastpath
+from models import User, Pet, HealthRecord
+from security import get_current_user
+from pets import PetPublic, PET_VIEW
+from health import HealthRecordPublic, RECORD_VIEW
+from reminders import ReminderOccurrencePublic, find_upcoming
+
+# --- Router Setup ---
+router = APIRouter()
+
+
+# --- Schemas ---
+
+class DashboardPublic(BaseModel):
+    """Everything the dashboard page shows, in one response."""
+    pets: List[PetPublic]
+    upcoming_reminders: List[ReminderOccurrencePublic]
+    recent_records: List[HealthRecordPublic]
+
+
+# --- API Endpoints ---
+
+@router.get("/", response_model=DashboardPublic)
+async def get_dashboard(
+    limit: int = Query(5, ge=1, le=50),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    The dashboard summary: all pets, the next `limit` reminder
+    occurrences (recurrences expanded) and the
+    latest `limit` health records. The three indexed queries run
+    concurrently and the limits are applied inside Mongo, so this costs
+    one auth check and one round-trip of latency instead of three calls
+    that each download the full history.
+    """
+    owner = {"owner_id": current_user.id}
+    pets, reminders, records = await asyncio.gather(
+        fastpath.find_rows(Pet, PET_VIEW, owner, [("_id", ASCENDING)]),
+        find_upcoming(current_user.id, limit=limit),
+        fastpath.find_rows(
+            HealthRecord, RECORD_VIEW, owner,
+            [("date", DESCENDING), ("_id", DESCENDING)],
+            limit=limit,
+        ),
+    )
+
+    return fastpath.json_response({
+        "pets": pets,
+        "upcoming_reminders": reminders,
+        "recent_records": records,
+    })
@@ -4,7 +4,10 @@ from beanie import init_beanie
 from typing import List, Type
 # 1. Import our new central settings
 from config import settings 
-from models import User, Pet, HealthRecord, Reminder # <-- Add Reminder
+from models import (
+    User, Pet, HealthRecord, Reminder, Tombstone, DeletionJob, Attachment, ChangeVersion,
+    SchedulerLease, VetCache, VetPlace, VetCoverage,
+)
 # 2. Import your models
 from models import User 
 
@@ -20,8 +23,70 @@ async def init_db():
 
     database = client.petpal_db
 
-    document_models: List[Type] = [User, Pet, HealthRecord, Reminder] # <-- Add Reminder
+    document_models: List[Type] = [
+        User, Pet, HealthRecord, Reminder, Tombstone, DeletionJob, Attachment, ChangeVersion,
+        SchedulerLease, VetCache, VetPlace, VetCoverage,
+    ]
 
+    # init_beanie also creates any index declared in a model's Settings
+    # that the collection doesn't have yet.
     await init_beanie(database=database, document_models=document_models)
 
-    print("Successfully connected to MongoDB and initialized Beanie.")
\ No newline at end of file
+    print("Successfully connected to MongoDB and initialized Beanie.")
+
+    for line in await check_index_drift(document_models):
+        print(f"Index drift: {line}")
+
+
+# --- Index Drift Check ---
+
+def _key_of(pairs) -> tuple:
+    """
+    An index key as Mongo reports it. The fields of a text index are
+    stored as ("_fts", "text"), ("_ftsx", 1), wherever the first of them
+    sits in the declared key.
+    """
+    key = []
+    for field, direction in pairs:
+        if field == "_ftsx":
+            continue  # already reported form; added with _fts below
+        if direction == "text":
+            if ("_fts", "text") not in key:
+                key += [("_fts", "text"), ("_ftsx", 1)]
+        else:
+            key.append((field, direction))
+    return tuple(key)
+
+async def check_index_drift(document_models: List[Type]) -> List[str]:
+    """
+    Compares the indexes declared in each model's Settings with what the
+    collection really has. Returns one human-readable line per difference.
+    Extra indexes are only reported, never dropped.
+    """
+    problems = []
+    for model in document_models:
+        declared = {
+            _key_of(index.document["key"].items()): index.document
+            for index in getattr(model.Settings, "indexes", [])
+        }
+        collection = model.get_motor_collection()
+        existing = {
+            _key_of(info["key"]): (name, info)
+            for name, info in (await collection.index_information()).items()
+            if name != "_id_"
+        }
+
+        for key, spec in declared.items():
+            if key not in existing:
+                problems.append(f"{collection.name}: missing index {spec.get('name', key)}")
+                continue
+            name, info = existing[key]
+            for option in ("unique", "expireAfterSeconds"):
+                if spec.get(option) != info.get(option) and (spec.get(option) or info.get(option)):
+                    problems.append(f"{collection.name}: index {name} differs in '{option}'")
+
+        for key, (name, _) in existing.items():
+            if key not in declared:
+                problems.append(f"{collection.name}: undeclared index {name} {list(key)}")
+
+    return problems
\ No newline at end of file
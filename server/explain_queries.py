@@ -0,0 +1,109 @@
+"""
+Index diagnostics for the router queries.
+
+Runs explain() on every query shape the API uses and flags plans that
+scan the whole collection (COLLSCAN) or sort in memory (SORT).
+
+    python explain_queries.py
+
+Exits with status 1 if any query needs attention, so it can run in CI
+against a seeded database.
+"""
+import asyncio
+import sys
+from datetime import datetime
+from typing import Iterator, List
+
+from bson import ObjectId
+
+from database import init_db
+from models import User, Pet, HealthRecord, Reminder
+
+BAD_STAGES = {"COLLSCAN", "SORT"}
+
+
+def _sample_values(sample: dict) -> dict:
+    return {
+        "email": sample.get("email", "nobody@example.com"),
+        "owner_id": sample.get("owner_id", ObjectId()),
+        "pet_id": sample.get("pet_id", ObjectId()),
+        "now": datetime.utcnow(),
+    }
+
+
+def router_queries(v: dict) -> List[tuple]:
+    """
+    (label, model, filter, sort) for every query the routers issue.
+    Keep this list in step with the routers.
+    """
+    return [
+        ("security.get_current_user", User, {"email": v["email"]}, None),
+        ("pets.get_my_pets", Pet, {"owner_id": v["owner_id"]}, None),
+        ("health.get_all_my_records", HealthRecord,
+            {"owner_id": v["owner_id"]}, [("date", -1), ("_id", -1)]),
+        ("health.get_records_for_pet", HealthRecord,
+            {"pet_id": v["pet_id"]}, [("date", -1)]),
+        ("reminders.get_all_my_reminders", Reminder,
+            {"owner_id": v["owner_id"]}, [("due_date", 1), ("_id", 1)]),
+        ("reminders.find_upcoming", Reminder,
+            {"owner_id": v["owner_id"], "next_occurrence_at": {"$gte": v["now"]}},
+            [("next_occurrence_at", 1)]),
+        ("reminders.find_upcoming (past window)", Reminder,
+            {"owner_id": v["owner_id"], "due_date": {"$lt": v["now"]}}, [("due_date", 1)]),
+        ("reminders.get_reminders_for_pet", Reminder,
+            {"pet_id": v["pet_id"]}, [("due_date", 1)]),
+        ("health.search_records", HealthRecord,
+            {"owner_id": v["owner_id"], "$text": {"$search": "rabies"}}, None),
+        ("health.search_records (tags)", HealthRecord,
+            {"owner_id": v["owner_id"], "tags": {"$all": ["vaccine"]}}, [("date", -1), ("_id", -1)]),
+        ("health.get_tag_counts", HealthRecord,
+            {"owner_id": v["owner_id"], "tags.0": {"$exists": True}}, None),
+        ("cascade.run_job (records)", HealthRecord,
+            {"pet_id": v["pet_id"], "owner_id": v["owner_id"]}, None),
+        ("cascade.run_job (reminders)", Reminder,
+            {"pet_id": v["pet_id"], "owner_id": v["owner_id"]}, None),
+    ]
+
+
+def _walk_stages(plan: dict) -> Iterator[str]:
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _walk_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _walk_stages(child)
+
+
+async def explain_all() -> int:
+    await init_db()
+
+    sample = {}
+    pet = await Pet.get_motor_collection().find_one({}, {"owner_id": 1})
+    if pet:
+        sample.update(owner_id=pet["owner_id"], pet_id=pet["_id"])
+    user = await User.get_motor_collection().find_one({}, {"email": 1})
+    if user:
+        sample["email"] = user["email"]
+
+    flagged = 0
+    for label, model, query, sort in router_queries(_sample_values(sample)):
+        cursor = model.get_motor_collection().find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        winning = explanation.get("queryPlanner", {}).get("winningPlan", {})
+        stages = list(_walk_stages(winning))
+        bad = BAD_STAGES.intersection(stages)
+        status = "FLAG" if bad else "ok"
+        flagged += bool(bad)
+        print(f"[{status:4}] {label}: {' <- '.join(stages)}")
+
+    print(f"{flagged} quer{'y' if flagged == 1 else 'ies'} flagged.")
+    return flagged
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(explain_all()) else 0)
@@ -0,0 +1,155 @@
+"""
+Fast read path for list endpoints.
+
+The normal path builds a Beanie document per row, then a *Public schema,
+and FastAPI validates that again through response_model. Here we run a
+projected query straight on the Motor collection and turn each raw BSON
+dict into the same JSON the *Public schema would produce.
+"""
+import json
+import typing
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Type
+
+from beanie import Document
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from pagination import NEXT_CURSOR_HEADER, NDJSON_MEDIA_TYPE, encode_cursor
+
+
+# --- Converters: stored BSON value -> JSON value ---
+
+def _as_str(value):
+    return None if value is None else str(value)
+
+def _as_date(value):
+    # Beanie stores a `date` as a datetime at midnight
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    return value.isoformat() if isinstance(value, date) else value
+
+def _as_datetime(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _as_is(value):
+    return value
+
+
+def _unwrap_optional(annotation):
+    if typing.get_origin(annotation) is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+class RawView:
+    """
+    Describes how to render raw documents exactly like `schema` does.
+    Built once per schema from its fields, so the two can't drift apart.
+    `id_fields` are the fields stored as ObjectIds but exposed as strings.
+    """
+
+    def __init__(self, schema: Type[BaseModel], id_fields=("owner_id", "pet_id")):
+        self.schema = schema
+        self._fields = []
+        for name, field in schema.model_fields.items():
+            if name == "id":
+                continue
+            annotation = _unwrap_optional(field.annotation)
+            if name in id_fields:
+                convert = _as_str
+            elif annotation is datetime:
+                convert = _as_datetime
+            elif annotation is date:
+                convert = _as_date
+            else:
+                convert = _as_is
+            default = None if field.is_required() else field.get_default(call_default_factory=True)
+            # A stored null stays null where the schema allows it (as it
+            # does through Beanie); the default only fills in missing keys
+            nullable = type(None) in typing.get_args(field.annotation)
+            self._fields.append((name, convert, default, nullable))
+
+        self.projection = {name: 1 for name, _, _, _ in self._fields}
+
+    def to_row(self, doc: dict) -> Dict[str, Any]:
+        row = {"id": str(doc["_id"])}
+        for name, convert, default, nullable in self._fields:
+            value = doc.get(name)
+            if value is not None:
+                row[name] = convert(value)
+            elif nullable and name in doc:
+                row[name] = None
+            else:
+                row[name] = default
+        return row
+
+
+# --- Queries ---
+
+def _cursor(model: Type[Document], view: RawView, filters: dict, sort: list):
+    return model.get_motor_collection().find(filters, view.projection).sort(sort)
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, separators=(",", ":"))
+
+async def find_rows(
+    model: Type[Document],
+    view: RawView,
+    filters: dict,
+    sort: list,
+    limit: Optional[int] = None,
+) -> list:
+    """Runs the query and returns the rendered rows (plain dicts)."""
+    cursor = _cursor(model, view, filters, sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    return [view.to_row(doc) async for doc in cursor]
+
+def json_response(obj, headers: Optional[dict] = None) -> Response:
+    """Serializes already-rendered rows (or a dict of them) to a response."""
+    return Response(content=_dumps(obj).encode("utf-8"), media_type="application/json", headers=headers)
+
+async def list_response(
+    model: Type[Document],
+    view: RawView,
+    filters: dict,
+    sort: list,
+    limit: Optional[int] = None,
+    stream: bool = False,
+    cursor_field: Optional[str] = None,
+) -> Response:
+    """
+    Runs the query and returns the finished HTTP response:
+    a JSON array, one page of it (+ X-Next-Cursor), or an NDJSON stream.
+    """
+    cursor = _cursor(model, view, filters, sort)
+
+    if stream:
+        if limit:
+            cursor = cursor.limit(limit)
+
+        async def lines():
+            async for doc in cursor:
+                yield _dumps(view.to_row(doc)) + "\n"
+
+        return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+    headers = {}
+    if limit:
+        docs = await cursor.limit(limit + 1).to_list(length=None)
+        if len(docs) > limit:
+            docs = docs[:limit]
+            last = docs[-1]
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(last[cursor_field], last["_id"])
+    else:
+        docs = await cursor.to_list(length=None)
+
+    return rows_response(view, docs, headers=headers)
+
+def rows_response(view: RawView, docs: list, headers: Optional[dict] = None) -> Response:
+    """Renders already-fetched raw documents as a JSON array response."""
+    return json_response([view.to_row(doc) for doc in docs], headers=headers)
@@ -0,0 +1,73 @@
+"""
+Geohash helpers for location-based caching.
+
+Nearby-vet searches are snapped to the centre of a geohash cell, so
+every GPS fix inside the same cell shares one cache entry.
+"""
+import math
+from typing import Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Approximate cell size (width, height) in metres per geohash precision
+_CELL_SIZE_M = {
+    3: (156_000, 156_000),
+    4: (39_100, 19_500),
+    5: (4_890, 4_890),
+    6: (1_220, 610),
+    7: (153, 153),
+    8: (38, 19),
+}
+
+# Snapping may move the search centre by at most this share of the radius
+MAX_SNAP_RATIO = 0.15
+
+
+def encode(lat: float, lng: float, precision: int) -> str:
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+def decode_center(cell: str) -> Tuple[float, float]:
+    """(lat, lng) of the centre of a geohash cell."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if value >> shift & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lng_range[0] + lng_range[1]) / 2
+
+def precision_for_radius(radius_m: float) -> int:
+    """The coarsest precision whose snapping error stays small for this radius."""
+    for precision in sorted(_CELL_SIZE_M):
+        width, height = _CELL_SIZE_M[precision]
+        if math.hypot(width, height) / 2 <= radius_m * MAX_SNAP_RATIO:
+            return precision
+    return max(_CELL_SIZE_M)
+
+def snap(lat: float, lng: float, radius_m: float) -> Tuple[str, float, float]:
+    """Returns (cell, centre lat, centre lng) for a search of this radius."""
+    cell = encode(lat, lng, precision_for_radius(radius_m))
+    center_lat, center_lng = decode_center(cell)
+    return cell, round(center_lat, 6), round(center_lng, 6)
@@ -1,11 +1,28 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+import asyncio
+import base64
+import json
+import os
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from datetime import date, datetime  # <-- THIS IS THE FIX
-from beanie import PydanticObjectId
+from datetime import date, datetime, time  # <-- THIS IS THE FIX
+from beanie import PydanticObjectId, UpdateResponse
+from fastapi.responses import FileResponse
+from pymongo import DESCENDING, UpdateOne
 
-from models import Pet, User, HealthRecord
+from models import Pet, User, HealthRecord, Attachment
 from security import get_current_user
+from config import settings
+import fastpath
+from ownership import parse_object_id, pet_not_found, load_owned_pet, find_owned_pet_children
+from pagination import (
+    MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, DEFAULT_SEARCH_LIMIT,
+    encode_cursor, decode_cursor, keyset_filter, ndjson_response,
+)
+from versions import bump_version, list_etag, not_modified, with_etag
+import bulk
+import attachments
+from bulk import BulkRequest, BulkDeleteRequest, BulkResponse, BulkResults
 
 router = APIRouter(
     prefix="/api/records", 
@@ -22,6 +39,18 @@ class HealthRecordCreate(BaseModel):
     tags: Optional[List[str]] = []
     attachment_url: Optional[str] = None
 
+# The `date` field below shadows the type once it has a default
+_date = date
+
+class HealthRecordBulkUpdate(BaseModel):
+    """One item of a bulk update: the record's id plus the fields to change."""
+    id: str
+    title: Optional[str] = Field(None, max_length=150)
+    date: Optional[_date] = None
+    notes: Optional[str] = None
+    tags: Optional[List[str]] = None
+    attachment_url: Optional[str] = None
+
 class HealthRecordPublic(BaseModel):
     id: str
     pet_id: str
@@ -31,6 +60,7 @@ class HealthRecordPublic(BaseModel):
     notes: Optional[str] = None
     tags: Optional[List[str]] = []
     attachment_url: Optional[str] = None
+    attachment_name: Optional[str] = None
     created_at: datetime # This line was causing the error
 
 # --- Helper Function ---
@@ -44,27 +74,44 @@ def map_record_to_public(record: HealthRecord) -> HealthRecordPublic:
         notes=record.notes,
         tags=record.tags,
         attachment_url=record.attachment_url,
+        attachment_name=record.attachment_name,
         created_at=record.created_at
     )
 
+# Raw-document renderer for the fast list path (see fastpath.py)
+RECORD_VIEW = fastpath.RawView(HealthRecordPublic)
+
+class TagCount(BaseModel):
+    tag: str
+    count: int
+
+
+# --- Search Cursors ---
+# Ranked results page by (text score, _id), newest-first ones by (date, _id)
+# like /all; the two kinds of cursor aren't interchangeable.
+
+def _encode_score_cursor(score: float, doc_id: PydanticObjectId) -> str:
+    raw = json.dumps({"s": score, "id": str(doc_id)})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _decode_score_cursor(cursor: str):
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(raw["s"]), PydanticObjectId(raw["id"])
+    except Exception:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor.")
+
 # --- API Endpoints ---
 
 @router.post("/", 
     response_model=HealthRecordPublic, 
     status_code=status.HTTP_201_CREATED)
 async def create_health_record(
+    request: Request,
     record_in: HealthRecordCreate, 
     current_user: User = Depends(get_current_user)
 ):
-    try:
-        pet_obj_id = PydanticObjectId(record_in.pet_id)
-    except Exception:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid Pet ID format.")
-
-    pet = await Pet.get(pet_obj_id)
-    
-    if not pet or pet.owner_id != current_user.id:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, "Pet not found.")
+    pet = await load_owned_pet(request, parse_object_id(record_in.pet_id), current_user)
         
     new_record = HealthRecord(
         **record_in.model_dump(exclude={"pet_id"}), 
@@ -73,43 +120,390 @@ async def create_health_record(
     )
     
     await new_record.insert()
+    await bump_version(current_user.id)
     
     return map_record_to_public(new_record)
 
 @router.get("/all", response_model=List[HealthRecordPublic])
 async def get_all_my_records(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
     current_user: User = Depends(get_current_user)
 ):
     """
     Get all health records for ALL pets owned by the
-    currently logged-in user.
+    currently logged-in user, newest first.
+
+    - `limit` returns one page; the next page's cursor comes back in
+      the X-Next-Cursor header (absent on the last page).
+    - `stream=true` sends NDJSON, one record per line, as documents
+      come off the cursor instead of building the whole list.
+    - Answers 304 if If-None-Match still matches (see versions.py).
     """
-    
-    # This is a single, efficient database query:
-    # "Find all records where the owner_id matches the logged-in user"
-    records = await HealthRecord.find(
-        HealthRecord.owner_id == current_user.id
-    ).sort(-HealthRecord.date).to_list() # Sort by date, newest first
-    
-    return [map_record_to_public(record) for record in records]
+    etag = await list_etag(request, current_user.id)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    filters = {"owner_id": current_user.id}
+    if cursor:
+        last_date, last_id = decode_cursor(cursor)
+        filters.update(keyset_filter("date", last_date, last_id, descending=True))
+    # _id breaks ties between records on the same day (index: owner_date_id)
+    sort = [("date", DESCENDING), ("_id", DESCENDING)]
+
+    if settings.FAST_LIST_READS:
+        return with_etag(await fastpath.list_response(
+            HealthRecord, RECORD_VIEW, filters, sort,
+            limit=limit, stream=stream, cursor_field="date",
+        ), response, etag)
+
+    query = HealthRecord.find(filters).sort(sort)
+
+    if stream:
+        if limit:
+            query = query.limit(limit)
+        return with_etag(ndjson_response(map_record_to_public(r) async for r in query), response, etag)
+
+    if not limit:
+        records = await query.to_list()
+        return with_etag([map_record_to_public(record) for record in records], response, etag)
+
+    # Fetch one extra to know whether another page exists
+    records = await query.limit(limit + 1).to_list()
+    if len(records) > limit:
+        records = records[:limit]
+        last = records[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.date, last.id)
+
+    return with_etag([map_record_to_public(record) for record in records], response, etag)
 
 @router.get("/pet/{pet_id}", response_model=List[HealthRecordPublic])
 async def get_records_for_pet(
+    request: Request,
+    response: Response,
     pet_id: str,
     current_user: User = Depends(get_current_user)
 ):
+    """
+    Ownership check and record fetch run as one aggregation.
+    Answers 304 if If-None-Match still matches (see versions.py).
+    """
+    etag = await list_etag(request, current_user.id)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    fast = settings.FAST_LIST_READS
+    docs = await find_owned_pet_children(
+        HealthRecord, parse_object_id(pet_id), current_user,
+        sort=[("date", DESCENDING)],
+        projection=RECORD_VIEW.projection if fast else None,
+    )
+    if docs is None:
+        raise pet_not_found()
+
+    if fast:
+        return with_etag(fastpath.rows_response(RECORD_VIEW, docs), response, etag)
+
+    return with_etag([map_record_to_public(HealthRecord.model_validate(doc)) for doc in docs], response, etag)
+
+
+@router.get("/search", response_model=List[HealthRecordPublic])
+async def search_records(
+    q: Optional[str] = Query(None, max_length=200),
+    tags: Optional[str] = None,
+    pet_id: Optional[str] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Search the user's health records.
+
+    - `q` matches words in the title and notes (stemmed, so "vaccine"
+      finds "vaccines"); results are ranked by relevance, title matches
+      first. Without `q`, records come newest first, like /all.
+    - `tags` (comma-separated) keeps records carrying all of them.
+    - `pet_id`, `from` and `to` (dates, inclusive) narrow it further.
+
+    Paged like /all: pass the X-Next-Cursor header back as `cursor`.
+    """
+    filters = {"owner_id": current_user.id}
+    if tags:
+        wanted = [tag.strip() for tag in tags.split(",") if tag.strip()]
+        if wanted:
+            filters["tags"] = {"$all": wanted}
+    if pet_id:
+        filters["pet_id"] = parse_object_id(pet_id)
+    if date_from or date_to:
+        # Beanie stores a `date` as a datetime at midnight
+        filters["date"] = {}
+        if date_from:
+            filters["date"]["$gte"] = datetime.combine(date_from, time.min)
+        if date_to:
+            filters["date"]["$lte"] = datetime.combine(date_to, time.min)
+
+    if not q or not q.strip():
+        if cursor:
+            last_date, last_id = decode_cursor(cursor)
+            filters.update(keyset_filter("date", last_date, last_id, descending=True))
+        return await fastpath.list_response(
+            HealthRecord, RECORD_VIEW, filters,
+            [("date", DESCENDING), ("_id", DESCENDING)],
+            limit=limit, cursor_field="date",
+        )
+
+    # $text has to be in the first stage; the score is then an ordinary field
+    pipeline = [
+        {"$match": {**filters, "$text": {"$search": q}}},
+        {"$addFields": {"_score": {"$meta": "textScore"}}},
+    ]
+    if cursor:
+        last_score, last_id = _decode_score_cursor(cursor)
+        pipeline.append({"$match": keyset_filter("_score", last_score, last_id, descending=True)})
+    pipeline += [
+        {"$sort": {"_score": DESCENDING, "_id": DESCENDING}},
+        {"$limit": limit + 1},
+        {"$project": {**RECORD_VIEW.projection, "_score": 1}},
+    ]
+    docs = await HealthRecord.get_motor_collection().aggregate(pipeline).to_list(length=None)
+
+    headers = {}
+    if len(docs) > limit:
+        docs = docs[:limit]
+        headers[NEXT_CURSOR_HEADER] = _encode_score_cursor(docs[-1]["_score"], docs[-1]["_id"])
+    return fastpath.rows_response(RECORD_VIEW, docs, headers=headers)
+
+@router.get("/tags", response_model=List[TagCount])
+async def get_tag_counts(
+    pet_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    How many of the user's records (or one pet's) carry each tag, most
+    used first. One aggregation on the server, for search facets.
+    """
+    match = {"owner_id": current_user.id, "tags.0": {"$exists": True}}
+    if pet_id:
+        match["pet_id"] = parse_object_id(pet_id)
+    pipeline = [
+        {"$match": match},
+        {"$project": {"_id": 0, "tags": 1}},
+        {"$unwind": "$tags"},
+        {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+        {"$sort": {"count": DESCENDING, "_id": 1}},
+    ]
+    docs = await HealthRecord.get_motor_collection().aggregate(pipeline).to_list(length=None)
+    return fastpath.json_response([{"tag": doc["_id"], "count": doc["count"]} for doc in docs])
+
+
+# --- Attachments ---
+# Files are streamed into the content-addressed store in attachments.py.
+
+async def _owned_record(record_id: str, owner: User) -> HealthRecord:
+    record = await HealthRecord.find_one(
+        {"_id": parse_object_id(record_id, "Invalid Record ID format."), "owner_id": owner.id}
+    )
+    if not record:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Record not found.")
+    return record
+
+async def _set_attachment(record: HealthRecord, fields: dict) -> HealthRecord:
+    record = await HealthRecord.find_one({"_id": record.id, "owner_id": record.owner_id}).update(
+        {"$set": {**fields, "updated_at": datetime.utcnow()}},
+        response_type=UpdateResponse.NEW_DOCUMENT,
+    )
+    if record is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Record not found.")
+    await bump_version(record.owner_id)
+    return record
+
+@router.put("/{record_id}/attachment", response_model=HealthRecordPublic)
+async def upload_attachment(
+    request: Request,
+    record_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Attach a file to a record, replacing any previous one. Send it as
+    multipart/form-data in a part named `file`. The upload is streamed
+    to disk, never held in memory; a file that is already stored (for
+    this record or any other) is kept only once.
+    """
+    record = await _owned_record(record_id, current_user)
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > settings.ATTACHMENT_MAX_BYTES + attachments.MAX_PART_HEADER_BYTES:
+        raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "Attachment too large.")
+
+    writer = attachments.BlobWriter()
     try:
-        pet_obj_id = PydanticObjectId(pet_id)
-    except Exception:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid Pet ID format.")
+        part = await attachments.read_file_field(request, "file", writer.write)
+        if part is None:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, "No `file` part in the upload.")
+        filename, content_type = part
+        blob = await attachments.store(writer, content_type)
+    except BaseException:
+        writer.discard()
+        raise
 
-    pet = await Pet.get(pet_obj_id)
-    
-    if not pet or pet.owner_id != current_user.id:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, "Pet not found.")
-        
-    records = await HealthRecord.find(
-        HealthRecord.pet_id == pet.id
-    ).sort(-HealthRecord.date).to_list() 
-    
-    return [map_record_to_public(record) for record in records]
\ No newline at end of file
+    record = await _set_attachment(record, {
+        "attachment_id": blob["id"],
+        "attachment_name": os.path.basename(filename),
+        "attachment_url": request.url_for("download_attachment", record_id=record_id).path,
+    })
+    return map_record_to_public(record)
+
+@router.get("/{record_id}/attachment", name="download_attachment")
+async def download_attachment(
+    request: Request,
+    record_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Download a record's uploaded file. Supports Range requests (resumed
+    and partial downloads); the strong ETag is the file's SHA-256.
+    """
+    record = await _owned_record(record_id, current_user)
+    if not record.attachment_id:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "This record has no uploaded attachment.")
+
+    etag = f'"{record.attachment_id}"'
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    path = attachments.blob_path(record.attachment_id)
+    try:
+        stat_result = await asyncio.to_thread(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Attachment file is missing.")
+    meta = await Attachment.get_motor_collection().find_one({"_id": record.attachment_id}, {"content_type": 1})
+
+    return FileResponse(
+        path,
+        stat_result=stat_result,
+        media_type=meta["content_type"] if meta else None,
+        filename=record.attachment_name,
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"},
+    )
+
+@router.delete("/{record_id}/attachment", response_model=HealthRecordPublic)
+async def remove_attachment(
+    record_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Detach a record's file. The stored blob goes once no record uses it.
+    """
+    record = await _owned_record(record_id, current_user)
+    record = await _set_attachment(record, {"attachment_id": None, "attachment_name": None, "attachment_url": None})
+    return map_record_to_public(record)
+
+
+# --- Bulk Endpoints ---
+# Each item gets its own result; see bulk.py.
+
+@router.post("/bulk", response_model=BulkResponse)
+async def bulk_create_health_records(
+    body: BulkRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Create many health records at once (e.g. importing a pet's history).
+    All referenced pets are checked with one query and the records are
+    written with one insert_many.
+    """
+    results = BulkResults()
+    items = bulk.parse_items(HealthRecordCreate, body.items, results)
+    pet_ids = {index: bulk.parse_id(index, item.pet_id, results, "Pet") for index, item in items}
+    owned = await bulk.owned_ids(Pet, filter(None, pet_ids.values()), current_user.id)
+
+    docs = []
+    for index, item in items:
+        pet_id = pet_ids[index]
+        if pet_id is None:
+            continue
+        if pet_id not in owned:
+            results.fail(index, status.HTTP_404_NOT_FOUND, "Pet not found.")
+            continue
+        docs.append((index, HealthRecord(
+            **item.model_dump(exclude={"pet_id"}),
+            pet_id=pet_id,
+            owner_id=current_user.id
+        )))
+
+    await bulk.insert_many(HealthRecord, docs, results)
+    await bump_version(current_user.id)
+    return results.response()
+
+@router.patch("/bulk", response_model=BulkResponse)
+async def bulk_update_health_records(
+    body: BulkRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Update many health records at once. Every item is `{"id", ...fields}`.
+    Ownership of all of them is checked with one query, then one bulk_write.
+    A record may appear only once; repeats are failed with 409. Setting
+    `attachment_url` to a link drops the record's uploaded file.
+    """
+    results = BulkResults()
+    items = bulk.parse_items(HealthRecordBulkUpdate, body.items, results)
+    ids = {index: bulk.parse_id(index, item.id, results, "Record") for index, item in items}
+    owned = await bulk.owned_ids(HealthRecord, filter(None, ids.values()), current_user.id)
+
+    ops, seen = [], set()
+    for index, item in items:
+        obj_id = ids[index]
+        if obj_id is None:
+            continue
+        if obj_id not in owned:
+            results.fail(index, status.HTTP_404_NOT_FOUND, "Record not found.", obj_id)
+            continue
+        if obj_id in seen:
+            results.fail(index, status.HTTP_409_CONFLICT, "Record listed more than once", obj_id)
+            continue
+        seen.add(obj_id)
+        update_data = item.model_dump(exclude_unset=True, exclude={"id"})
+        if "attachment_url" in update_data:
+            url = update_data["attachment_url"]
+            if attachments.is_upload_url(url, str(obj_id)):
+                del update_data["attachment_url"]  # its own upload, unchanged
+            elif attachments.is_upload_url(url):
+                results.fail(index, status.HTTP_422_UNPROCESSABLE_ENTITY,
+                             "attachment_url can't point at an uploaded file; upload it to this record instead", obj_id)
+                continue
+            else:
+                # A link of the client's own replaces the uploaded file
+                update_data.update(attachment_id=None, attachment_name=None)
+        if not update_data:
+            results.ok(index, status.HTTP_200_OK, obj_id)
+            continue
+        update_data["updated_at"] = datetime.utcnow()
+        ops.append((index, obj_id, UpdateOne(
+            {"_id": obj_id, "owner_id": current_user.id},
+            {"$set": bulk.encode(update_data)},
+        )))
+
+    await bulk.bulk_write(HealthRecord, ops, results)
+    if ops:
+        await bump_version(current_user.id)
+    return results.response()
+
+@router.post("/bulk/delete", response_model=BulkResponse)
+async def bulk_delete_health_records(
+    body: BulkDeleteRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Delete many health records at once.
+    """
+    result = await bulk.bulk_delete(HealthRecord, body.ids, current_user.id, "Record", "record")
+    await bump_version(current_user.id)
+    return result
@@ -0,0 +1,47 @@
+"""
+Image resizing for pet photos. Runs inside the photo process pool
+(photos.py), so it imports nothing from the app: a worker process only
+pays for Pillow and the standard library.
+"""
+import warnings
+from io import BytesIO
+from typing import Dict
+
+
+class InvalidImage(ValueError):
+    """The upload isn't an image Pillow can decode (or is far too big)."""
+
+
+def render_variants(data: bytes, sizes: Dict[str, int], quality: int, max_pixels: int) -> Dict[str, bytes]:
+    """
+    Decodes `data` once and returns a JPEG per variant, each no larger
+    than its size (longest edge, in pixels) and never upscaled.
+    """
+    from PIL import Image, ImageOps  # optional dependency: pip install Pillow
+
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    largest = max(sizes.values())
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        try:
+            image = Image.open(BytesIO(data))
+            # JPEGs can be decoded straight at a reduced scale, much cheaper
+            image.draft("RGB", (largest, largest))
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+                rgba = image.convert("RGBA")
+                image = Image.new("RGB", rgba.size, (255, 255, 255))
+                image.paste(rgba, mask=rgba.getchannel("A"))
+            else:
+                image = image.convert("RGB")
+        except (OSError, SyntaxError, Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+            raise InvalidImage(str(e))
+
+    variants = {}
+    # Largest first, so each smaller variant is resized from the previous one
+    for name, edge in sorted(sizes.items(), key=lambda item: -item[1]):
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+        variants[name] = buffer.getvalue()
+    return variants
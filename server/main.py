@@ -7,22 +7,49 @@ import httpx  # <-- Import httpx
 # Import your routers
 from pets import router as pets_router
 from database import init_db
+from security import shutdown_password_pool
+from reminders import backfill_next_occurrences
+from versions import backfill_updated_at
+from cascade import runner as cascade_runner
+from scheduler import ReminderScheduler, build_sink
+from upstream import build_http_client
+from config import settings
 from auth import router as auth_router # <-- Assuming you have this
-from vets import router as vets_router
+from vets import router as vets_router, refresher as vet_cache_refresher, prefetcher as vet_details_prefetcher
 from health import router as health_router # <-- Assuming you have this
 from reminders import router as reminders_router # <-- Assuming you have this
+from metrics import router as metrics_router
+from transfer import router as transfer_router
+from sync import router as sync_router
+from photos import router as photos_router, shutdown_photo_pool
+from dashboard import router as dashboard_router
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Code to run on startup
     await init_db()
+    await backfill_next_occurrences()
+    await backfill_updated_at()
+    await cascade_runner.resume()  # deletes cut short by the last shutdown
     # Create a single, re-usable HTTP client for the app's lifetime
-    app.state.http_client = httpx.AsyncClient() 
+    app.state.http_client = build_http_client()
+
+    scheduler = None
+    if settings.SCHEDULER_ENABLED:
+        scheduler = ReminderScheduler(sink=build_sink(app.state.http_client))
+        scheduler.start()
     
     yield
     
     # Code to run on shutdown
+    if scheduler:
+        await scheduler.stop()
+    await vet_cache_refresher.close()
+    await vet_details_prefetcher.close()
+    await cascade_runner.close()
     await app.state.http_client.aclose() # Cleanly close the client
+    shutdown_password_pool()
+    shutdown_photo_pool()
     print("Server shutting down...")
 
 # Create the FastAPI app instance
@@ -41,6 +68,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],  # pagination and conditional GETs on the list routes
 )
 
 # --- Include Routers ---
@@ -50,6 +78,11 @@ app.include_router(pets_router, prefix="/api/pets", tags=["Pets"])
 app.include_router(vets_router, prefix="/api/vets", tags=["Vets & Maps"])
 app.include_router(reminders_router, prefix="/api/reminders", tags=["Reminders"])
 app.include_router(health_router, prefix="/api/health", tags=["Health"])
+app.include_router(dashboard_router, prefix="/api/dashboard", tags=["Dashboard"])
+app.include_router(metrics_router, prefix="/api/metrics", tags=["Metrics"])
+app.include_router(transfer_router, prefix="/api", tags=["Export & Import"])
+app.include_router(sync_router, prefix="/api", tags=["Sync"])
+app.include_router(photos_router, prefix="/api/photos", tags=["Photos"])  # photos.PHOTO_URL_PREFIX
 
 
 # --- Test Endpoint ---
@@ -58,5 +91,6 @@ async def root():
     return {"message": "Welcome to the PetPal API!"}
 
 # --- Run Server ---
+# Development only (one process, auto-reload). In production: python serve.py
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
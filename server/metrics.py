@@ -0,0 +1,42 @@
+import secrets
+from typing import Callable, Dict, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+
+from config import settings
+
+# --- Router Setup ---
+router = APIRouter()
+
+# Each subsystem (caches, pools, schedulers...) registers a function
+# that returns a small dict of its current numbers.
+_providers: Dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, provider: Callable[[], dict]) -> None:
+    """Registers a stats provider under `name` for the /api/metrics endpoint."""
+    _providers[name] = provider
+
+
+def snapshot() -> dict:
+    return {name: provider() for name, provider in _providers.items()}
+
+
+def require_metrics_token(x_metrics_token: Optional[str] = Header(None)) -> None:
+    """
+    Metrics are for operators, not users: the route answers 404 unless
+    METRICS_TOKEN is set, and then only to requests that send it.
+    """
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Not Found")
+    if not x_metrics_token or not secrets.compare_digest(x_metrics_token, settings.METRICS_TOKEN):
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Invalid metrics token")
+
+
+@router.get("/", dependencies=[Depends(require_metrics_token)])
+async def get_metrics():
+    """
+    Returns the in-process counters of this worker.
+    Send the METRICS_TOKEN setting in the X-Metrics-Token header.
+    """
+    return snapshot()
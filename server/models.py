@@ -1,7 +1,13 @@
-from beanie import Document, PydanticObjectId
+from beanie import (
+    Document, PydanticObjectId,
+    after_event, before_event, Insert, Replace, Save, SaveChanges, Update, Delete,
+)
 from pydantic import EmailStr, Field
 from datetime import datetime, date, time
-from typing import Optional, List
+from typing import Optional, List, Any, Dict
+from pymongo import IndexModel, ASCENDING, DESCENDING, GEOSPHERE, TEXT
+
+from recurrence import next_occurrence
 
 class User(Document):
     """
@@ -18,9 +24,23 @@ class User(Document):
     verified: bool = Field(default=False)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+    @after_event(Replace, Save, SaveChanges, Update, Delete)
+    def evict_cached_principal(self):
+        """
+        Keeps security.principal_cache honest: any write through the
+        document drops the cached copies of this user.
+        (Bulk query updates like User.find(...).update() bypass this.)
+        """
+        from security import invalidate_principal  # avoid circular import
+        invalidate_principal(self.id)
+
     class Settings:
         # This tells Beanie to name the collection "users" in MongoDB
         name = "users"
+        # Login and every authenticated request look users up by email
+        indexes = [
+            IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        ]
         
     class Config:
         # This is for Pydantic: allows us to create a User from a dict
@@ -42,6 +62,8 @@ class Pet(Document):
     dob: Optional[date] = None
     weight: Optional[float] = None
     photo_url: Optional[str] = None
+    # Uploaded photo: variant name ("thumb", "detail") -> URL, see photos.py
+    photos: Optional[Dict[str, str]] = None
     # --- ADD THIS NEW FIELD ---
     age: Optional[str] = Field(None, max_length=50) # e.g., "2 years", "6 months"
     # --- ADD THIS NEW FIELD ---
@@ -54,9 +76,25 @@ class Pet(Document):
     vaccinated: bool = Field(default=False) 
     
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # Bumped by each user edit; If-Match on updates compares against it
+    revision: int = 0
+
+    @before_event(Replace, Save, SaveChanges)
+    def touch(self):
+        """Raw updates ($set through Motor or a query) must set updated_at themselves."""
+        self.updated_at = datetime.utcnow()
 
     class Settings:
         name = "pets"
+        indexes = [
+            IndexModel([("owner_id", ASCENDING)], name="owner"),
+            # Delta sync: everything changed after a point in time
+            IndexModel(
+                [("owner_id", ASCENDING), ("updated_at", ASCENDING), ("_id", ASCENDING)],
+                name="owner_updated_id",
+            ),
+        ]
     
 
     # ... (Your User and Pet classes are above this) ...
@@ -76,14 +114,46 @@ class HealthRecord(Document):
     # As per our plan: 'vaccine', 'prescription', 'surgery'
     tags: Optional[List[str]] = Field(default=[]) 
     
-    # For now, we'll just store a URL.
-    # Real file uploads are a big, separate feature.
+    # Either a URL the client set, or the download route of an uploaded
+    # file, which is then `attachment_id` (see attachments.py)
     attachment_url: Optional[str] = None
+    attachment_id: Optional[str] = None
+    attachment_name: Optional[str] = None
     
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    @before_event(Replace, Save, SaveChanges)
+    def touch(self):
+        """Raw updates ($set through Motor or a query) must set updated_at themselves."""
+        self.updated_at = datetime.utcnow()
 
     class Settings:
         name = "health_records"
+        # Both list routes sort newest-first, so the date is part of the key.
+        # _id is the tie-breaker for keyset pagination on /all.
+        indexes = [
+            IndexModel(
+                [("owner_id", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)],
+                name="owner_date_id",
+            ),
+            IndexModel([("pet_id", ASCENDING), ("date", DESCENDING)], name="pet_date"),
+            # Delta sync: everything changed after a point in time
+            IndexModel(
+                [("owner_id", ASCENDING), ("updated_at", ASCENDING), ("_id", ASCENDING)],
+                name="owner_updated_id",
+            ),
+            # Search. The owner_id prefix keeps each user's search to their
+            # own entries (and means every $text query must name the owner).
+            IndexModel(
+                [("owner_id", ASCENDING), ("title", TEXT), ("notes", TEXT)],
+                name="owner_text", weights={"title": 3, "notes": 1},
+            ),
+            # Tag filters and facets (multikey)
+            IndexModel([("owner_id", ASCENDING), ("tags", ASCENDING)], name="owner_tags"),
+            # Which records use a stored file (the attachment sweeper)
+            IndexModel([("attachment_id", ASCENDING)], name="attachment", sparse=True),
+        ]
     # ... (Config) ...
 
 
@@ -107,10 +177,222 @@ class Reminder(Document):
     due_time: Optional[time] = None   # The time of day (e.g., 08:00)
 
     # Recurrence rule
-    # Can be "none", "daily", "weekly"
+    # Can be "none", "daily", "weekly", "monthly" or an RRULE-style
+    # string like "FREQ=WEEKLY;BYDAY=MO,TH" (see recurrence.py)
     recurrence: str = Field(default="none")
 
+    # The next time this reminder is due, kept up to date on every write.
+    # None once a series (or a one-time reminder) is over.
+    next_occurrence_at: Optional[datetime] = None
+    # Set by the scheduler when it fires an occurrence
+    last_fired_at: Optional[datetime] = None
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # Bumped by each user edit; If-Match on updates compares against it
+    revision: int = 0
+
+    @before_event(Replace, Save, SaveChanges)
+    def touch(self):
+        """Raw updates ($set through Motor or a query) must set updated_at themselves."""
+        self.updated_at = datetime.utcnow()
+
+    @before_event(Insert, Replace, Save, SaveChanges)
+    def refresh_next_occurrence(self):
+        self.next_occurrence_at = next_occurrence(
+            self.due_date, self.due_time, self.recurrence, datetime.utcnow()
+        )
+
+    class Settings:
+        name = "reminders"
+        indexes = [
+            # Upcoming queries only touch reminders that are actually due
+            IndexModel(
+                [("owner_id", ASCENDING), ("next_occurrence_at", ASCENDING)],
+                name="owner_next_occurrence",
+            ),
+            # The scheduler's horizon scan across all owners
+            IndexModel([("next_occurrence_at", ASCENDING)], name="next_occurrence"),
+            IndexModel(
+                [("owner_id", ASCENDING), ("due_date", ASCENDING), ("_id", ASCENDING)],
+                name="owner_due_date_id",
+            ),
+            IndexModel([("pet_id", ASCENDING), ("due_date", ASCENDING)], name="pet_due_date"),
+            # Delta sync: everything changed after a point in time
+            IndexModel(
+                [("owner_id", ASCENDING), ("updated_at", ASCENDING), ("_id", ASCENDING)],
+                name="owner_updated_id",
+            ),
+        ]
+
+
+# How long deletions are remembered for delta sync. A client whose sync
+# cursor is older than this has to start over with a full sync.
+TOMBSTONE_RETENTION_SECONDS = 90 * 24 * 3600
+
+class Tombstone(Document):
+    """
+    Records that a pet, health record or reminder was deleted, so delta
+    sync can tell clients to drop it. `kind` is "pet", "record" or "reminder".
+    """
+    owner_id: PydanticObjectId
+    kind: str
+    doc_id: PydanticObjectId
+    deleted_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "tombstones"
+        indexes = [
+            IndexModel(
+                [("owner_id", ASCENDING), ("deleted_at", ASCENDING), ("_id", ASCENDING)],
+                name="owner_deleted_id",
+            ),
+            IndexModel(
+                [("deleted_at", ASCENDING)],
+                name="deleted_ttl", expireAfterSeconds=TOMBSTONE_RETENTION_SECONDS,
+            ),
+        ]
+
+
+# Finished (or abandoned) deletion jobs are forgotten after this long
+DELETION_JOB_RETENTION_SECONDS = 7 * 24 * 3600
+
+class DeletionJob(Document):
+    """
+    A pet's cascading delete, run in the background (see cascade.py).
+    `deleted` counts what is gone so far, per kind ("record", "reminder").
+    """
+    owner_id: PydanticObjectId
+    pet_id: PydanticObjectId
+    status: str = "pending"  # pending | running | done | failed
+    deleted: Dict[str, int] = {}
+    error: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    heartbeat_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Settings:
+        name = "deletion_jobs"
+        indexes = [
+            # Startup looks for jobs to resume
+            IndexModel([("status", ASCENDING), ("heartbeat_at", ASCENDING)], name="status_heartbeat"),
+            IndexModel(
+                [("created_at", ASCENDING)],
+                name="created_ttl", expireAfterSeconds=DELETION_JOB_RETENTION_SECONDS,
+            ),
+        ]
+
+
+class Attachment(Document):
+    """
+    A stored file, keyed by content: `_id` is the SHA-256 of its bytes,
+    so identical uploads share one blob (see attachments.py).
+    """
+    id: str
+    size: int
+    content_type: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_used_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "attachments"
+        indexes = [
+            IndexModel([("last_used_at", ASCENDING)], name="last_used"),
+        ]
+
+
+class ChangeVersion(Document):
+    """
+    A per-user counter, bumped by every write to the user's pets, health
+    records or reminders. List ETags are derived from it (see versions.py).
+    `_id` is the owner's id, so reading it is a single _id lookup.
+    """
+    version: int = 0
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "change_versions"
+
+
+class SchedulerLease(Document):
+    """
+    A named lease, so only one worker at a time runs a singleton job
+    like the reminder scheduler. The holder renews it before `expires_at`;
+    if it dies, another worker takes over once it expires.
+    """
+    name: str
+    holder: str
+    expires_at: datetime
+
+    class Settings:
+        name = "scheduler_leases"
+        indexes = [
+            IndexModel([("name", ASCENDING)], name="name_unique", unique=True),
+        ]
+
+
+class VetCache(Document):
+    """
+    Cached, curated Google Places responses for the vets routes.
+    `query_key` is "nearby:<geohash>:<radius>" or "details:<place_id>".
+
+    Until `fresh_until` an entry is served as is; until `usable_until` it
+    is served while a background refresh runs; after that it's only a
+    fallback for when Google fails. Mongo deletes it at `expires_at`.
+    Entries written before the soft/hard split only have `expires_at`.
+    """
+    query_key: str
+    data: Any
+    fresh_until: Optional[datetime] = None
+    usable_until: Optional[datetime] = None
+    expires_at: datetime
+
+    class Settings:
+        name = "vet_cache"
+        indexes = [
+            IndexModel([("query_key", ASCENDING)], name="query_key_unique", unique=True),
+            # Mongo drops entries on its own once they expire
+            IndexModel([("expires_at", ASCENDING)], name="expires_ttl", expireAfterSeconds=0),
+        ]
+
+
+class VetPlace(Document):
+    """
+    Every vet clinic we've seen from Google Places, merged by place_id,
+    so nearby searches can be answered locally with $geoNear.
+    `location` is a GeoJSON point: {"type": "Point", "coordinates": [lng, lat]}.
+    """
+    place_id: str
+    name: Optional[str] = None
+    address: Optional[str] = None
+    location: dict
+    rating: Optional[float] = None
+    user_ratings_total: Optional[int] = None
+    is_open_now: Optional[Any] = None
+    phone: Optional[str] = None
+    website: Optional[str] = None
+    opening_hours: Optional[List[str]] = None
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "vet_places"
+        indexes = [
+            IndexModel([("place_id", ASCENDING)], name="place_id_unique", unique=True),
+            IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+        ]
+
+
+class VetCoverage(Document):
+    """
+    One upstream nearby search we've stored the results of: a circle
+    (GeoJSON centre + radius) and when it was fetched.
+    """
+    center: dict
+    radius_m: int
+    fetched_at: datetime = Field(default_factory=datetime.utcnow)
 
     class Settings:
-        name = "reminders"
\ No newline at end of file
+        name = "vet_coverage"
+        indexes = [
+            IndexModel([("center", GEOSPHERE)], name="center_2dsphere"),
+        ]
\ No newline at end of file
@@ -0,0 +1,91 @@
+"""
+Ownership-checked loaders for pet-scoped routes.
+
+Instead of `Pet.get(id)` followed by an owner_id comparison in Python and
+then the real query, the owner check goes into the query itself.
+"""
+from typing import List, Optional, Type
+
+from beanie import Document, PydanticObjectId
+from fastapi import Depends, HTTPException, Request, status
+
+from models import Pet, User
+from security import get_current_user
+
+
+def parse_object_id(value: str, detail: str = "Invalid Pet ID format.") -> PydanticObjectId:
+    """Turns a path/body id into an ObjectId, or answers 400."""
+    try:
+        return PydanticObjectId(value)
+    except Exception:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail)
+
+def pet_not_found() -> HTTPException:
+    return HTTPException(status.HTTP_404_NOT_FOUND, "Pet not found.")
+
+
+# --- Loaders ---
+
+async def load_owned_pet(request: Request, pet_id: PydanticObjectId, owner: User) -> Pet:
+    """
+    Loads a pet with a single `{_id, owner_id}` query.
+    The result is memoized on the request, so several dependencies
+    asking for the same pet cost one round-trip.
+    """
+    memo = getattr(request.state, "owned_pets", None)
+    if memo is None:
+        memo = request.state.owned_pets = {}
+    if pet_id in memo:
+        return memo[pet_id]
+
+    pet = await Pet.find_one({"_id": pet_id, "owner_id": owner.id})
+    if pet is None:
+        raise pet_not_found()
+
+    memo[pet_id] = pet
+    return pet
+
+async def get_owned_pet(
+    request: Request,
+    pet_id: str,
+    current_user: User = Depends(get_current_user),
+) -> Pet:
+    """Dependency for routes with a `{pet_id}` path parameter."""
+    return await load_owned_pet(request, parse_object_id(pet_id), current_user)
+
+
+async def find_owned_pet_children(
+    child_model: Type[Document],
+    pet_id: PydanticObjectId,
+    owner: User,
+    sort: list,
+    projection: Optional[dict] = None,
+) -> Optional[List[dict]]:
+    """
+    Returns the raw child documents (records, reminders...) of a pet in
+    one aggregation: match the pet on `{_id, owner_id}`, then $lookup its
+    children through the `pet_id` index. Returns None if the pet doesn't
+    exist or isn't owned by `owner`, [] if it simply has no children.
+    (The localField + pipeline form of $lookup needs MongoDB 5.0+.)
+    """
+    child_pipeline = [{"$sort": dict(sort)}]
+    if projection:
+        child_pipeline.append({"$project": projection})
+
+    pipeline = [
+        {"$match": {"_id": pet_id, "owner_id": owner.id}},
+        {"$project": {"_id": 1}},
+        {"$lookup": {
+            "from": child_model.Settings.name,
+            "localField": "_id",
+            "foreignField": "pet_id",
+            "pipeline": child_pipeline,
+            "as": "child",
+        }},
+        # One output document per child keeps us clear of the 16MB limit
+        {"$unwind": {"path": "$child", "preserveNullAndEmptyArrays": True}},
+    ]
+    docs = await Pet.get_motor_collection().aggregate(pipeline).to_list(length=None)
+    if not docs:
+        return None
+    return [doc["child"] for doc in docs if "child" in doc]
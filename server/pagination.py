@@ -0,0 +1,63 @@
+import base64
+import json
+from datetime import date, datetime, time
+from typing import Any, AsyncIterator, Tuple
+
+from beanie import PydanticObjectId
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+# Largest page a client may ask for with ?limit=
+MAX_PAGE_SIZE = 500
+
+# Page size of the search routes when no ?limit= is given
+DEFAULT_SEARCH_LIMIT = 50
+
+# Response header that carries the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# --- Opaque Cursors ---
+# A cursor is the (sort value, _id) of the last item on a page, so the
+# next page can resume right after it using the compound index.
+# Our paginated sort keys are all dates, which Beanie stores as a
+# datetime at midnight.
+
+def encode_cursor(sort_value: date, doc_id: PydanticObjectId) -> str:
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.date()
+    raw = json.dumps({"v": sort_value.isoformat(), "id": str(doc_id)})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, PydanticObjectId]:
+    """Returns (sort value as stored in Mongo, _id). Raises 400 on garbage."""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        day = date.fromisoformat(raw["v"])
+        return datetime.combine(day, time.min), PydanticObjectId(raw["id"])
+    except Exception:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor.")
+
+def keyset_filter(field: str, value: Any, doc_id: PydanticObjectId, descending: bool) -> dict:
+    """Filter for "everything after (value, doc_id)" in (field, _id) order."""
+    op = "$lt" if descending else "$gt"
+    return {
+        "$or": [
+            {field: {op: value}},
+            {field: value, "_id": {op: doc_id}},
+        ]
+    }
+
+
+# --- NDJSON Streaming ---
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def ndjson_response(items: AsyncIterator[BaseModel]) -> StreamingResponse:
+    """Streams one JSON object per line as the items are produced."""
+    async def lines():
+        async for item in items:
+            yield item.model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
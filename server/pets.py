@@ -1,11 +1,21 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Response
 from pydantic import BaseModel, Field
-from typing import List, Optional
-from datetime import date
-from beanie import PydanticObjectId
+from typing import Dict, List, Optional
+from datetime import date, datetime
+from beanie import PydanticObjectId, UpdateResponse
+from pymongo import ASCENDING
 
-from models import Pet, User
+from models import Pet, User, DeletionJob
 from security import get_current_user
+from config import settings
+import fastpath
+from ownership import parse_object_id, pet_not_found, get_owned_pet
+from versions import (
+    bump_version, record_deletions, list_etag, not_modified, with_etag,
+    revision_etag, if_match_revisions, revision_filter, precondition_failed,
+)
+import cascade
+import photos
 
 router = APIRouter(
     prefix="/api/pets",
@@ -54,6 +64,8 @@ class PetPublic(BaseModel):
     last_vet_visit: Optional[date] = None
     last_vax_date: Optional[date] = None
     vaccinated: bool = False
+    photos: Optional[Dict[str, str]] = None  # uploaded photo's variant URLs
+    revision: int = 0
     
     class Config:
         from_attributes = True
@@ -61,6 +73,16 @@ class PetPublic(BaseModel):
 class DeleteResponse(BaseModel):
     success: bool
     message: str
+    job_id: Optional[str] = None  # poll GET /deletions/{job_id}
+
+class DeletionJobPublic(BaseModel):
+    id: str
+    pet_id: str
+    status: str
+    deleted: Dict[str, int]
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
 
 
 # --- Helper Function (NEW) ---
@@ -81,9 +103,14 @@ def map_pet_to_public(pet: Pet) -> PetPublic:
         about=pet.about, # <-- The most important line!
         last_vet_visit=pet.last_vet_visit,
         last_vax_date=pet.last_vax_date,
-        vaccinated=pet.vaccinated
+        vaccinated=pet.vaccinated,
+        photos=pet.photos,
+        revision=pet.revision,
     )
 
+# Raw-document renderer for the fast list path (see fastpath.py)
+PET_VIEW = fastpath.RawView(PetPublic)
+
 # --- API Endpoints (REPLACED) ---
 
 @router.post("/", 
@@ -101,6 +128,7 @@ async def create_pet(
         owner_id=current_user.id 
     )
     await new_pet.insert()
+    await bump_version(current_user.id)
     
     # Use our new helper function
     return map_pet_to_public(new_pet)
@@ -108,88 +136,167 @@ async def create_pet(
 
 @router.get("/", response_model=List[PetPublic])
 async def get_my_pets(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user)
 ):
     """
     Get a list of all pets owned by the currently logged-in user.
+    Answers 304 if If-None-Match still matches (see versions.py).
     """
+    etag = await list_etag(request, current_user.id)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    if settings.FAST_LIST_READS:
+        return with_etag(await fastpath.list_response(
+            Pet, PET_VIEW, {"owner_id": current_user.id}, [("_id", ASCENDING)]
+        ), response, etag)
+
     pets = await Pet.find(Pet.owner_id == current_user.id).to_list()
     
     # Use our new helper function for every pet
-    return [map_pet_to_public(pet) for pet in pets]
+    return with_etag([map_pet_to_public(pet) for pet in pets], response, etag)
 
 
 @router.get("/{pet_id}", response_model=PetPublic)
 async def get_pet_by_id(
-    pet_id: str,
-    current_user: User = Depends(get_current_user)
+    response: Response,
+    pet: Pet = Depends(get_owned_pet)
 ):
     """
-    Get a single pet by its ID.
+    Get a single pet by its ID. The ETag is its revision, for If-Match on updates.
     """
-    try:
-        obj_id = PydanticObjectId(pet_id)
-    except Exception:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid Pet ID")
-
-    pet = await Pet.get(obj_id)
-    
-    if not pet or pet.owner_id != current_user.id:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, "Pet not found")
-    
+    response.headers["ETag"] = revision_etag(pet.revision)
     # Use our new helper function
     return map_pet_to_public(pet)
 
 
 @router.put("/{pet_id}", response_model=PetPublic)
 async def update_pet(
+    request: Request,
+    response: Response,
     pet_id: str,
     pet_in: PetUpdate,
     current_user: User = Depends(get_current_user)
 ):
     """
     Update a pet's details.
+    The owner check and the write are one find-and-update of only the
+    sent fields. With If-Match (the pet's ETag / revision), a pet that
+    changed in the meantime is left alone and the answer is 412.
+    Setting `photo_url` to anything but an uploaded variant drops the
+    uploaded photo's `photos`.
     """
-    try:
-        obj_id = PydanticObjectId(pet_id)
-    except Exception:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid Pet ID")
-
-    pet = await Pet.get(obj_id)
-    
-    if not pet or pet.owner_id != current_user.id:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, "Pet not found")
-        
+    owned = {"_id": parse_object_id(pet_id), "owner_id": current_user.id}
+    expected = if_match_revisions(request)
+    filters = {**owned, **revision_filter(expected)} if expected else owned
     update_data = pet_in.model_dump(exclude_unset=True)
+    if "photo_url" in update_data and not photos.is_variant_url(update_data["photo_url"]):
+        update_data["photos"] = None
     
     if update_data:
-        for key, value in update_data.items():
-            setattr(pet, key, value)
-        
-        await pet.save()
+        pet = await Pet.find_one(filters).update(
+            {"$set": {**update_data, "updated_at": datetime.utcnow()}, "$inc": {"revision": 1}},
+            response_type=UpdateResponse.NEW_DOCUMENT,
+        )
+    else:
+        pet = await Pet.find_one(filters)
 
+    if pet is None:
+        if expected and await Pet.find(owned).count():
+            raise precondition_failed()
+        raise pet_not_found()
+    if update_data:
+        await bump_version(current_user.id)
+
+    response.headers["ETag"] = revision_etag(pet.revision)
     # Use our new helper function on the (now updated) pet
     return map_pet_to_public(pet)
 
 
+@router.put("/{pet_id}/photo", response_model=PetPublic)
+async def upload_pet_photo(
+    request: Request,
+    response: Response,
+    pet_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Set a pet's photo (multipart/form-data, part `file`). The image is
+    resized into small fixed variants (see photos.py) whose URLs come
+    back in `photos`; `photo_url` points at the thumbnail, so the pet
+    list loads small images.
+    """
+    owned = {"_id": parse_object_id(pet_id), "owner_id": current_user.id}
+    if not await Pet.find(owned).count():
+        raise pet_not_found()
+
+    urls = await photos.store(await photos.render(await photos.read_upload(request)))
+    pet = await Pet.find_one(owned).update(
+        {
+            "$set": {"photos": urls, "photo_url": urls[photos.LIST_VARIANT], "updated_at": datetime.utcnow()},
+            "$inc": {"revision": 1},
+        },
+        response_type=UpdateResponse.NEW_DOCUMENT,
+    )
+    if pet is None:
+        raise pet_not_found()
+    await bump_version(current_user.id)
+
+    response.headers["ETag"] = revision_etag(pet.revision)
+    return map_pet_to_public(pet)
+
+
 @router.delete("/{pet_id}", response_model=DeleteResponse)
 async def delete_pet(
     pet_id: str,
     current_user: User = Depends(get_current_user)
 ):
     """
-    Delete a pet.
+    Delete a pet. The pet is gone at once; its health records and
+    reminders are deleted by a background job (see cascade.py) whose
+    progress is at GET /deletions/{job_id}.
     """
-    try:
-        obj_id = PydanticObjectId(pet_id)
-    except Exception:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid Pet ID")
-        
-    pet = await Pet.get(obj_id)
-    
-    if not pet or pet.owner_id != current_user.id:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, "Pet not found")
-        
-    await pet.delete()
+    obj_id = parse_object_id(pet_id)
+    owned = {"_id": obj_id, "owner_id": current_user.id}
+    collection = Pet.get_motor_collection()
+    if not await collection.find_one(owned, {"_id": 1}):
+        raise pet_not_found()
+
+    # Tombstone first, as cascade does: a crash in between leaves the pet
+    # (deletable again), never a deletion sync clients can't see
+    await record_deletions(current_user.id, "pet", [obj_id])
+    result = await collection.delete_one(owned)
+    if result.deleted_count == 0:
+        raise pet_not_found()
+    await bump_version(current_user.id)
+
+    job = await cascade.create_job(current_user.id, obj_id)
+    cascade.runner.start(job.id)
     
-    return DeleteResponse(success=True, message="Pet deleted successfully")
\ No newline at end of file
+    return DeleteResponse(success=True, message="Pet deleted successfully", job_id=str(job.id))
+
+@router.get("/deletions/{job_id}", response_model=DeletionJobPublic)
+async def get_deletion_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Progress of a pet's cascading delete.
+    """
+    job = await DeletionJob.find_one(
+        {"_id": parse_object_id(job_id, "Invalid job ID format."), "owner_id": current_user.id}
+    )
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deletion job not found.")
+    return DeletionJobPublic(
+        id=str(job.id),
+        pet_id=str(job.pet_id),
+        status=job.status,
+        deleted=job.deleted,
+        error=job.error,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+    )
\ No newline at end of file
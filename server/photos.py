@@ -0,0 +1,251 @@
+"""
+Pet photos: resized into fixed variants in a process pool, stored
+under content-addressed names and served as immutable files.
+
+Decoding and resizing an image is pure CPU (and holds the GIL), so it
+runs in a ProcessPoolExecutor of PHOTO_WORKERS processes (see
+imaging.py); the event loop only shuffles bytes. Each variant is
+written as <sha256>.jpg, so its URL changes whenever its content does
+and can be cached forever; identical variants are stored once.
+
+Variant files are public: an <img> tag can't send a bearer token, and
+the names can't be guessed without having the photo.
+
+Files no pet points to any more (replaced photos, deleted pets) are
+removed by `python cascade.py sweep` (see sweep_unreferenced).
+"""
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from typing import Dict, Optional, Set
+
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import FileResponse
+
+import attachments
+import imaging
+import metrics
+from config import settings
+from models import Pet
+from versions import not_modified
+
+# --- Router Setup ---
+router = APIRouter()
+
+# Where main.py mounts this router; variant URLs are built from it
+PHOTO_URL_PREFIX = "/api/photos"
+
+# Variant name -> longest edge in pixels
+VARIANTS = {"thumb": 160, "detail": 1024}
+# The one `photo_url` points at, which the list pages render
+LIST_VARIANT = "thumb"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_NAME = re.compile(r"^[0-9a-f]{64}\.jpg$")
+
+
+# --- Process Pool ---
+# Created on first use, so importing this module (or a worker process
+# importing imaging.py) never starts processes.
+
+_pool: Optional[ProcessPoolExecutor] = None
+_jobs_in_flight = 0
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, not fork: forking a process that runs an event loop and
+        # driver threads can copy held locks into the child
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.PHOTO_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+def _photo_pool_stats() -> dict:
+    workers = settings.PHOTO_WORKERS
+    return {
+        "workers": workers,
+        "started": _pool is not None,
+        "in_flight": _jobs_in_flight,
+        "queue_depth": max(0, _jobs_in_flight - workers),
+    }
+
+metrics.register("photo_pool", _photo_pool_stats)
+
+def shutdown_photo_pool():
+    """Called from main.lifespan on shutdown."""
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+def _pillow_available() -> bool:
+    try:
+        import PIL  # noqa: F401  (optional: pip install Pillow)
+    except ImportError:
+        return False
+    return True
+
+async def render(data: bytes) -> Dict[str, bytes]:
+    """Resizes an uploaded image into every variant, in the process pool."""
+    global _pool, _jobs_in_flight
+    if not _pillow_available():
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "Photo processing is not available.")
+
+    loop = asyncio.get_running_loop()
+    _jobs_in_flight += 1
+    try:
+        return await loop.run_in_executor(
+            _get_pool(), imaging.render_variants,
+            data, VARIANTS, settings.PHOTO_JPEG_QUALITY, settings.PHOTO_MAX_PIXELS,
+        )
+    except imaging.InvalidImage:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Not an image we can read.")
+    except BrokenProcessPool:
+        # A worker died (e.g. on a hostile file); start a fresh pool next time
+        _pool = None
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Not an image we can read.")
+    finally:
+        _jobs_in_flight -= 1
+
+
+# --- Storage ---
+
+def photo_path(name: str) -> str:
+    return os.path.join(settings.PHOTO_DIR, name)
+
+def _write_variants(variants: Dict[str, bytes]) -> Dict[str, str]:
+    os.makedirs(settings.PHOTO_DIR, exist_ok=True)
+    names = {}
+    for variant, data in variants.items():
+        name = hashlib.sha256(data).hexdigest() + ".jpg"
+        path = photo_path(name)
+        if not os.path.exists(path):
+            fd, tmp_path = tempfile.mkstemp(dir=settings.PHOTO_DIR)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        else:
+            os.utime(path)  # in use again: keeps the sweeper off it
+        names[variant] = name
+    return names
+
+async def store(variants: Dict[str, bytes]) -> Dict[str, str]:
+    """Writes the variants; returns variant name -> URL."""
+    names = await asyncio.to_thread(_write_variants, variants)
+    return {variant: f"{PHOTO_URL_PREFIX}/{name}" for variant, name in names.items()}
+
+def _name_of(url: Optional[str]) -> Optional[str]:
+    if isinstance(url, str) and url.startswith(PHOTO_URL_PREFIX + "/"):
+        name = url[len(PHOTO_URL_PREFIX) + 1:]
+        if _NAME.match(name):
+            return name
+    return None
+
+def is_variant_url(url: Optional[str]) -> bool:
+    """Whether `url` is one of our stored variants (vs. a client's own URL)."""
+    return _name_of(url) is not None
+
+async def read_upload(request: Request) -> bytes:
+    """The `file` part of a multipart photo upload, up to PHOTO_MAX_BYTES."""
+    data = bytearray()
+
+    async def collect(chunk: bytes) -> None:
+        data.extend(chunk)
+        if len(data) > settings.PHOTO_MAX_BYTES:
+            raise HTTPException(
+                status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                f"Photos are limited to {settings.PHOTO_MAX_BYTES} bytes.",
+            )
+
+    if await attachments.read_file_field(request, "file", collect) is None:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "No `file` part in the upload.")
+    return bytes(data)
+
+
+# --- API Endpoint ---
+
+@router.get("/{name}")
+async def get_photo(name: str, request: Request):
+    """
+    Serves a photo variant. Its name is its content hash, so it never
+    changes: clients and CDNs may cache it for a year without asking.
+    """
+    if not _NAME.match(name):
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Photo not found.")
+    headers = {"ETag": f'"{name[:-4]}"', "Cache-Control": IMMUTABLE}
+    cached = not_modified(request, headers["ETag"])
+    if cached:
+        cached.headers["Cache-Control"] = IMMUTABLE
+        return cached
+
+    path = photo_path(name)
+    try:
+        stat_result = await asyncio.to_thread(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Photo not found.")
+    return FileResponse(path, stat_result=stat_result, media_type="image/jpeg", headers=headers)
+
+
+# --- Sweeping ---
+
+# A file written (or reused) this recently is never swept. Covers the
+# gap between storing a photo and pointing the pet at it.
+UNREFERENCED_GRACE = timedelta(hours=1)
+
+def _old_files(cutoff: float) -> Set[str]:
+    try:
+        with os.scandir(settings.PHOTO_DIR) as entries:
+            return {
+                entry.name for entry in entries
+                if _NAME.match(entry.name) and entry.stat().st_mtime < cutoff
+            }
+    except FileNotFoundError:
+        return set()
+
+def _unlink_if_old(name: str, cutoff: float) -> bool:
+    path = photo_path(name)
+    try:
+        if os.stat(path).st_mtime >= cutoff:  # reused since we listed it
+            return False
+        os.unlink(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+async def sweep_unreferenced(batch_size: int, pause: float) -> int:
+    """
+    Deletes variant files that no pet points to. Lists PHOTO_DIR, walks
+    the pets that have a photo in _id order, `batch_size` at a time,
+    striking off every file still in use, and removes the rest.
+    Returns how many files were removed.
+    """
+    cutoff = time.time() - UNREFERENCED_GRACE.total_seconds()
+    unused = await asyncio.to_thread(_old_files, cutoff)
+    pets = Pet.get_motor_collection()
+    last_id = None
+    while unused:
+        filters = {"$or": [{"photos": {"$type": "object"}}, {"photo_url": {"$type": "string"}}]}
+        if last_id:
+            filters["_id"] = {"$gt": last_id}
+        docs = await pets.find(filters, {"photos": 1, "photo_url": 1}).sort("_id", 1).limit(batch_size).to_list(None)
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+        for doc in docs:
+            for url in [doc.get("photo_url"), *(doc.get("photos") or {}).values()]:
+                unused.discard(_name_of(url))
+        await asyncio.sleep(pause)
+
+    removed = 0
+    for name in unused:
+        if await asyncio.to_thread(_unlink_if_old, name, cutoff):
+            removed += 1
+    return removed
@@ -0,0 +1,212 @@
+"""
+Recurrence rules and occurrence expansion for reminders.
+
+`Reminder.recurrence` accepts the legacy keywords ("none", "daily",
+"weekly", "monthly") or an RRULE-style string:
+
+    FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH;UNTIL=2026-12-31
+
+Supported parts: FREQ (DAILY/WEEKLY/MONTHLY), INTERVAL, BYDAY and UNTIL
+(inclusive date, YYYY-MM-DD or YYYYMMDD). Expansion jumps straight to the
+requested window instead of walking every occurrence since the start.
+"""
+import heapq
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+WEEKDAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY")
+_KEYWORDS = {"daily": "DAILY", "weekly": "WEEKLY", "monthly": "MONTHLY"}
+
+
+@dataclass(frozen=True)
+class Rule:
+    freq: str
+    interval: int = 1
+    by_weekday: Tuple[int, ...] = ()  # 0 = Monday, like date.weekday()
+    until: Optional[date] = None
+
+
+def parse_rule(text: Optional[str]) -> Optional[Rule]:
+    """
+    Parses a recurrence string. Returns None for one-time reminders.
+    Raises ValueError for anything we don't understand.
+    """
+    text = (text or "").strip()
+    if text.lower() in ("", "none"):
+        return None
+    if text.lower() in _KEYWORDS:
+        return Rule(freq=_KEYWORDS[text.lower()])
+
+    parts = {}
+    for chunk in text.upper().removeprefix("RRULE:").split(";"):
+        if not chunk:
+            continue
+        key, sep, value = chunk.partition("=")
+        if not sep:
+            raise ValueError(f"Malformed recurrence part: {chunk!r}")
+        parts[key] = value
+
+    freq = parts.pop("FREQ", None)
+    if freq not in FREQUENCIES:
+        raise ValueError(f"FREQ must be one of {', '.join(FREQUENCIES)}")
+
+    interval = int(parts.pop("INTERVAL", "1"))
+    if interval < 1:
+        raise ValueError("INTERVAL must be at least 1")
+
+    by_weekday = ()
+    if "BYDAY" in parts:
+        try:
+            by_weekday = tuple(sorted({WEEKDAYS.index(d) for d in parts.pop("BYDAY").split(",")}))
+        except ValueError:
+            raise ValueError("BYDAY takes weekday codes like MO,WE,FR")
+
+    until = None
+    if "UNTIL" in parts:
+        raw = parts.pop("UNTIL")[:10]
+        if len(raw) >= 8 and "-" not in raw:
+            raw = f"{raw[:4]}-{raw[4:6]}-{raw[6:8]}"
+        until = date.fromisoformat(raw)
+
+    if parts:
+        raise ValueError(f"Unsupported recurrence parts: {', '.join(parts)}")
+
+    return Rule(freq=freq, interval=interval, by_weekday=by_weekday, until=until)
+
+
+# --- Expansion ---
+
+def schedule_of(doc: dict) -> Tuple[date, Optional[time], Optional[str]]:
+    """(due_date, due_time, recurrence) from a raw reminder document."""
+    due_date = doc["due_date"]
+    if isinstance(due_date, datetime):  # Beanie stores dates as midnight datetimes
+        due_date = due_date.date()
+    due_time = doc.get("due_time")
+    if isinstance(due_time, str):
+        due_time = time.fromisoformat(due_time)
+    elif isinstance(due_time, datetime):
+        due_time = due_time.time()
+    return due_date, due_time, doc.get("recurrence")
+
+def first_occurrence(due_date: date, due_time: Optional[time]) -> datetime:
+    return datetime.combine(due_date, due_time or time.min)
+
+def _add_months(day: date, months: int) -> Optional[date]:
+    """Same day-of-month `months` later, or None if that month is too short."""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    try:
+        return day.replace(year=year, month=month)
+    except ValueError:
+        return None
+
+# A filter that never matches (e.g. DAILY;INTERVAL=7 on the wrong BYDAY)
+# would otherwise loop forever
+_MAX_MISSES = 400
+
+def _candidate_days(start: date, rule: Rule, lo: date) -> Iterator[date]:
+    """Days matching the rule, ascending, beginning near `lo` (never before start)."""
+    lo = max(lo, start)
+
+    if rule.freq == "DAILY":
+        step = rule.interval
+        k = -(-(lo - start).days // step)  # ceil
+        day = start + timedelta(days=k * step)
+        misses = 0
+        while misses < _MAX_MISSES:
+            if not rule.by_weekday or day.weekday() in rule.by_weekday:
+                misses = 0
+                yield day
+            else:
+                misses += 1
+            day += timedelta(days=step)
+
+    elif rule.freq == "WEEKLY":
+        weekdays = rule.by_weekday or (start.weekday(),)
+        week0 = start - timedelta(days=start.weekday())
+        weeks = (lo - week0).days // 7
+        week = week0 + timedelta(weeks=weeks - weeks % rule.interval)
+        while True:
+            for wd in weekdays:
+                day = week + timedelta(days=wd)
+                if day >= lo:
+                    yield day
+            week += timedelta(weeks=rule.interval)
+
+    else:  # MONTHLY, on the start's day of month
+        months = (lo.year - start.year) * 12 + lo.month - start.month
+        k = max(0, months // rule.interval)
+        misses = 0
+        while misses < _MAX_MISSES:
+            day = _add_months(start, k * rule.interval)
+            if day is not None and day >= lo and (
+                not rule.by_weekday or day.weekday() in rule.by_weekday
+            ):
+                misses = 0
+                yield day
+            else:
+                misses += 1
+            k += 1
+
+def iter_occurrences(
+    due_date: date,
+    due_time: Optional[time],
+    recurrence: Optional[str],
+    lo: datetime,
+    hi: Optional[datetime] = None,
+) -> Iterator[datetime]:
+    """Occurrences in [lo, hi) in ascending order (unbounded if hi is None)."""
+    rule = parse_rule(recurrence)
+    start = first_occurrence(due_date, due_time)
+
+    if rule is None:
+        if start >= lo and (hi is None or start < hi):
+            yield start
+        return
+
+    at = start.time()
+    for day in _candidate_days(start.date(), rule, lo.date()):
+        if rule.until and day > rule.until:
+            return
+        occurrence = datetime.combine(day, at)
+        if hi is not None and occurrence >= hi:
+            return
+        if occurrence >= lo:
+            yield occurrence
+
+def next_occurrence(
+    due_date: date,
+    due_time: Optional[time],
+    recurrence: Optional[str],
+    after: datetime,
+) -> Optional[datetime]:
+    """The first occurrence at or after `after`, or None if the series is over."""
+    return next(iter_occurrences(due_date, due_time, recurrence, after), None)
+
+
+def expand_many(
+    items: Iterable[Tuple[object, date, Optional[time], Optional[str]]],
+    lo: datetime,
+    hi: Optional[datetime] = None,
+    limit: Optional[int] = None,
+) -> List[Tuple[datetime, object]]:
+    """
+    Expands many reminders at once. `items` are (key, due_date, due_time,
+    recurrence) tuples; returns (occurrence, key) pairs merged in time
+    order, lazily, so asking for the first `limit` stays cheap even for
+    open-ended windows. At least one of `hi` / `limit` must be given.
+    """
+    if hi is None and limit is None:
+        raise ValueError("expand_many needs an upper bound: hi or limit")
+
+    def stream(index, key, d, t, r):
+        for occurrence in iter_occurrences(d, t, r, lo, hi):
+            yield occurrence, index, key
+
+    merged = heapq.merge(*(stream(i, *item) for i, item in enumerate(items)))
+    if limit is not None:
+        merged = islice(merged, limit)
+    return [(occurrence, key) for occurrence, _, key in merged]
@@ -1,16 +1,35 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from pydantic import BaseModel, Field
+import asyncio
+import logging
+from itertools import chain
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
-from datetime import date, time, datetime
+from datetime import date, time, datetime, timedelta, timezone
 from beanie import PydanticObjectId
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
 
 from models import Pet, User, Reminder
 from security import get_current_user
+from config import settings
+import fastpath
+from recurrence import parse_rule, schedule_of, next_occurrence, expand_many
+from ownership import parse_object_id, pet_not_found, load_owned_pet, find_owned_pet_children
+from pagination import (
+    MAX_PAGE_SIZE, NEXT_CURSOR_HEADER,
+    encode_cursor, decode_cursor, keyset_filter, ndjson_response,
+)
+from versions import (
+    bump_version, record_deletions, list_etag, not_modified, with_etag,
+    revision_etag, if_match_revisions, revision_filter, precondition_failed,
+)
+import bulk
+from bulk import BulkRequest, BulkDeleteRequest, BulkResponse, BulkResults
 
 router = APIRouter(
     prefix="/api/reminders",  # All routes here will start with /api/reminders
     tags=["Reminders"]
 )
+logger = logging.getLogger("petpal.reminders")
 
 # --- Schemas ---
 
@@ -23,6 +42,12 @@ class ReminderCreate(BaseModel):
     due_time: Optional[time] = None
     recurrence: str = "none"
 
+    @field_validator("recurrence")
+    @classmethod
+    def check_recurrence(cls, value):
+        parse_rule(value)  # raises ValueError -> 422
+        return value
+
 # --- NEW: Schema for UPDATING a reminder ---
 class ReminderUpdate(BaseModel):
     """Schema for data we expect when UPDATING a reminder."""
@@ -33,6 +58,17 @@ class ReminderUpdate(BaseModel):
     recurrence: Optional[str] = None
     # We'll add a 'completed' field later if we need it
 
+    @field_validator("recurrence")
+    @classmethod
+    def check_recurrence(cls, value):
+        if value is not None:
+            parse_rule(value)
+        return value
+
+class ReminderBulkUpdate(ReminderUpdate):
+    """One item of a bulk update: the reminder's id plus the fields to change."""
+    id: str
+
 class ReminderPublic(BaseModel):
     """Schema for data we send back to the client."""
     id: str
@@ -43,7 +79,14 @@ class ReminderPublic(BaseModel):
     due_date: date
     due_time: Optional[time] = None
     recurrence: str
+    next_occurrence_at: Optional[datetime] = None
     created_at: datetime
+    revision: int = 0
+
+class ReminderOccurrencePublic(BaseModel):
+    """One concrete occurrence of a (possibly recurring) reminder."""
+    occurs_at: datetime
+    reminder: ReminderPublic
 
 # --- Helper Function ---
 
@@ -58,30 +101,149 @@ def map_reminder_to_public(reminder: Reminder) -> ReminderPublic:
         due_date=reminder.due_date,
         due_time=reminder.due_time,
         recurrence=reminder.recurrence,
-        created_at=reminder.created_at
+        next_occurrence_at=reminder.next_occurrence_at,
+        created_at=reminder.created_at,
+        revision=reminder.revision,
     )
 
+# Raw-document renderer for the fast list path (see fastpath.py)
+REMINDER_VIEW = fastpath.RawView(ReminderPublic)
+
+
+# --- Occurrences ---
+
+def _next_occurrence_of(doc: dict, after: datetime) -> Optional[datetime]:
+    """
+    `next_occurrence` for a raw document. Reminders written before rules
+    were validated may hold recurrence strings we can't parse; those get
+    no next occurrence (so they never fire) instead of failing the batch.
+    """
+    try:
+        return next_occurrence(*schedule_of(doc), after)
+    except ValueError as e:
+        logger.warning("Reminder %s has an unusable recurrence %r: %s", doc["_id"], doc.get("recurrence"), e)
+        return None
+
+async def refresh_next_occurrences(filters: dict, now: datetime, batch_size: int = 1000) -> int:
+    """
+    Recomputes `next_occurrence_at` for every reminder matching `filters`
+    and writes them back in unordered bulk batches. Returns the count.
+    """
+    collection = Reminder.get_motor_collection()
+    cursor = collection.find(filters, {"due_date": 1, "due_time": 1, "recurrence": 1})
+    ops, count = [], 0
+    async for doc in cursor:
+        ops.append(UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {"next_occurrence_at": _next_occurrence_of(doc, now), "updated_at": now}},
+        ))
+        if len(ops) >= batch_size:
+            await collection.bulk_write(ops, ordered=False)
+            count += len(ops)
+            ops = []
+    if ops:
+        await collection.bulk_write(ops, ordered=False)
+        count += len(ops)
+    return count
+
+async def backfill_next_occurrences() -> int:
+    """Fills `next_occurrence_at` on reminders written before it existed."""
+    return await refresh_next_occurrences(
+        {"next_occurrence_at": {"$exists": False}}, datetime.utcnow()
+    )
+
+def _expandable(doc: dict) -> bool:
+    """Whether the recurrence parses (see _next_occurrence_of)."""
+    try:
+        parse_rule(doc.get("recurrence"))
+    except ValueError:
+        return False
+    return True
+
+async def find_upcoming(
+    owner_id: PydanticObjectId,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = None,
+) -> list:
+    """
+    Expands the owner's reminders into occurrences in [start, end),
+    soonest first, as rendered {"occurs_at", "reminder"} rows.
+    `start` defaults to now.
+
+    From now on, only reminders whose `next_occurrence_at` falls before
+    `end` are read, through the owner_next_occurrence index. A window
+    reaching into the past also reads every reminder first due before
+    now (owner_due_date_id), so finished series and past one-time
+    reminders show up there too. The scheduler advances
+    `next_occurrence_at` as it fires, so past values are normally only
+    seconds old. Reading never writes: if the scheduler is off or behind,
+    the real next occurrence of a passed one is worked out here, for
+    this response only.
+    """
+    now = datetime.utcnow()
+    start = start or now
+
+    collection = Reminder.get_motor_collection()
+    owner = {"owner_id": owner_id}
+    sort = [("next_occurrence_at", ASCENDING)]
+
+    # Passed but not advanced yet (normally just fired, or about to be):
+    # their real next occurrence is unknown, so they are always candidates
+    pending = collection.find(
+        {**owner, "next_occurrence_at": {"$lt": now}}, REMINDER_VIEW.projection
+    ).sort(sort)
+
+    # Not `start`: anything due before now is pending (above)
+    due = {"$gte": now}
+    if end is not None:
+        due["$lt"] = end
+    upcoming = collection.find(
+        {**owner, "next_occurrence_at": due}, REMINDER_VIEW.projection
+    ).sort(sort)
+    if limit and end is None and start >= now:
+        # The first N occurrences can only come from the N reminders due soonest
+        upcoming = upcoming.limit(limit)
+
+    queries = [pending.to_list(length=None), upcoming.to_list(length=None)]
+    if start < now:
+        # Anything first due before now may have occurred inside [start, now)
+        past = collection.find(
+            {**owner, "due_date": {"$lt": min(now, end) if end else now}},
+            REMINDER_VIEW.projection,
+        ).sort([("due_date", ASCENDING)])
+        queries.append(past.to_list(length=None))
+
+    pending_docs, upcoming_docs, *past_docs = await asyncio.gather(*queries)
+    for doc in pending_docs:
+        doc["next_occurrence_at"] = _next_occurrence_of(doc, now)
+    docs = {}
+    for doc in chain(pending_docs, upcoming_docs, *past_docs):
+        if doc["_id"] not in docs and _expandable(doc):
+            docs[doc["_id"]] = doc
+
+    occurrences = expand_many(
+        [(doc, *schedule_of(doc)) for doc in docs.values()], start, end, limit=limit
+    )
+    return [
+        {"occurs_at": occurs_at.isoformat(), "reminder": REMINDER_VIEW.to_row(doc)}
+        for occurs_at, doc in occurrences
+    ]
+
 # --- API Endpoints ---
 
 @router.post("/",
     response_model=ReminderPublic,
     status_code=status.HTTP_201_CREATED)
 async def create_reminder(
+    request: Request,
     reminder_in: ReminderCreate,
     current_user: User = Depends(get_current_user)
 ):
     """
     Create a new reminder for one of the user's pets.
     """
-    try:
-        pet_obj_id = PydanticObjectId(reminder_in.pet_id)
-    except Exception:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid Pet ID format.")
-
-    pet = await Pet.get(pet_obj_id)
-    
-    if not pet or pet.owner_id != current_user.id:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, "Pet not found.")
+    pet = await load_owned_pet(request, parse_object_id(reminder_in.pet_id), current_user)
         
     new_reminder = Reminder(
         **reminder_in.model_dump(exclude={"pet_id"}),
@@ -90,6 +252,7 @@ async def create_reminder(
     )
     
     await new_reminder.insert()
+    await bump_version(current_user.id)
     
     return map_reminder_to_public(new_reminder)
 
@@ -97,71 +260,323 @@ async def create_reminder(
 # --- NEW: Get ALL reminders for the logged-in user ---
 @router.get("/all", response_model=List[ReminderPublic])
 async def get_all_my_reminders(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
     current_user: User = Depends(get_current_user)
 ):
     """
     Get all reminders for ALL pets owned by the
-    currently logged-in user.
+    currently logged-in user, soonest first.
+
+    - `limit` returns one page; the next page's cursor comes back in
+      the X-Next-Cursor header (absent on the last page).
+    - `stream=true` sends NDJSON, one reminder per line.
+    - Answers 304 if If-None-Match still matches (see versions.py).
     """
-    reminders = await Reminder.find(
-        Reminder.owner_id == current_user.id
-    ).sort(+Reminder.due_date).to_list()  # Sort by date
-    
-    return [map_reminder_to_public(r) for r in reminders]
+    etag = await list_etag(request, current_user.id)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    filters = {"owner_id": current_user.id}
+    if cursor:
+        last_due, last_id = decode_cursor(cursor)
+        filters.update(keyset_filter("due_date", last_due, last_id, descending=False))
+    # _id breaks ties between reminders on the same day (index: owner_due_date_id)
+    sort = [("due_date", ASCENDING), ("_id", ASCENDING)]
+
+    if settings.FAST_LIST_READS:
+        return with_etag(await fastpath.list_response(
+            Reminder, REMINDER_VIEW, filters, sort,
+            limit=limit, stream=stream, cursor_field="due_date",
+        ), response, etag)
+
+    query = Reminder.find(filters).sort(sort)
+
+    if stream:
+        if limit:
+            query = query.limit(limit)
+        return with_etag(ndjson_response(map_reminder_to_public(r) async for r in query), response, etag)
+
+    if not limit:
+        reminders = await query.to_list()
+        return with_etag([map_reminder_to_public(r) for r in reminders], response, etag)
+
+    # Fetch one extra to know whether another page exists
+    reminders = await query.limit(limit + 1).to_list()
+    if len(reminders) > limit:
+        reminders = reminders[:limit]
+        last = reminders[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.due_date, last.id)
+
+    return with_etag([map_reminder_to_public(r) for r in reminders], response, etag)
+
+
+def _as_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Stored times are naive UTC; aware query params must match that."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@router.get("/upcoming", response_model=List[ReminderOccurrencePublic])
+async def get_upcoming_reminders(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Every occurrence of the user's reminders between `from` (default:
+    now) and `to` (default: one week later), recurrences expanded
+    server-side. Times with an offset are converted to UTC; naive ones
+    are taken as UTC.
+    """
+    start = _as_naive_utc(start) or datetime.utcnow()
+    end = _as_naive_utc(end)
+    end = end or start + timedelta(days=7)
+    if end <= start:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "'to' must be after 'from'.")
+
+    rows = await find_upcoming(current_user.id, start, end, limit=limit)
+    return fastpath.json_response(rows)
 
 
 @router.get("/pet/{pet_id}", response_model=List[ReminderPublic])
 async def get_reminders_for_pet(
+    request: Request,
+    response: Response,
     pet_id: str,
     current_user: User = Depends(get_current_user)
 ):
     """
     Get all reminders for a specific pet.
+    Ownership check and reminder fetch run as one aggregation.
+    Answers 304 if If-None-Match still matches (see versions.py).
     """
-    try:
-        pet_obj_id = PydanticObjectId(pet_id)
-    except Exception:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid Pet ID format.")
+    etag = await list_etag(request, current_user.id)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
 
-    pet = await Pet.get(pet_obj_id)
-    
-    if not pet or pet.owner_id != current_user.id:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, "Pet not found.")
-        
-    reminders = await Reminder.find(
-        Reminder.pet_id == pet.id
-    ).sort(+Reminder.due_date).to_list()
-    
-    return [map_reminder_to_public(r) for r in reminders]
+    fast = settings.FAST_LIST_READS
+    docs = await find_owned_pet_children(
+        Reminder, parse_object_id(pet_id), current_user,
+        sort=[("due_date", ASCENDING)],
+        projection=REMINDER_VIEW.projection if fast else None,
+    )
+    if docs is None:
+        raise pet_not_found()
+
+    if fast:
+        return with_etag(fastpath.rows_response(REMINDER_VIEW, docs), response, etag)
+
+    return with_etag([map_reminder_to_public(Reminder.model_validate(doc)) for doc in docs], response, etag)
+
+
+# --- Bulk Endpoints ---
+# Registered before the /{reminder_id} routes. Each item gets its own
+# result; see bulk.py.
+
+@router.post("/bulk", response_model=BulkResponse)
+async def bulk_create_reminders(
+    body: BulkRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Create many reminders at once (e.g. when onboarding a pet).
+    All referenced pets are checked with one query and the reminders
+    are written with one insert_many.
+    """
+    results = BulkResults()
+    items = bulk.parse_items(ReminderCreate, body.items, results)
+    pet_ids = {index: bulk.parse_id(index, item.pet_id, results, "Pet") for index, item in items}
+    owned = await bulk.owned_ids(Pet, filter(None, pet_ids.values()), current_user.id)
+
+    docs = []
+    for index, item in items:
+        pet_id = pet_ids[index]
+        if pet_id is None:
+            continue
+        if pet_id not in owned:
+            results.fail(index, status.HTTP_404_NOT_FOUND, "Pet not found.")
+            continue
+        reminder = Reminder(
+            **item.model_dump(exclude={"pet_id"}),
+            pet_id=pet_id,
+            owner_id=current_user.id
+        )
+        reminder.refresh_next_occurrence()  # insert_many skips document events
+        docs.append((index, reminder))
+
+    await bulk.insert_many(Reminder, docs, results)
+    await bump_version(current_user.id)
+    return results.response()
+
+
+@router.patch("/bulk", response_model=BulkResponse)
+async def bulk_update_reminders(
+    body: BulkRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Update many reminders at once. Every item is `{"id", ...fields}`.
+    The reminders are loaded with one query (which is also the ownership
+    check), so `next_occurrence_at` can be recomputed, and written back
+    with one bulk_write. Each write only applies if the reminder still
+    has the revision we read; items changed in between get 409.
+    """
+    results = BulkResults()
+    items = bulk.parse_items(ReminderBulkUpdate, body.items, results)
+    ids = {index: bulk.parse_id(index, item.id, results, "Reminder") for index, item in items}
+
+    wanted = list(set(filter(None, ids.values())))
+    reminders = {
+        r.id: r for r in await Reminder.find(
+            {"_id": {"$in": wanted}, "owner_id": current_user.id}
+        ).to_list()
+    }
+
+    # Stored times are milliseconds, so the stamp reads back equal
+    now = datetime.utcnow()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
 
+    ops, seen = [], set()
+    for index, item in items:
+        obj_id = ids[index]
+        if obj_id is None:
+            continue
+        if obj_id not in reminders:
+            results.fail(index, status.HTTP_404_NOT_FOUND, "Reminder not found", obj_id)
+            continue
+        if obj_id in seen:
+            results.fail(index, status.HTTP_409_CONFLICT, "Reminder listed more than once", obj_id)
+            continue
+        seen.add(obj_id)
+
+        reminder = reminders[obj_id]
+        update_data = item.model_dump(exclude_unset=True, exclude={"id"})
+        for key, value in update_data.items():
+            setattr(reminder, key, value)
+        update_data["next_occurrence_at"] = _next_occurrence_of(
+            {"_id": obj_id, "due_date": reminder.due_date, "due_time": reminder.due_time,
+             "recurrence": reminder.recurrence},
+            now,
+        )
+        update_data["updated_at"] = now
+        ops.append((index, obj_id, UpdateOne(
+            {"_id": obj_id, "owner_id": current_user.id, **revision_filter([reminder.revision])},
+            {"$set": bulk.encode(update_data), "$inc": {"revision": 1}},
+        )))
+
+    matched = await bulk.bulk_write(Reminder, ops, results)
+    if matched < len(ops):
+        # Some revision checks failed. Ours are the writes that left
+        # revision + 1 and our stamp; a write that landed after ours
+        # also reads as a conflict, which is what the client should see.
+        pending = [(index, obj_id) for index, obj_id, _ in ops if not results.failed(index)]
+        written = {
+            doc["_id"] async for doc in Reminder.get_motor_collection().find(
+                {"_id": {"$in": [obj_id for _, obj_id in pending]}, "updated_at": now},
+                {"_id": 1, "revision": 1},
+            )
+            if doc.get("revision") == reminders[doc["_id"]].revision + 1
+        }
+        for index, obj_id in pending:
+            if obj_id not in written:
+                results.fail(index, status.HTTP_409_CONFLICT, "Reminder was changed meanwhile; reload it and retry", obj_id)
+    if matched:
+        await bump_version(current_user.id)
+    return results.response()
+
+
+@router.post("/bulk/delete", response_model=BulkResponse)
+async def bulk_delete_reminders(
+    body: BulkDeleteRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Delete many reminders at once.
+    """
+    result = await bulk.bulk_delete(Reminder, body.ids, current_user.id, "Reminder", "reminder")
+    await bump_version(current_user.id)
+    return result
+
+
+# Fields whose change moves next_occurrence_at
+SCHEDULE_FIELDS = frozenset({"due_date", "due_time", "recurrence"})
+
+# Read-then-write attempts for schedule changes racing other writes
+MAX_UPDATE_ATTEMPTS = 3
 
 # --- NEW: Update a specific reminder ---
 @router.put("/{reminder_id}", response_model=ReminderPublic)
 async def update_reminder(
+    request: Request,
+    response: Response,
     reminder_id: str,
     reminder_in: ReminderUpdate,
     current_user: User = Depends(get_current_user)
 ):
     """
-    Update a reminder's details.
+    Update a reminder's details with one find-and-update of only the
+    sent fields, filtered by owner.
+
+    Changing the schedule also moves `next_occurrence_at`, which needs
+    the stored schedule: the reminder is read first and the write only
+    applies if its revision hasn't moved since (retried if it has).
+    With If-Match (the reminder's ETag / revision), a reminder that
+    changed in the meantime is left alone and the answer is 412.
     """
     try:
         obj_id = PydanticObjectId(reminder_id)
     except Exception:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid Reminder ID")
 
-    reminder = await Reminder.get(obj_id)
-    
-    if not reminder or reminder.owner_id != current_user.id:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, "Reminder not found")
-        
+    owned = {"_id": obj_id, "owner_id": current_user.id}
+    expected = if_match_revisions(request)
+    filters = {**owned, **revision_filter(expected)} if expected else owned
     update_data = reminder_in.model_dump(exclude_unset=True)
-    
+    collection = Reminder.get_motor_collection()
+
+    doc = None
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        if not update_data:
+            doc = await collection.find_one(filters)
+            break
+
+        fields = dict(update_data)
+        target = filters
+        if SCHEDULE_FIELDS & fields.keys():
+            current = await collection.find_one(filters)
+            if current is None:
+                break
+            fields["next_occurrence_at"] = _next_occurrence_of({**current, **fields}, datetime.utcnow())
+            target = {**filters, "revision": current.get("revision")}
+        fields["updated_at"] = datetime.utcnow()
+
+        doc = await collection.find_one_and_update(
+            target,
+            {"$set": bulk.encode(fields), "$inc": {"revision": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is not None or target is filters:
+            break
+
+    if doc is None:
+        if not await collection.count_documents(owned, limit=1):
+            raise HTTPException(status.HTTP_404_NOT_FOUND, "Reminder not found")
+        if expected:
+            raise precondition_failed()
+        raise HTTPException(status.HTTP_409_CONFLICT, "Reminder is being changed; try again.")
     if update_data:
-        for key, value in update_data.items():
-            setattr(reminder, key, value)
-        await reminder.save()
+        await bump_version(current_user.id)
 
+    reminder = Reminder.model_validate(doc)
+    response.headers["ETag"] = revision_etag(reminder.revision)
     return map_reminder_to_public(reminder)
 
 
@@ -188,6 +603,8 @@ async def delete_reminder(
     if not reminder or reminder.owner_id != current_user.id:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Reminder not found")
         
+    await record_deletions(current_user.id, "reminder", [reminder.id])
     await reminder.delete()
+    await bump_version(current_user.id)
     
     return DeleteResponse(success=True, message="Reminder deleted successfully")
\ No newline at end of file
@@ -0,0 +1,265 @@
+"""
+In-process reminder scheduler.
+
+One worker (whoever holds the "reminder-scheduler" lease) keeps the
+reminders due within the next few minutes in a heap, read through the
+`next_occurrence` index, and fires them in batches to a sink. Firing
+claims each reminder with a compare-and-set on `next_occurrence_at`, so
+even a worker that lost its lease without noticing can't fire twice.
+Delivery is at-most-once: a batch the sink fails on is logged, not retried.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import socket
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import metrics
+from config import settings
+from models import Reminder, SchedulerLease
+from recurrence import next_occurrence, schedule_of
+from versions import bump_versions
+
+logger = logging.getLogger("petpal.scheduler")
+
+Sink = Callable[[List[dict]], Awaitable[None]]
+
+
+# --- Sinks ---
+
+class LogSink:
+    """Writes fired reminders to the log. The default, and handy in tests."""
+
+    async def __call__(self, batch: List[dict]) -> None:
+        for item in batch:
+            logger.info("Reminder due: %s (%s) at %s", item["title"], item["reminder_id"], item["occurs_at"])
+
+class WebhookSink:
+    """POSTs each batch as a JSON array to a (local) webhook."""
+
+    def __init__(self, http_client, url: str):
+        self.http_client = http_client
+        self.url = url
+
+    async def __call__(self, batch: List[dict]) -> None:
+        response = await self.http_client.post(self.url, json=batch)
+        response.raise_for_status()
+
+def build_sink(http_client) -> Sink:
+    if settings.REMINDER_SINK == "webhook":
+        if not settings.REMINDER_WEBHOOK_URL:
+            raise RuntimeError("REMINDER_SINK=webhook needs REMINDER_WEBHOOK_URL")
+        return WebhookSink(http_client, settings.REMINDER_WEBHOOK_URL)
+    return LogSink()
+
+
+# --- Leader Lease ---
+
+class Lease:
+    def __init__(self, name: str, ttl: float):
+        self.name = name
+        self.ttl = timedelta(seconds=ttl)
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+
+    async def acquire(self) -> bool:
+        """Takes or renews the lease. False if another worker holds it."""
+        now = datetime.utcnow()
+        try:
+            doc = await SchedulerLease.get_motor_collection().find_one_and_update(
+                {"name": self.name, "$or": [{"holder": self.holder}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"holder": self.holder, "expires_at": now + self.ttl}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Someone else holds a live lease, so our upsert collided
+            return False
+        return doc is not None and doc["holder"] == self.holder
+
+    async def release(self) -> None:
+        await SchedulerLease.get_motor_collection().delete_one(
+            {"name": self.name, "holder": self.holder}
+        )
+
+
+# --- Scheduler ---
+
+class ReminderScheduler:
+
+    def __init__(
+        self,
+        sink: Sink,
+        horizon: float = settings.SCHEDULER_HORIZON_SECONDS,
+        reload_every: float = settings.SCHEDULER_RELOAD_SECONDS,
+        batch_size: int = settings.SCHEDULER_BATCH_SIZE,
+        lease_seconds: float = settings.SCHEDULER_LEASE_SECONDS,
+    ):
+        self.sink = sink
+        self.horizon = timedelta(seconds=horizon)
+        self.reload_every = reload_every
+        self.batch_size = batch_size
+        self.lease = Lease("reminder-scheduler", lease_seconds)
+        self.lease_seconds = lease_seconds
+
+        self._heap: list = []           # (occurs_at, id, doc)
+        self._queued: dict = {}         # id -> occurs_at, to skip duplicates on reload
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self._is_leader = False
+        self._renew_at = 0.0
+        self._reload_at = 0.0
+
+        # Metrics
+        self.fired_total = 0
+        self.batches_total = 0
+        self.claim_conflicts = 0
+        self.sink_errors = 0
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self._recent = deque()          # (monotonic time, fired count) over the last minute
+
+        metrics.register("reminder_scheduler", self.stats)
+
+    # --- Lifecycle ---
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="reminder-scheduler")
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task:
+            await self._task
+        if self._is_leader:
+            await self.lease.release()
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                delay = await self._tick()
+            except Exception:
+                logger.exception("Reminder scheduler tick failed")
+                delay = 1.0
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _tick(self) -> float:
+        """One pass of the loop. Returns how long to sleep."""
+        clock = time.monotonic()
+        if clock >= self._renew_at:
+            was_leader = self._is_leader
+            self._is_leader = await self.lease.acquire()
+            self._renew_at = clock + self.lease_seconds / 3
+            if not self._is_leader:
+                self._heap.clear()
+                self._queued.clear()
+                return self.lease_seconds / 3
+            if not was_leader:
+                self._reload_at = 0.0  # fresh leader: load right away
+
+        now = datetime.utcnow()
+        if clock >= self._reload_at:
+            await self._load_horizon(now)
+            self._reload_at = clock + self.reload_every
+
+        await self._fire_due(now)
+
+        wake = min(self._reload_at, self._renew_at) - time.monotonic()
+        if self._heap:
+            wake = min(wake, (self._heap[0][0] - datetime.utcnow()).total_seconds())
+        return max(0.05, wake)
+
+    # --- Work ---
+
+    async def _load_horizon(self, now: datetime) -> None:
+        """Queues every reminder due before now + horizon (overdue ones included)."""
+        cursor = Reminder.get_motor_collection().find(
+            {"next_occurrence_at": {"$lt": now + self.horizon}},
+            {"owner_id": 1, "pet_id": 1, "title": 1, "notes": 1,
+             "due_date": 1, "due_time": 1, "recurrence": 1, "next_occurrence_at": 1},
+        ).sort("next_occurrence_at", 1)
+
+        async for doc in cursor:
+            occurs_at = doc["next_occurrence_at"]
+            if self._queued.get(doc["_id"]) == occurs_at:
+                continue
+            self._queued[doc["_id"]] = occurs_at
+            heapq.heappush(self._heap, (occurs_at, doc["_id"], doc))
+
+    async def _claim(self, occurs_at: datetime, doc: dict, now: datetime) -> bool:
+        """Advances the reminder past this occurrence, only if nobody else did."""
+        following = next_occurrence(
+            *schedule_of(doc), max(now, occurs_at + timedelta(microseconds=1))
+        )
+        result = await Reminder.get_motor_collection().update_one(
+            {"_id": doc["_id"], "next_occurrence_at": occurs_at},
+            {"$set": {"next_occurrence_at": following, "last_fired_at": occurs_at, "updated_at": now}},
+        )
+        return result.modified_count == 1
+
+    async def _fire_due(self, now: datetime) -> None:
+        while self._heap and self._heap[0][0] <= now:
+            due = []
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                occurs_at, doc_id, doc = heapq.heappop(self._heap)
+                self._queued.pop(doc_id, None)
+                due.append((occurs_at, doc))
+
+            claims = await asyncio.gather(*(self._claim(o, d, now) for o, d in due))
+            batch = []
+            for (occurs_at, doc), claimed in zip(due, claims):
+                if not claimed:
+                    self.claim_conflicts += 1  # edited, deleted or fired elsewhere
+                    continue
+                batch.append({
+                    "reminder_id": str(doc["_id"]),
+                    "owner_id": str(doc["owner_id"]),
+                    "pet_id": str(doc["pet_id"]),
+                    "title": doc["title"],
+                    "notes": doc.get("notes"),
+                    "occurs_at": occurs_at.isoformat(),
+                    "fired_at": now.isoformat(),
+                })
+            if not batch:
+                continue
+            # Claims moved next_occurrence_at, which the reminder lists show
+            await bump_versions(doc["owner_id"] for (_, doc), ok in zip(due, claims) if ok)
+
+            try:
+                await self.sink(batch)
+            except Exception:
+                self.sink_errors += 1
+                logger.exception("Reminder sink failed for a batch of %d", len(batch))
+
+            lags = [(now - occurs_at).total_seconds() for (occurs_at, _), ok in zip(due, claims) if ok]
+            self.last_lag_seconds = max(lags)
+            self.max_lag_seconds = max(self.max_lag_seconds, self.last_lag_seconds)
+            self.fired_total += len(batch)
+            self.batches_total += 1
+            self._recent.append((time.monotonic(), len(batch)))
+
+    # --- Metrics ---
+
+    def stats(self) -> dict:
+        cutoff = time.monotonic() - 60
+        while self._recent and self._recent[0][0] < cutoff:
+            self._recent.popleft()
+        return {
+            "is_leader": self._is_leader,
+            "queued": len(self._heap),
+            "fired_total": self.fired_total,
+            "batches_total": self.batches_total,
+            "fired_per_sec_1m": round(sum(n for _, n in self._recent) / 60, 3),
+            "claim_conflicts": self.claim_conflicts,
+            "sink_errors": self.sink_errors,
+            "last_lag_seconds": round(self.last_lag_seconds, 3),
+            "max_lag_seconds": round(self.max_lag_seconds, 3),
+        }
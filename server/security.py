@@ -1,28 +1,64 @@
+import asyncio
 import bcrypt
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from models import User # <-- We need to fetch the user
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 from jose import JWTError, jwt
 
 # 1. Import our new central settings
 from config import settings
+from cache import TTLCache
+import metrics
 # This tells FastAPI to look for an Authorization header
 # tokenUrl="api/auth/login" just tells the docs "this is the login endpoint"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 
 # 2. --- Password Hashing Functions ---
+# bcrypt is deliberately slow (~100-300 ms per call), so it never runs on
+# the event loop. It goes to a small, fixed-size thread pool instead
+# (bcrypt releases the GIL while hashing).
 
-def hash_password(password: str) -> str:
-    """Hashes a plain-text password using bcrypt."""
+_password_pool = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt",
+)
+_password_jobs_in_flight = 0
+
+def _password_pool_stats() -> dict:
+    workers = settings.PASSWORD_HASH_WORKERS
+    return {
+        "workers": workers,
+        "in_flight": _password_jobs_in_flight,
+        "queue_depth": max(0, _password_jobs_in_flight - workers),
+    }
+
+metrics.register("password_pool", _password_pool_stats)
+
+async def _run_in_password_pool(fn, *args):
+    global _password_jobs_in_flight
+    loop = asyncio.get_running_loop()
+    _password_jobs_in_flight += 1
+    try:
+        return await loop.run_in_executor(_password_pool, fn, *args)
+    finally:
+        _password_jobs_in_flight -= 1
+
+def shutdown_password_pool():
+    """Called from main.lifespan on shutdown."""
+    _password_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _hash_password_sync(password: str) -> str:
     pwd_bytes = password.encode('utf-8')
     salt = bcrypt.gensalt()
     hashed_password = bcrypt.hashpw(password=pwd_bytes, salt=salt)
     return hashed_password.decode('utf-8')
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Checks if a plain-text password matches a stored hash."""
+def _verify_password_sync(plain_password: str, hashed_password: str) -> bool:
     password_bytes = plain_password.encode('utf-8')
     hashed_password_bytes = hashed_password.encode('utf-8')
     
@@ -34,6 +70,16 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     except ValueError:
         return False
 
+async def hash_password(password: str) -> str:
+    """Hashes a plain-text password using bcrypt."""
+    return await _run_in_password_pool(_hash_password_sync, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Checks if a plain-text password matches a stored hash."""
+    return await _run_in_password_pool(
+        _verify_password_sync, plain_password, hashed_password
+    )
+
 
 # 3. --- JWT Token Functions ---
 # (These functions now use the imported 'settings' object)
@@ -53,17 +99,40 @@ def create_access_token(data: dict) -> str:
     )
     return encoded_jwt
 
-def decode_access_token(token: str):
-    """Decodes a JWT token and returns the payload (data)."""
+def _decode_claims(token: str) -> Optional[dict]:
+    """Decodes a JWT token and returns all of its claims."""
     try:
-        payload = jwt.decode(
+        return jwt.decode(
             token, 
             settings.SECRET_KEY, 
             algorithms=[settings.ALGORITHM]
         )
-        return payload.get("sub")
     except JWTError:
         return None
+
+def decode_access_token(token: str):
+    """Decodes a JWT token and returns the payload (data)."""
+    payload = _decode_claims(token)
+    if payload is None:
+        return None
+    return payload.get("sub")
+
+
+# 4. --- Principal Cache ---
+# Maps a raw bearer token to its User, so a warm request skips both
+# the JWT decode and the Mongo lookup. An entry never outlives its token.
+
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+metrics.register("principal_cache", principal_cache.stats)
+
+def invalidate_principal(user_id) -> int:
+    """Drops every cached token that resolves to this user."""
+    return principal_cache.evict_where(lambda user: user.id == user_id)
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     """
     Dependency to get the current user from a JWT token.
@@ -75,12 +144,22 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    email = decode_access_token(token)
+    user = principal_cache.get(token)
+    if user is not None:
+        return user
+
+    payload = _decode_claims(token)
+    email = payload.get("sub") if payload else None
     if email is None:
         raise credentials_exception
         
     user = await User.find_one(User.email == email)
     if user is None:
         raise credentials_exception
+
+    ttl = None
+    if payload.get("exp") is not None:
+        ttl = payload["exp"] - datetime.now(timezone.utc).timestamp()
+    principal_cache.set(token, user, ttl=ttl)
         
     return user
\ No newline at end of file
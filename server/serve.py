@@ -0,0 +1,86 @@
+"""
+Production entry point:
+
+    python serve.py
+
+Runs SERVER_WORKERS uvicorn worker processes (0 = one per CPU this
+process may run on) on SERVER_HOST:SERVER_PORT, with uvloop and
+httptools when they are installed (pip install "uvicorn[standard]").
+`python main.py` is still the single-process dev server with reload.
+
+Workers are started by uvicorn's supervisor as fresh (spawned) processes
+and each runs main.lifespan itself, so every worker opens its own Motor
+client, httpx client and pools; nothing but the database is shared.
+Singleton work (the reminder scheduler, deletion jobs) is coordinated
+through leases and claims in Mongo, so it doesn't run once per worker.
+
+Everything else in-process is per worker: caches, /api/metrics, the
+background refresh/prefetch limits and the upstream circuit breakers
+(so an outage costs up to UPSTREAM_BREAKER_FAILURES failed calls in each
+worker before they have all opened). The one limit meant for the whole
+server, VET_PREFETCH_PER_MINUTE, is split evenly: main() exports the
+resolved SERVER_WORKERS, which the workers read with their settings.
+
+On SIGTERM each worker stops accepting connections, gives in-flight
+requests up to SERVER_DRAIN_SECONDS to finish, then runs the lifespan
+shutdown (scheduler, background jobs, clients) and exits. Give the
+container a stop grace period a few seconds longer than that.
+"""
+import importlib.util
+import logging
+import os
+
+import uvicorn
+
+from config import settings
+
+logger = logging.getLogger("petpal.serve")
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+def default_workers() -> int:
+    """CPUs this process may use (respects affinity / cpusets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def uvicorn_options() -> dict:
+    loop = "uvloop" if _installed("uvloop") else "asyncio"
+    http = "httptools" if _installed("httptools") else "h11"
+    if (loop, http) != ("uvloop", "httptools"):
+        logger.warning("uvloop/httptools missing; running on %s + %s", loop, http)
+
+    return {
+        "host": settings.SERVER_HOST,
+        "port": settings.SERVER_PORT,
+        "workers": settings.SERVER_WORKERS or default_workers(),
+        "loop": loop,
+        "http": http,
+        "lifespan": "on",
+        "timeout_graceful_shutdown": settings.SERVER_DRAIN_SECONDS,
+        "timeout_keep_alive": settings.SERVER_KEEPALIVE_SECONDS,
+        "backlog": settings.SERVER_BACKLOG,
+        "access_log": settings.SERVER_ACCESS_LOG,
+        # Workers import the app by name, from this directory
+        "app_dir": os.path.dirname(os.path.abspath(__file__)),
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    options = uvicorn_options()
+    # Spawned workers inherit the environment, so they see the real count
+    os.environ["SERVER_WORKERS"] = str(options["workers"])
+    logger.info(
+        "Serving %s on %s:%d with %d workers (%s, %s), drain deadline %ds",
+        settings.SERVER_APP, options["host"], options["port"], options["workers"],
+        options["loop"], options["http"], options["timeout_graceful_shutdown"],
+    )
+    uvicorn.run(settings.SERVER_APP, **options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller starts
+    the work, everyone who asks for that key while it's running awaits the
+    same result (or the same exception). Nothing is cached afterwards.
+
+    The work runs in its own task, so a caller that disconnects (and gets
+    cancelled) doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved, even if every waiter left
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
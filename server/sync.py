@@ -0,0 +1,168 @@
+"""
+Delta sync: everything that changed in a user's data since a cursor.
+
+    GET /api/sync              -> a full first sync
+    GET /api/sync?since=<c>    -> only what changed after <c>
+
+Pets, health records and reminders carry `updated_at` (set on every
+write, see models.py) and deletes leave a Tombstone, so each collection
+is read from its (owner_id, updated_at, _id) index starting at the
+cursor. The four streams are merged in (time, _id) order and cut at
+`limit`, so a sync costs O(changes), not O(history).
+
+A client stores the returned `cursor`, and keeps calling while
+`has_more` is true. Responses can repeat a document the client already
+has (see SYNC_OVERLAP_SECONDS); applying them by id makes that harmless.
+"""
+import base64
+import heapq
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from beanie import PydanticObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import BaseModel
+
+from models import User, Pet, HealthRecord, Reminder, Tombstone, TOMBSTONE_RETENTION_SECONDS
+from security import get_current_user
+from pagination import MAX_PAGE_SIZE, keyset_filter
+from pets import PET_VIEW
+from health import RECORD_VIEW
+from reminders import REMINDER_VIEW
+
+# --- Router Setup ---
+router = APIRouter()
+
+DEFAULT_SYNC_LIMIT = 200
+
+# A write stamped just before a sync may only become visible just after
+# it, so a caught-up cursor is held back by this much; the client sees
+# the last few seconds of changes twice rather than missing one.
+SYNC_OVERLAP_SECONDS = 5
+
+_MIN_ID = PydanticObjectId("0" * 24)
+
+
+# --- Schemas ---
+
+class SyncDeletion(BaseModel):
+    type: str  # "pet" | "record" | "reminder"
+    id: str
+    deleted_at: datetime
+
+class SyncResponse(BaseModel):
+    pets: List[Dict[str, Any]] = []
+    records: List[Dict[str, Any]] = []
+    reminders: List[Dict[str, Any]] = []
+    deleted: List[SyncDeletion] = []
+    cursor: str
+    has_more: bool
+
+
+# --- Cursors ---
+# Unlike the list cursors (pagination.py), a sync cursor is a full
+# timestamp: changes are ordered by (updated_at | deleted_at, _id).
+# It also carries when the client's copy was last known complete (its
+# issue time): tombstones are what expire, so that, not the position,
+# decides whether the cursor is still good. A document nobody touched
+# for months must not make its cursor look old.
+
+def encode_sync_cursor(ts: datetime, doc_id: PydanticObjectId, issued_at: datetime) -> str:
+    raw = json.dumps({"t": ts.isoformat(), "id": str(doc_id), "i": issued_at.isoformat()})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_sync_cursor(cursor: str) -> Tuple[datetime, PydanticObjectId, datetime]:
+    """(timestamp, id, issued_at); cursors from before issue times use their timestamp."""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        ts = datetime.fromisoformat(raw["t"])
+        issued_at = datetime.fromisoformat(raw["i"]) if "i" in raw else ts
+        return ts, PydanticObjectId(raw["id"]), issued_at
+    except Exception:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid sync cursor.")
+
+
+# --- Change Streams ---
+
+# (response key, model, timestamp field, projection)
+_SOURCES = (
+    ("pets", Pet, "updated_at", PET_VIEW.projection),
+    ("records", HealthRecord, "updated_at", RECORD_VIEW.projection),
+    ("reminders", Reminder, "updated_at", REMINDER_VIEW.projection),
+    ("deleted", Tombstone, "deleted_at", None),
+)
+
+_VIEWS = {"pets": PET_VIEW, "records": RECORD_VIEW, "reminders": REMINDER_VIEW}
+
+async def _changes(
+    key: str, model, field: str, projection: Optional[dict],
+    owner_id: PydanticObjectId, after: Optional[Tuple[datetime, PydanticObjectId]], limit: int,
+) -> List[tuple]:
+    """Up to `limit` of the owner's changes in `model` after `after`, oldest first."""
+    filters = {"owner_id": owner_id}
+    if after:
+        filters.update(keyset_filter(field, after[0], after[1], descending=False))
+    if projection is not None:
+        projection = {**projection, field: 1}
+    cursor = model.get_motor_collection().find(filters, projection).sort(
+        [(field, 1), ("_id", 1)]
+    ).limit(limit)
+    return [(doc[field], doc["_id"], key, doc) async for doc in cursor]
+
+
+# --- API Endpoint ---
+
+@router.get("/sync", response_model=SyncResponse)
+async def sync(
+    since: Optional[str] = None,
+    limit: int = Query(DEFAULT_SYNC_LIMIT, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Changed and deleted pets, records and reminders since `since` (the
+    `cursor` of the previous response), oldest change first, at most
+    `limit` per call. Without `since`, returns everything (no deletions).
+
+    Answers 410 if `since` was issued longer ago than the tombstone
+    retention: the client may have missed deletes and must start over
+    without `since`.
+    """
+    now = datetime.utcnow()
+    after, issued_at = None, now
+    if since:
+        ts, doc_id, issued_at = decode_sync_cursor(since)
+        after = (ts, doc_id)
+        if issued_at < now - timedelta(seconds=TOMBSTONE_RETENTION_SECONDS):
+            raise HTTPException(status.HTTP_410_GONE, "Sync cursor expired; do a full sync.")
+
+    sources = _SOURCES if after else _SOURCES[:-1]
+    # One extra per stream tells whether anything is left past the page
+    streams = [
+        await _changes(key, model, field, projection, current_user.id, after, limit + 1)
+        for key, model, field, projection in sources
+    ]
+    merged = list(heapq.merge(*streams, key=lambda change: (change[0], change[1])))
+    has_more = len(merged) > limit
+    page = merged[:limit]
+
+    result = SyncResponse(cursor="", has_more=has_more)
+    for _, _, key, doc in page:
+        if key == "deleted":
+            result.deleted.append(SyncDeletion(type=doc["kind"], id=str(doc["doc_id"]), deleted_at=doc["deleted_at"]))
+        else:
+            row = _VIEWS[key].to_row(doc)
+            row["updated_at"] = doc["updated_at"].isoformat()
+            getattr(result, key).append(row)
+
+    if has_more:
+        # Part way through: the client is still only as current as when
+        # this run of pages started
+        last_ts, last_id = page[-1][0], page[-1][1]
+    else:
+        # Caught up: everything up to now has been sent, so the next sync
+        # starts at the overlap horizon however old the last change was
+        last_ts, last_id = now - timedelta(seconds=SYNC_OVERLAP_SECONDS), _MIN_ID
+        issued_at = now
+    result.cursor = encode_sync_cursor(last_ts, last_id, issued_at)
+    return result
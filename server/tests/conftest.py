@@ -0,0 +1,16 @@
+import os
+import sys
+
+# The server modules are imported flat (run from server/), like main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config.Settings() refuses to load without these; none of the tests
+# here talk to MongoDB or Google
+for name, value in {
+    "DATABASE_URL": "mongodb://localhost:27017",
+    "SECRET_KEY": "test-secret",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "GOOGLE_PLACES_API_KEY": "test-key",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,116 @@
+import asyncio
+
+import httpx
+import pytest
+
+import metrics
+import upstream
+from bench import FakePlacesServer
+from config import settings
+from singleflight import SingleFlight
+
+
+@pytest.fixture
+def vets_offline(monkeypatch):
+    """
+    vets with its Mongo tiers swapped for counters: every lookup misses,
+    and each cache write is recorded instead of stored.
+    """
+    import vet_places
+    import vets
+
+    writes = []
+
+    async def cache_miss(query_key, count=True):
+        return None, None
+
+    async def cache_put(query_key, data):
+        writes.append(query_key)
+
+    async def store_nearby(*args):
+        pass
+
+    monkeypatch.setattr(vets, "_cache_get", cache_miss)
+    monkeypatch.setattr(vets, "_cache_put", cache_put)
+    monkeypatch.setattr(vet_places, "store_nearby", store_nearby)
+    monkeypatch.setattr(settings, "VET_LOCAL_INDEX_ENABLED", False)
+    return vets, writes
+
+
+def test_concurrent_misses_share_one_upstream_call(vets_offline, monkeypatch):
+    vets, writes = vets_offline
+
+    async def scenario():
+        async with FakePlacesServer(latency=0.1) as places:
+            monkeypatch.setattr(vets, "GOOGLE_NEARBY_URL", f"{places.url}/nearbysearch/json")
+            client = upstream.build_http_client()
+            try:
+                before = metrics.snapshot()["places_singleflight"]
+                results = await asyncio.gather(
+                    *(vets._get_nearby(client, 51.5007, -0.1246, 5000) for _ in range(500))
+                )
+                after = metrics.snapshot()["places_singleflight"]
+            finally:
+                await client.aclose()
+        return places, results, before, after
+
+    places, results, before, after = asyncio.run(scenario())
+    assert places.requests == 1
+    assert len(writes) == 1
+    assert after["calls"] - before["calls"] == 1
+    assert after["coalesced"] - before["coalesced"] == 499
+    assert after["in_flight"] == 0
+    assert results[0] and all(r == results[0] for r in results)
+
+
+def test_waiters_share_the_exception():
+    async def scenario():
+        flight = SingleFlight()
+        async with FakePlacesServer(latency=0.05, error_rate=1.0) as upstream, httpx.AsyncClient() as client:
+
+            async def fetch():
+                response = await client.get(f"{upstream.url}/nearbysearch/json")
+                response.raise_for_status()
+
+            outcomes = await asyncio.gather(
+                *(flight.do("nearby:x", fetch) for _ in range(20)), return_exceptions=True
+            )
+        return upstream, outcomes
+
+    upstream, outcomes = asyncio.run(scenario())
+    assert upstream.requests == 1
+    assert all(isinstance(o, httpx.HTTPStatusError) for o in outcomes)
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("key", slow))
+        second = asyncio.ensure_future(flight.do("key", slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_nothing_is_cached_after_the_call():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            return calls
+
+        return [await flight.do("key", work) for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [1, 2, 3]
@@ -0,0 +1,102 @@
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+import sync
+from models import TOMBSTONE_RETENTION_SECONDS
+
+RETENTION = timedelta(seconds=TOMBSTONE_RETENTION_SECONDS)
+LONG_AGO = datetime(2020, 1, 1)
+
+
+@pytest.fixture
+def deletions(monkeypatch):
+    """
+    Stands in for the change streams: the owner has only deletions, here
+    in (deleted_at, _id) order; every other stream is empty.
+    """
+    changes = []
+
+    async def fake_changes(key, model, field, projection, owner_id, after, limit):
+        if key != "deleted":
+            return []
+        rows = [
+            (doc["deleted_at"], doc["_id"], key, doc) for doc in changes
+            if after is None or (doc["deleted_at"], doc["_id"]) > tuple(after)
+        ]
+        return rows[:limit]
+
+    monkeypatch.setattr(sync, "_changes", fake_changes)
+    return changes
+
+
+def tombstone(deleted_at: datetime) -> dict:
+    return {"_id": ObjectId(), "kind": "pet", "doc_id": ObjectId(), "deleted_at": deleted_at}
+
+
+def call(since=None, limit=10):
+    user = SimpleNamespace(id=ObjectId())
+    return asyncio.run(sync.sync(since=since, limit=limit, current_user=user))
+
+
+def test_a_caught_up_cursor_moves_to_the_overlap_horizon(deletions):
+    # The last change is far older than the tombstone retention
+    deletions.append(tombstone(LONG_AGO))
+    since = sync.encode_sync_cursor(LONG_AGO - timedelta(days=1), sync._MIN_ID, datetime.utcnow())
+
+    before = datetime.utcnow()
+    result = call(since)
+    assert [d.deleted_at for d in result.deleted] == [LONG_AGO]
+    assert not result.has_more
+
+    ts, doc_id, issued_at = sync.decode_sync_cursor(result.cursor)
+    horizon = timedelta(seconds=sync.SYNC_OVERLAP_SECONDS)
+    assert before - horizon <= ts <= datetime.utcnow() - horizon
+    assert doc_id == sync._MIN_ID
+    assert issued_at >= before
+
+    # ...so the next sync neither expires nor repeats the old change
+    again = call(result.cursor)
+    assert again.deleted == [] and not again.has_more
+
+
+def test_expiry_follows_the_issue_time_not_the_position(deletions):
+    now = datetime.utcnow()
+
+    recent = sync.encode_sync_cursor(LONG_AGO, sync._MIN_ID, now - RETENTION + timedelta(hours=1))
+    assert not call(recent).has_more
+
+    stale = sync.encode_sync_cursor(now, sync._MIN_ID, now - RETENTION - timedelta(hours=1))
+    with pytest.raises(HTTPException) as e:
+        call(stale)
+    assert e.value.status_code == 410
+
+
+def test_cursors_without_an_issue_time_expire_by_their_position(deletions):
+    raw = json.dumps({"t": LONG_AGO.isoformat(), "id": str(sync._MIN_ID)})
+    legacy = base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+    with pytest.raises(HTTPException) as e:
+        call(legacy)
+    assert e.value.status_code == 410
+
+
+def test_pages_keep_the_issue_time_of_their_run(deletions):
+    deletions.extend(tombstone(LONG_AGO + timedelta(days=i)) for i in range(3))
+    issued = datetime.utcnow() - timedelta(days=30)
+    since = sync.encode_sync_cursor(LONG_AGO - timedelta(days=1), sync._MIN_ID, issued)
+
+    first = call(since, limit=2)
+    assert first.has_more
+    ts, doc_id, issued_at = sync.decode_sync_cursor(first.cursor)
+    assert (ts, doc_id) == (deletions[1]["deleted_at"], deletions[1]["_id"])
+    assert issued_at == issued
+
+    last = call(first.cursor, limit=2)
+    assert len(last.deleted) == 1 and not last.has_more
+    assert sync.decode_sync_cursor(last.cursor)[2] > issued
@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import upstream
+from bench import FakePlacesServer
+from config import settings
+
+FAILURES = 3
+RESET_SECONDS = 0.3
+
+
+@pytest.fixture
+def upstream_settings(monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_RETRIES", 0)
+    monkeypatch.setattr(settings, "UPSTREAM_RETRY_BACKOFF_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "UPSTREAM_READ_TIMEOUT", 0.2)
+    monkeypatch.setattr(settings, "UPSTREAM_BREAKER_FAILURES", FAILURES)
+    monkeypatch.setattr(settings, "UPSTREAM_BREAKER_RESET_SECONDS", RESET_SECONDS)
+
+
+def breaker_of(client: httpx.AsyncClient) -> upstream.CircuitBreaker:
+    return client._transport.hosts["127.0.0.1"].breaker
+
+
+def test_breaker_opens_fails_fast_and_recovers(upstream_settings):
+    async def scenario():
+        client = upstream.build_http_client()
+        async with FakePlacesServer(latency=0.05) as fake:
+            url = f"{fake.url}/nearbysearch/json"
+
+            assert (await client.get(url)).status_code == 200
+            assert breaker_of(client).state == "closed"
+
+            # Outage: every failure reaches the server until the breaker opens
+            fake.error_rate = 1.0
+            for _ in range(FAILURES):
+                assert (await client.get(url)).status_code == 503
+            assert breaker_of(client).state == "open"
+
+            # Open: rejected without touching the network
+            sent = fake.requests
+            start = time.perf_counter()
+            with pytest.raises(upstream.UpstreamUnavailable):
+                await client.get(url)
+            assert time.perf_counter() - start < fake.latency
+            assert fake.requests == sent
+
+            # After the reset window one probe goes through and closes it
+            fake.error_rate = 0.0
+            await asyncio.sleep(RESET_SECONDS)
+            assert (await client.get(url)).status_code == 200
+            assert breaker_of(client).state == "closed"
+            assert fake.requests == sent + 1
+        await client.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_timeouts_count_as_failures(upstream_settings):
+    async def scenario():
+        client = upstream.build_http_client()
+        async with FakePlacesServer(latency=1.0) as fake:
+            url = f"{fake.url}/nearbysearch/json"
+            for _ in range(FAILURES):
+                with pytest.raises(httpx.TimeoutException):
+                    await client.get(url)
+            with pytest.raises(upstream.UpstreamUnavailable):
+                await client.get(url)
+            assert breaker_of(client).state == "open"
+        await client.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_failed_probe_reopens(upstream_settings):
+    async def scenario():
+        client = upstream.build_http_client()
+        async with FakePlacesServer(latency=0.01, error_rate=1.0) as fake:
+            url = f"{fake.url}/nearbysearch/json"
+            for _ in range(FAILURES):
+                await client.get(url)
+            await asyncio.sleep(RESET_SECONDS)
+            assert (await client.get(url)).status_code == 503  # the probe
+            assert breaker_of(client).state == "open"
+            with pytest.raises(upstream.UpstreamUnavailable):
+                await client.get(url)
+        await client.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_retries_idempotent_requests(upstream_settings, monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_RETRIES", 2)
+    monkeypatch.setattr(settings, "UPSTREAM_BREAKER_FAILURES", 10)
+
+    async def scenario():
+        client = upstream.build_http_client()
+        async with FakePlacesServer(latency=0.01, error_rate=1.0) as fake:
+            url = f"{fake.url}/nearbysearch/json"
+            assert (await client.get(url)).status_code == 503
+            get_requests = fake.requests
+            assert (await client.post(url)).status_code == 503
+            post_requests = fake.requests - get_requests
+        await client.aclose()
+        return get_requests, post_requests
+
+    assert asyncio.run(scenario()) == (3, 1)
@@ -0,0 +1,236 @@
+"""
+Export and import of a user's whole data set as NDJSON.
+
+Every line is one document: {"type": "pet" | "record" | "reminder", "data": {...}},
+where `data` is the same JSON the list routes return. Pets come first,
+so an import always knows a pet before its records and reminders.
+Records also carry their `attachment_id`: uploaded files stay in the
+shared store, and an imported record is pointed at the same file under
+its own download URL.
+
+Both directions stream: the export is written straight off Motor
+cursors, and the import reads the request body chunk by chunk and
+inserts in batches, so memory stays flat however big the data set is.
+"""
+import json
+from datetime import datetime
+from typing import Callable, Dict, List, Type
+
+from beanie import Document, PydanticObjectId
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from pymongo.errors import BulkWriteError
+
+from models import User, Pet, HealthRecord, Reminder
+from security import get_current_user
+from pagination import NDJSON_MEDIA_TYPE
+from pets import PetCreate, PET_VIEW
+from health import HealthRecordCreate, RECORD_VIEW
+from reminders import ReminderCreate, REMINDER_VIEW
+from versions import bump_version
+import attachments
+
+# --- Router Setup ---
+router = APIRouter()
+
+EXPORT_VERSION = 1
+
+# Documents per insert_many on import, and per cursor batch on export
+BATCH_SIZE = 1000
+
+# A single NDJSON line longer than this is rejected
+MAX_LINE_BYTES = 1024 * 1024
+
+# Only the first few bad lines are reported back in detail
+MAX_REPORTED_ERRORS = 50
+
+
+# --- Schemas ---
+
+class ImportLineError(BaseModel):
+    line: int
+    error: str
+
+class ImportSummary(BaseModel):
+    pets: int = 0
+    records: int = 0
+    reminders: int = 0
+    skipped: int = 0
+    errors: List[ImportLineError] = []
+
+
+# --- Export ---
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, separators=(",", ":"))
+
+@router.get("/export")
+async def export_my_data(current_user: User = Depends(get_current_user)):
+    """
+    Streams all of the user's pets, health records and reminders as NDJSON.
+    """
+    owner = {"owner_id": current_user.id}
+
+    async def lines():
+        yield _dumps({
+            "type": "export",
+            "data": {"version": EXPORT_VERSION, "exported_at": datetime.utcnow().isoformat()},
+        }) + "\n"
+        for kind, model, view, extra in (
+            ("pet", Pet, PET_VIEW, ()),
+            ("record", HealthRecord, RECORD_VIEW, ("attachment_id",)),
+            ("reminder", Reminder, REMINDER_VIEW, ()),
+        ):
+            projection = {**view.projection, **{field: 1 for field in extra}}
+            cursor = model.get_motor_collection().find(
+                owner, projection, batch_size=BATCH_SIZE
+            ).sort("_id", 1)
+            async for doc in cursor:
+                row = view.to_row(doc)
+                for field in extra:
+                    row[field] = doc.get(field)
+                yield _dumps({"type": kind, "data": row}) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": 'attachment; filename="petpal-export.ndjson"'},
+    )
+
+
+# --- Import ---
+
+class _Importer:
+    """
+    Turns export lines into new documents owned by `owner`. Pets get new
+    ids; records and reminders are re-pointed at them. Documents are
+    buffered per collection and written with unordered insert_many.
+    `attachment_url` builds the download URL of a new record's file.
+    """
+
+    def __init__(self, owner: User, attachment_url: Callable[[PydanticObjectId], str]):
+        self.owner = owner
+        self.attachment_url = attachment_url
+        self.summary = ImportSummary()
+        self.pet_ids: Dict[str, PydanticObjectId] = {}  # exported id -> new id
+        self.pending: Dict[Type[Document], List[Document]] = {Pet: [], HealthRecord: [], Reminder: []}
+
+    def error(self, line: int, message: str) -> None:
+        self.summary.skipped += 1
+        if len(self.summary.errors) < MAX_REPORTED_ERRORS:
+            self.summary.errors.append(ImportLineError(line=line, error=message))
+
+    async def add_line(self, number: int, raw: bytes) -> None:
+        if not raw.strip():
+            return
+        try:
+            entry = json.loads(raw)
+            kind, data = entry["type"], entry["data"]
+        except (ValueError, KeyError, TypeError):
+            self.error(number, "Not a valid export line.")
+            return
+
+        try:
+            if kind == "pet":
+                pet = Pet(**PetCreate.model_validate(data).model_dump(), owner_id=self.owner.id)
+                pet.id = PydanticObjectId()
+                if data.get("id"):
+                    self.pet_ids[str(data["id"])] = pet.id
+                await self.add(pet)
+
+            elif kind in ("record", "reminder"):
+                schema, model = (HealthRecordCreate, HealthRecord) if kind == "record" else (ReminderCreate, Reminder)
+                item = schema.model_validate(data)
+                pet_id = self.pet_ids.get(item.pet_id)
+                if pet_id is None:
+                    self.error(number, f"Unknown pet_id {item.pet_id!r}; its pet must come first.")
+                    return
+                doc = model(**item.model_dump(exclude={"pet_id"}), pet_id=pet_id, owner_id=self.owner.id)
+                if kind == "reminder":
+                    doc.refresh_next_occurrence()  # insert_many skips document events
+                else:
+                    await self.link_attachment(doc, data)
+                await self.add(doc)
+
+            elif kind != "export":
+                self.error(number, f"Unknown type {kind!r}.")
+
+        except ValidationError as e:
+            self.error(number, str(e.errors(include_url=False, include_context=False)))
+
+    async def link_attachment(self, record: HealthRecord, data: dict) -> None:
+        """
+        Re-points an exported upload at the imported record. The URL in the
+        export is the old record's; if the file is no longer stored (or the
+        line has no attachment_id) the record is imported without one.
+        """
+        if not attachments.is_upload_url(record.attachment_url):
+            return
+        record.attachment_url = None
+        digest, name = data.get("attachment_id"), data.get("attachment_name")
+        if isinstance(digest, str) and await attachments.claim(digest):
+            record.id = PydanticObjectId()
+            record.attachment_id = digest
+            record.attachment_name = name if isinstance(name, str) else None
+            record.attachment_url = self.attachment_url(record.id)
+
+    async def add(self, doc: Document) -> None:
+        batch = self.pending[type(doc)]
+        batch.append(doc)
+        if len(batch) >= BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not any(self.pending.values()):
+            return
+        # Pets first, so no record or reminder is ever stored without its pet
+        for model, counter in ((Pet, "pets"), (HealthRecord, "records"), (Reminder, "reminders")):
+            docs = self.pending[model]
+            if not docs:
+                continue
+            self.pending[model] = []
+            inserted = len(docs)
+            try:
+                await model.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                failed = len(e.details["writeErrors"])
+                inserted -= failed
+                self.summary.skipped += failed
+            setattr(self.summary, counter, getattr(self.summary, counter) + inserted)
+        await bump_version(self.owner.id)
+
+
+@router.post("/import", response_model=ImportSummary)
+async def import_my_data(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Imports an NDJSON export (from this or another account) into the
+    user's account, as new documents. Bad lines are skipped and reported;
+    everything else is kept. Not atomic: a failed import leaves whatever
+    was inserted before the failure.
+    """
+    importer = _Importer(
+        current_user,
+        lambda record_id: request.url_for("download_attachment", record_id=str(record_id)).path,
+    )
+    buffer = b""
+    number = 0
+
+    async for chunk in request.stream():
+        buffer += chunk
+        *complete, buffer = buffer.split(b"\n")
+        for raw in complete:
+            number += 1
+            await importer.add_line(number, raw)
+        if len(buffer) > MAX_LINE_BYTES:
+            raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"Line {number + 1} is too long.")
+
+    if buffer:
+        number += 1
+        await importer.add_line(number, buffer)
+    await importer.flush()
+
+    return importer.summary
@@ -0,0 +1,250 @@
+"""
+The shared outbound HTTP client (Google Places, the reminder webhook).
+
+`build_http_client()` turns the UPSTREAM_* settings into an
+httpx.AsyncClient with explicit pool limits and per-phase timeouts.
+Every request goes through `ResilientTransport`, which per upstream host:
+
+  - retries idempotent requests (GET/HEAD) on connection errors,
+    timeouts, 429 and 5xx, with jittered exponential backoff;
+  - keeps a circuit breaker that, after enough consecutive failures,
+    fails fast with `UpstreamUnavailable` instead of tying up a
+    connection and a task, then lets a single probe through to test
+    recovery;
+  - records a latency histogram (time to response headers).
+
+All of it is reported under "upstream" in /api/metrics.
+"""
+import asyncio
+import logging
+import random
+import time
+from bisect import bisect_left
+from typing import Dict
+
+import httpx
+
+import metrics
+from config import settings
+
+logger = logging.getLogger("petpal.upstream")
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD"})
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Histogram bucket upper bounds, in milliseconds (plus an overflow bucket)
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class UpstreamUnavailable(httpx.TransportError):
+    """Raised without touching the network while a host's breaker is open."""
+
+
+# --- Circuit Breaker ---
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half_open once `reset_after` seconds have passed, letting one
+    probe request through; half_open -> closed if it succeeds, back to
+    open if it fails.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_after: float):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_after:
+            self.state = self.HALF_OPEN
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning("Upstream breaker opened after %d failures", self.failures)
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def abandon(self) -> None:
+        self._probing = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class LatencyHistogram:
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000
+        self.counts[bisect_left(self.buckets_ms, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+
+    def stats(self) -> dict:
+        labels = [f"le_{b}" for b in self.buckets_ms] + ["le_inf"]
+        return {
+            "count": self.total,
+            "mean_ms": round(self.sum_ms / self.total, 2) if self.total else 0.0,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+# --- Transport ---
+
+class _HostState:
+
+    def __init__(self):
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.UPSTREAM_BREAKER_FAILURES,
+            reset_after=settings.UPSTREAM_BREAKER_RESET_SECONDS,
+        )
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.retries = 0
+        self.errors: Dict[str, int] = {}
+
+    def count_error(self, kind: str) -> None:
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.stats(),
+            "requests": self.requests,
+            "retries": self.retries,
+            "errors": dict(self.errors),
+            "latency": self.latency.stats(),
+        }
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """Wraps a real transport with per-host retries, a breaker and metrics."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, retries: int, backoff: float):
+        self.inner = inner
+        self.retries = retries
+        self.backoff = backoff
+        self.hosts: Dict[str, _HostState] = {}
+
+    def _host(self, request: httpx.Request) -> _HostState:
+        host = request.url.host
+        if host not in self.hosts:
+            self.hosts[host] = _HostState()
+        return self.hosts[host]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = self._host(request)
+        attempts = 1 + (self.retries if request.method in IDEMPOTENT_METHODS else 0)
+
+        for attempt in range(attempts):
+            if not host.breaker.allow():
+                host.count_error("breaker_open")
+                raise UpstreamUnavailable(f"{request.url.host} is unavailable (circuit open)", request=request)
+
+            host.requests += 1
+            start = time.perf_counter()
+            try:
+                response = await self.inner.handle_async_request(request)
+            except (httpx.TimeoutException, httpx.NetworkError) as e:
+                host.latency.observe(time.perf_counter() - start)
+                host.breaker.record_failure()
+                host.count_error(type(e).__name__)
+                if attempt + 1 >= attempts:
+                    raise
+            except BaseException:
+                host.breaker.abandon()  # cancelled mid-request: says nothing about the host
+                raise
+            else:
+                host.latency.observe(time.perf_counter() - start)
+                if response.status_code >= 500:
+                    host.breaker.record_failure()
+                    host.count_error(f"http_{response.status_code}")
+                else:
+                    host.breaker.record_success()
+                if response.status_code not in RETRY_STATUSES or attempt + 1 >= attempts:
+                    return response
+                await response.aclose()
+
+            host.retries += 1
+            # Full jitter, so a burst of failures doesn't retry in lockstep
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+    def stats(self) -> dict:
+        return {host: state.stats() for host, state in self.hosts.items()}
+
+
+# --- Client ---
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (optional: pip install httpx[http2])
+    except ImportError:
+        return False
+    return True
+
+def build_http_client() -> httpx.AsyncClient:
+    http2 = settings.UPSTREAM_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("UPSTREAM_HTTP2 is set but the 'h2' package is missing; using HTTP/1.1")
+        http2 = False
+
+    inner = httpx.AsyncHTTPTransport(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    )
+    transport = ResilientTransport(
+        inner,
+        retries=settings.UPSTREAM_RETRIES,
+        backoff=settings.UPSTREAM_RETRY_BACKOFF_SECONDS,
+    )
+    metrics.register("upstream", transport.stats)
+
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(
+            connect=settings.UPSTREAM_CONNECT_TIMEOUT,
+            read=settings.UPSTREAM_READ_TIMEOUT,
+            write=settings.UPSTREAM_WRITE_TIMEOUT,
+            pool=settings.UPSTREAM_POOL_TIMEOUT,
+        ),
+    )
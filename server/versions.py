@@ -0,0 +1,155 @@
+"""
+Per-user change tracking: change versions and conditional GETs for the
+list routes, and deletion tombstones for delta sync (sync.py).
+
+Every write to a user's pets, health records or reminders bumps their
+ChangeVersion with an atomic $inc. A list response's ETag is derived
+from that version (plus the route and query string), so a client that
+sends it back in If-None-Match gets a 304 after one _id lookup, without
+the data collections being read.
+
+The version is read *before* the data. A write that lands in between
+makes the ETag older than the body, which only costs a refetch later;
+the other order could pin a stale body behind a current ETag.
+"""
+import hashlib
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from beanie import PydanticObjectId
+from fastapi import HTTPException, Request, Response, status
+from pymongo import ReturnDocument, UpdateOne
+
+from models import ChangeVersion, Tombstone, Pet, HealthRecord, Reminder
+
+
+def _collection():
+    return ChangeVersion.get_motor_collection()
+
+async def current_version(owner_id: PydanticObjectId) -> int:
+    doc = await _collection().find_one({"_id": owner_id}, {"version": 1})
+    return doc["version"] if doc else 0
+
+async def bump_version(owner_id: PydanticObjectId) -> int:
+    """Call after any write to the owner's data. Returns the new version."""
+    doc = await _collection().find_one_and_update(
+        {"_id": owner_id},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["version"]
+
+async def bump_versions(owner_ids: Iterable[PydanticObjectId]) -> None:
+    """
+    Bumps several owners at once (e.g. after the scheduler fires a batch).
+    Upserts each one, like bump_version: an owner without a version yet
+    must still move off 0, or their cached lists would never change.
+    """
+    owner_ids = set(owner_ids)
+    if owner_ids:
+        now = datetime.utcnow()
+        await _collection().bulk_write([
+            UpdateOne(
+                {"_id": owner_id},
+                {"$inc": {"version": 1}, "$set": {"updated_at": now}},
+                upsert=True,
+            )
+            for owner_id in owner_ids
+        ], ordered=False)
+
+
+# --- Deletions and updated_at ---
+
+async def record_deletions(
+    owner_id: PydanticObjectId, kind: str, doc_ids: Iterable[PydanticObjectId]
+) -> None:
+    """Leaves a tombstone per deleted document, for delta sync."""
+    now = datetime.utcnow()
+    docs = [
+        {"owner_id": owner_id, "kind": kind, "doc_id": PydanticObjectId(doc_id), "deleted_at": now}
+        for doc_id in set(map(str, doc_ids))
+    ]
+    if docs:
+        await Tombstone.get_motor_collection().insert_many(docs, ordered=False)
+
+async def backfill_updated_at() -> int:
+    """Gives documents written before updated_at existed their created_at."""
+    count = 0
+    for model in (Pet, HealthRecord, Reminder):
+        result = await model.get_motor_collection().update_many(
+            {"updated_at": {"$exists": False}},
+            [{"$set": {"updated_at": "$created_at"}}],
+        )
+        count += result.modified_count
+    return count
+
+
+# --- Conditional GETs ---
+
+async def list_etag(request: Request, owner_id: PydanticObjectId) -> str:
+    """
+    ETag for this request's response: the owner's version, scoped to the
+    path and query string (pages, cursors and formats differ).
+    """
+    version = await current_version(owner_id)
+    scope = f"{owner_id}:{request.url.path}?{request.url.query}"
+    digest = hashlib.blake2b(scope.encode("utf-8"), digest_size=8).hexdigest()
+    return f'W/"{version}-{digest}"'
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """A 304 response if the client already has this version, else None."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    candidates = {tag.strip() for tag in header.split(",")}
+    # Weak comparison: W/"x" and "x" match
+    if "*" in candidates or etag in candidates or etag.removeprefix("W/") in candidates:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return None
+
+def with_etag(result, response: Response, etag: str):
+    """
+    Attaches the ETag to a route's result: directly if the route built
+    its own Response (the fast paths), else through the injected one.
+    """
+    target = result if isinstance(result, Response) else response
+    target.headers["ETag"] = etag
+    return result
+
+
+# --- Conditional writes ---
+# A pet's or reminder's ETag is its `revision`, quoted. An update that
+# sends it back in If-Match only applies if nobody wrote in between.
+
+def revision_etag(revision: int) -> str:
+    return f'"{revision}"'
+
+def precondition_failed() -> HTTPException:
+    return HTTPException(
+        status.HTTP_412_PRECONDITION_FAILED,
+        "Changed since you last read it; reload and try again.",
+    )
+
+def if_match_revisions(request: Request) -> Optional[List[int]]:
+    """
+    The revisions an If-Match header accepts, or None if there is no
+    precondition. Weak and foreign tags never match, so a header made
+    only of those is an immediate 412.
+    """
+    header = request.headers.get("if-match")
+    if not header or header.strip() == "*":
+        return None
+    revisions = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith('"') and tag.endswith('"') and tag[1:-1].isdigit():
+            revisions.append(int(tag[1:-1]))
+    if not revisions:
+        raise precondition_failed()
+    return revisions
+
+def revision_filter(revisions: List[int]) -> dict:
+    # Documents written before revisions existed count as revision 0
+    values = revisions + [None] if 0 in revisions else revisions
+    return {"revision": {"$in": values}}
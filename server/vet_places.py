@@ -0,0 +1,144 @@
+"""
+Local geospatial index of vet clinics.
+
+Every curated Places result is merged into `vet_places` by place_id.
+Each upstream nearby search also records a coverage circle, so a later
+search that falls entirely inside a fresh circle is answered with
+$geoNear on our own data instead of calling Google.
+"""
+import math
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from pymongo import UpdateOne
+
+from config import settings
+from models import VetPlace, VetCoverage
+
+# Google's Nearby Search returns at most this many places per page
+NEARBY_PAGE_SIZE = 20
+
+# Largest coverage circle we look for around a search centre
+_MAX_COVERAGE_RADIUS_M = 50_000
+
+_EARTH_RADIUS_M = 6_371_000
+
+
+def _point(lat: float, lng: float) -> dict:
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+def _distance_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlmb = phi2 - phi1, math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * _EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+# --- Writes ---
+
+async def store_nearby(lat: float, lng: float, radius: int, curated: List[dict]) -> None:
+    """Merges a curated nearby result into the index and records its coverage, if complete."""
+    now = datetime.utcnow()
+    ops = []
+    for place in curated:
+        location = place.get("location") or {}
+        if not place.get("placeId") or "lat" not in location:
+            continue
+        fields = {
+            "name": place.get("name"),
+            "address": place.get("address"),
+            "location": _point(location["lat"], location["lng"]),
+            "rating": place.get("rating"),
+            "user_ratings_total": place.get("userRatingsTotal"),
+            "is_open_now": place.get("isOpenNow"),
+            "updated_at": now,
+        }
+        ops.append(UpdateOne(
+            {"place_id": place["placeId"]},
+            {"$set": {k: v for k, v in fields.items() if v is not None}},
+            upsert=True,
+        ))
+    if ops:
+        await VetPlace.get_motor_collection().bulk_write(ops, ordered=False)
+
+    # A full page means Google may have more vets in there than it gave
+    # us, so only a short page proves the circle is completely covered
+    if len(curated) < NEARBY_PAGE_SIZE:
+        await VetCoverage.get_motor_collection().update_one(
+            {"center": _point(lat, lng), "radius_m": radius},
+            {"$set": {"fetched_at": now}},
+            upsert=True,
+        )
+
+async def store_details(curated: dict) -> None:
+    """Merges a curated details result (phone, website, hours...) into the index."""
+    location = curated.get("location") or {}
+    if not curated.get("placeId") or "lat" not in location:
+        return
+    fields = {
+        "name": curated.get("name"),
+        "address": curated.get("address"),
+        "location": _point(location["lat"], location["lng"]),
+        "rating": curated.get("rating"),
+        "phone": curated.get("phone"),
+        "website": curated.get("website"),
+        "opening_hours": curated.get("openingHours"),
+        "updated_at": datetime.utcnow(),
+    }
+    await VetPlace.get_motor_collection().update_one(
+        {"place_id": curated["placeId"]},
+        {"$set": {k: v for k, v in fields.items() if v is not None}},
+        upsert=True,
+    )
+
+
+# --- Reads ---
+
+async def is_covered(lat: float, lng: float, radius: int) -> bool:
+    """
+    True if a fresh upstream search already covered this whole circle,
+    i.e. some stored circle contains it.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.VET_COVERAGE_MAX_AGE_SECONDS)
+    pipeline = [
+        {"$geoNear": {
+            "near": _point(lat, lng),
+            "distanceField": "distance_m",
+            "maxDistance": _MAX_COVERAGE_RADIUS_M,
+            "query": {"fetched_at": {"$gte": cutoff}, "radius_m": {"$gte": radius}},
+            "spherical": True,
+        }},
+        {"$limit": 10},
+    ]
+    async for circle in VetCoverage.get_motor_collection().aggregate(pipeline):
+        if circle["distance_m"] + radius <= circle["radius_m"]:
+            return True
+    return False
+
+async def nearby_from_index(lat: float, lng: float, radius: int) -> List[dict]:
+    """Nearest known vets within `radius`, in the same shape as the Places route."""
+    pipeline = [
+        {"$geoNear": {
+            "near": _point(lat, lng),
+            "distanceField": "distance_m",
+            "maxDistance": radius,
+            "spherical": True,
+        }},
+        {"$limit": NEARBY_PAGE_SIZE},
+    ]
+    # Opening state is only meaningful while it's recent
+    open_state_cutoff = datetime.utcnow() - timedelta(seconds=settings.VET_CACHE_TTL_SECONDS)
+    results = []
+    async for place in VetPlace.get_motor_collection().aggregate(pipeline):
+        lng_, lat_ = place["location"]["coordinates"]
+        fresh = place.get("updated_at") and place["updated_at"] >= open_state_cutoff
+        results.append({
+            "placeId": place["place_id"],
+            "name": place.get("name"),
+            "address": place.get("address"),
+            "location": {"lat": lat_, "lng": lng_},
+            "rating": place.get("rating"),
+            "userRatingsTotal": place.get("user_ratings_total"),
+            "isOpenNow": place.get("is_open_now", "N/A") if fresh else "N/A",
+        })
+    return results
@@ -1,21 +1,206 @@
+import asyncio
+import logging
+import time
 import httpx
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
-from typing import List
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 # --- Corrected Imports ---
 # No more '..' needed since files are in the same directory
-from models import (
-    VetBooking, VetBookingRequest, User, Pet, VetCache, TokenData,
-)
+from models import VetCache
 from config import settings
-from security import get_current_user # <-- Let's assume you put this in security.py
+from cache import TTLCache
+from singleflight import SingleFlight
+from upstream import UpstreamUnavailable
+import geo
+import metrics
+import vet_places
 
 # --- Router Setup ---
 router = APIRouter()
 auth_scheme = HTTPBearer()
+logger = logging.getLogger("petpal.vets")
+
+
+# --- Two-Tier Cache ---
+# A per-worker LRU sits in front of the Mongo-backed VetCache, so a warm
+# key costs neither a Google call nor a Mongo read. Entries age through
+# three states (see VetCache): FRESH, STALE (served while a background
+# refresh runs) and EXPIRED (served only if Google fails).
+
+FRESH, STALE, EXPIRED = "fresh", "stale", "expired"
+
+memory_cache = TTLCache(
+    maxsize=settings.VET_CACHE_MEMORY_SIZE,
+    ttl=settings.VET_CACHE_MEMORY_TTL_SECONDS,
+)
+cache_counts = {
+    "memory_hits": 0, "mongo_hits": 0, "misses": 0, "local_hits": 0,
+    "stale_served": 0, "fallbacks_served": 0,
+}
+
+def _cache_stats() -> dict:
+    lookups = cache_counts["memory_hits"] + cache_counts["mongo_hits"] + cache_counts["misses"]
+    served = cache_counts["memory_hits"] + cache_counts["mongo_hits"]
+    return {
+        **cache_counts,
+        "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+        "memory": memory_cache.stats(),
+        "refresh": refresher.stats(),
+        "prefetch": {**prefetcher.stats(), "budget": prefetch_budget.stats()},
+    }
+
+metrics.register("vet_cache", _cache_stats)
+
+async def _cache_get(query_key: str, count: bool = True) -> Tuple[Any, Optional[str]]:
+    """
+    Returns (data, state), or (None, None) if we have nothing for this key.
+    Background work passes count=False so it doesn't skew the hit ratio.
+    """
+    counts = cache_counts if count else Counter()
+
+    data = memory_cache.get(query_key)
+    if data is not None:
+        counts["memory_hits"] += 1
+        return data, FRESH
+
+    cached_data = await VetCache.find_one(VetCache.query_key == query_key)
+    if cached_data is None:
+        counts["misses"] += 1
+        return None, None
+
+    now = datetime.utcnow()
+    fresh_until = cached_data.fresh_until or cached_data.expires_at
+    usable_until = cached_data.usable_until or cached_data.expires_at
+    if now < fresh_until:
+        counts["mongo_hits"] += 1
+        # Only fresh data goes to memory, and never for longer than it stays fresh
+        memory_cache.set(query_key, cached_data.data, ttl=(fresh_until - now).total_seconds())
+        return cached_data.data, FRESH
+    if now < usable_until:
+        counts["mongo_hits"] += 1
+        return cached_data.data, STALE
+
+    counts["misses"] += 1
+    return cached_data.data, EXPIRED
+
+async def _cache_put(query_key: str, data) -> None:
+    now = datetime.utcnow()
+    fresh_until = now + timedelta(seconds=settings.VET_CACHE_SOFT_TTL_SECONDS)
+    usable_until = now + timedelta(seconds=settings.VET_CACHE_TTL_SECONDS)
+    expires_at = usable_until + timedelta(seconds=settings.VET_CACHE_FALLBACK_SECONDS)
+    await VetCache.find_one(
+        VetCache.query_key == query_key
+    ).upsert(
+        {"$set": {
+            "data": data,
+            "fresh_until": fresh_until,
+            "usable_until": usable_until,
+            "expires_at": expires_at,
+        }},
+        on_insert=VetCache(
+            query_key=query_key,
+            data=data,
+            fresh_until=fresh_until,
+            usable_until=usable_until,
+            expires_at=expires_at
+        )
+    )
+    memory_cache.set(query_key, data, ttl=min(settings.VET_CACHE_MEMORY_TTL_SECONDS, settings.VET_CACHE_SOFT_TTL_SECONDS))
+
+
+# --- Background Refresh ---
+
+class BackgroundRefresher:
+    """
+    Runs cache fills off the request path: stale-entry refreshes and
+    details prefetches. At most one fill per key is queued or running,
+    at most `concurrency` of them run at once, and once `max_pending` are
+    waiting new ones are dropped (the next request simply tries again).
+    """
+
+    def __init__(self, concurrency: int, max_pending: int):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pending: Dict[str, asyncio.Task] = {}
+        self.max_pending = max_pending
+        self.started = 0
+        self.deduped = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def schedule(self, query_key: str, fetch: Callable[[], Awaitable[Any]]) -> None:
+        if query_key in self._pending:
+            self.deduped += 1
+            return
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self.started += 1
+        task = asyncio.create_task(self._run(query_key, fetch))
+        self._pending[query_key] = task
+        task.add_done_callback(lambda _: self._pending.pop(query_key, None))
+
+    async def _run(self, query_key: str, fetch: Callable[[], Awaitable[Any]]) -> None:
+        async with self._semaphore:
+            try:
+                await fetch()
+            except Exception:
+                self.errors += 1
+                logger.warning("Background fetch failed for %s", query_key, exc_info=True)
+
+    async def close(self) -> None:
+        """Cancels queued and running fills. Call before the HTTP client closes."""
+        tasks = list(self._pending.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "started": self.started,
+            "deduped": self.deduped,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+class MinuteBudget:
+    """Allows at most `per_minute` calls in any sliding 60-second window."""
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self._spent = deque()
+        self.denied = 0
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        while self._spent and self._spent[0] <= now - 60:
+            self._spent.popleft()
+        if len(self._spent) >= self.per_minute:
+            self.denied += 1
+            return False
+        self._spent.append(now)
+        return True
+
+    def stats(self) -> dict:
+        return {"spent_1m": len(self._spent), "per_minute": self.per_minute, "denied": self.denied}
+
+refresher = BackgroundRefresher(
+    concurrency=settings.VET_REFRESH_CONCURRENCY,
+    max_pending=settings.VET_REFRESH_QUEUE_SIZE,
+)
+prefetcher = BackgroundRefresher(
+    concurrency=settings.VET_PREFETCH_CONCURRENCY,
+    max_pending=settings.VET_PREFETCH_TOP_K * settings.VET_PREFETCH_CONCURRENCY * 4,
+)
+# The budget is for the whole server; each of serve.py's workers gets its share
+prefetch_budget = MinuteBudget(
+    max(1, settings.VET_PREFETCH_PER_MINUTE // max(1, settings.SERVER_WORKERS))
+)
 
 
 # --- Helper Functions (No Changes) ---
@@ -49,8 +234,148 @@ def _curate_details_results(google_response: dict) -> dict:
     }
 
 
+# --- Upstream Fetches ---
+# Each one calls Google, curates the answer, writes it to both cache
+# tiers and merges it into the local vet index. They run through `places_flight`, so concurrent misses for the
+# same key share one upstream call and one cache write.
+
+GOOGLE_NEARBY_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+GOOGLE_DETAILS_URL = "https://places.googleapis.com/v1/places/{place_id}"
+DETAILS_FIELDS = "place_id,name,formatted_address,geometry.location,rating,formatted_phone_number,opening_hours.weekday_text,reviews,website"
+
+places_flight = SingleFlight()
+metrics.register("places_singleflight", places_flight.stats)
+
+async def _fetch_nearby(http_client, query_key: str, lat: float, lng: float, radius: int) -> List[dict]:
+    params = {
+        "location": f"{lat},{lng}",
+        "radius": radius,
+        "type": "veterinary_care",
+        "key": settings.GOOGLE_PLACES_API_KEY,
+    }
+    response = await http_client.get(GOOGLE_NEARBY_URL, params=params)
+    response.raise_for_status()
+    curated_data = _curate_nearby_results(response.json())
+    await _cache_put(query_key, curated_data)
+    await vet_places.store_nearby(lat, lng, radius, curated_data)
+    return curated_data
+
+async def _fetch_details(http_client, query_key: str, place_id: str) -> dict:
+    headers = {
+        "X-Goog-Api-Key": settings.GOOGLE_PLACES_API_KEY,
+        "X-Goog-FieldMask": DETAILS_FIELDS,
+    }
+    response = await http_client.get(GOOGLE_DETAILS_URL.format(place_id=place_id), headers=headers)
+    response.raise_for_status()
+    curated_data = _curate_details_results({"result": response.json()})
+    await _cache_put(query_key, curated_data)
+    await vet_places.store_details(curated_data)
+    return curated_data
+
+
+# --- Cached Lookups ---
+# Fresh entries are served as is; stale ones are served while a refresh
+# runs in the background; past the hard TTL we go to Google, but still
+# fall back to the old entry if that fails (or if its breaker is open).
+
+def _upstream_error(e: Exception, detail: str) -> HTTPException:
+    """Maps a failed upstream call to the error the client sees."""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, httpx.HTTPStatusError):
+        return HTTPException(status_code=e.response.status_code, detail=detail)
+    if isinstance(e, UpstreamUnavailable):
+        return HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "Google Places is temporarily unavailable")
+    if isinstance(e, httpx.TimeoutException):
+        return HTTPException(status.HTTP_504_GATEWAY_TIMEOUT, "Google Places timed out")
+    if isinstance(e, httpx.RequestError):
+        return HTTPException(status.HTTP_502_BAD_GATEWAY, "Could not reach Google Places")
+    return HTTPException(status_code=500, detail=str(e))
+
+async def _get_nearby(http_client, lat: float, lng: float, radius: int) -> List[dict]:
+    # Snap the GPS fix to a geohash cell sized to the radius, so everyone
+    # searching from the same neighbourhood shares one cache entry
+    cell, cell_lat, cell_lng = geo.snap(lat, lng, radius)
+    query_key = f"nearby:{cell}:{radius}"
+    fetch = lambda: places_flight.do(
+        query_key, lambda: _fetch_nearby(http_client, query_key, cell_lat, cell_lng, radius)
+    )
+
+    cached_data, state = await _cache_get(query_key)
+    if state == FRESH:
+        return cached_data
+    if state == STALE:
+        cache_counts["stale_served"] += 1
+        refresher.schedule(query_key, fetch)
+        return cached_data
+
+    # An earlier, wider search may already have brought in every vet in
+    # this circle; then our own 2dsphere index can answer it
+    if settings.VET_LOCAL_INDEX_ENABLED and await vet_places.is_covered(cell_lat, cell_lng, radius):
+        local_data = await vet_places.nearby_from_index(cell_lat, cell_lng, radius)
+        cache_counts["local_hits"] += 1
+        await _cache_put(query_key, local_data)
+        return local_data
+
+    try:
+        return await fetch()
+    except Exception as e:
+        if cached_data is not None:
+            # Better an old answer than an error
+            cache_counts["fallbacks_served"] += 1
+            return cached_data
+        raise _upstream_error(e, "Error from Google Places API")
+
+async def _get_details(http_client, place_id: str) -> dict:
+    query_key = f"details:{place_id}"
+    fetch = lambda: places_flight.do(
+        query_key, lambda: _fetch_details(http_client, query_key, place_id)
+    )
+
+    cached_data, state = await _cache_get(query_key)
+    if state == FRESH:
+        return cached_data
+    if state == STALE:
+        cache_counts["stale_served"] += 1
+        refresher.schedule(query_key, fetch)
+        return cached_data
+
+    try:
+        return await fetch()
+    except Exception as e:
+        if cached_data is not None:
+            cache_counts["fallbacks_served"] += 1
+            return cached_data
+        raise _upstream_error(e, "Error from Google Places Details API")
+
+
+# --- Details Prefetch ---
+# Opt-in (VET_PREFETCH_DETAILS): after a nearby search, warm the details
+# of the first few results, so the tap on a map pin is a cache hit.
+# Bounded by the prefetcher's concurrency and a per-minute budget of
+# upstream calls; places that are already cached cost nothing.
+
+async def _warm_details(http_client, place_id: str) -> None:
+    query_key = f"details:{place_id}"
+    _, state = await _cache_get(query_key, count=False)
+    if state == FRESH:
+        return
+    if not prefetch_budget.take():
+        return
+    await places_flight.do(query_key, lambda: _fetch_details(http_client, query_key, place_id))
+
+def _prefetch_details(http_client, places: List[dict]) -> None:
+    for place in places[:settings.VET_PREFETCH_TOP_K]:
+        place_id = place.get("placeId")
+        if place_id:
+            prefetcher.schedule(f"details:{place_id}", lambda p=place_id: _warm_details(http_client, p))
+
+
 # --- API Endpoints (No logic changes, just how client is accessed) ---
 
+# Upper bound on place ids per batch details request
+MAX_DETAILS_BATCH = 20
+
 @router.get("/nearby")
 async def get_nearby_vets(
     request: Request, # <-- Use Request to get app state
@@ -58,43 +383,13 @@ async def get_nearby_vets(
     lng: float = Query(...), 
     radius: int = 5000
 ):
-    query_key = f"nearby:{lat}:{lng}:{radius}"
     # Get the http_client from the app's state (created in main.py)
     http_client = request.app.state.http_client 
-    
-    cached_data = await VetCache.find_one(VetCache.query_key == query_key)
-    if cached_data and cached_data.expires_at > datetime.utcnow():
-        return cached_data.data
-
-    GOOGLE_NEARBY_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    params = {
-        "location": f"{lat},{lng}",
-        "radius": radius,
-        "type": "veterinary_care",
-        "key": settings.GOOGLE_API_KEY,
-    }
 
-    try:
-        response = await http_client.get(GOOGLE_NEARBY_URL, params=params)
-        response.raise_for_status()
-        data = response.json()
-        curated_data = _curate_nearby_results(data)
-        
-        await VetCache.find_one(
-            VetCache.query_key == query_key
-        ).upsert(
-            {"$set": { "data": curated_data, "expires_at": datetime.utcnow() + timedelta(hours=1) }},
-            on_insert=VetCache(
-                query_key=query_key,
-                data=curated_data,
-                expires_at=datetime.utcnow() + timedelta(hours=1)
-            )
-        )
-        return curated_data
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(status_code=e.response.status_code, detail="Error from Google Places API")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    places = await _get_nearby(http_client, lat, lng, radius)
+    if settings.VET_PREFETCH_DETAILS:
+        _prefetch_details(http_client, places)
+    return places
 
 
 @router.get("/details")
@@ -102,55 +397,31 @@ async def get_vet_details(
     request: Request, # <-- Use Request to get app state
     place_id: str = Query(...)
 ):
-    query_key = f"details:{place_id}"
+    """
+    Details for one place, or for several with `place_id=a,b,c`.
+    The batch form answers {"results": [...], "errors": [...]}, so one
+    failing place doesn't fail the others.
+    """
     http_client = request.app.state.http_client # <-- Get client from app state
 
-    cached_data = await VetCache.find_one(VetCache.query_key == query_key)
-    if cached_data and cached_data.expires_at > datetime.utcnow():
-        return cached_data.data
-
-    GOOGLE_DETAILS_URL = f"https://places.googleapis.com/v1/places/{place_id}"
-    fields = "place_id,name,formatted_address,geometry.location,rating,formatted_phone_number,opening_hours.weekday_text,reviews,website"
-    headers = {
-        "X-Goog-Api-Key": settings.GOOGLE_API_KEY,
-        "X-Goog-FieldMask": fields,
-    }
+    place_ids = list(dict.fromkeys(p.strip() for p in place_id.split(",") if p.strip()))
+    if len(place_ids) == 1 and "," not in place_id:
+        return await _get_details(http_client, place_ids[0])
+    if not place_ids:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "place_id is required.")
+    if len(place_ids) > MAX_DETAILS_BATCH:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, f"At most {MAX_DETAILS_BATCH} place ids per request.")
 
-    try:
-        response = await http_client.get(GOOGLE_DETAILS_URL, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        curated_data = _curate_details_results({"result": data})
-        
-        await VetCache.find_one(
-            VetCache.query_key == query_key
-        ).upsert(
-            {"$set": { "data": curated_data, "expires_at": datetime.utcnow() + timedelta(hours=1) }},
-            on_insert=VetCache(
-                query_key=query_key,
-                data=curated_data,
-                expires_at=datetime.utcnow() + timedelta(hours=1)
-            )
-        )
-        return curated_data
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(status_code=e.response.status_code, detail="Error from Google Places Details API")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@router.post("/book", response_model=VetBooking)
-async def book_vet(
-    booking_data: VetBookingRequest,
-    current_user: User = Depends(get_current_user) # <-- Depends on security.py
-):
-    pet = await Pet.get(booking_data.petId)
-    if not pet or pet.ownerId != str(current_user.id):
-        raise HTTPException(status_code=404, detail="Pet not found or does not belong to user")
-    
-    booking = VetBooking(
-        userId=str(current_user.id),
-        **booking_data.model_dump()
+    outcomes = await asyncio.gather(
+        *(_get_details(http_client, p) for p in place_ids), return_exceptions=True
     )
-    await booking.insert()
-    return booking
\ No newline at end of file
+    results, errors = [], []
+    for pid, outcome in zip(place_ids, outcomes):
+        if isinstance(outcome, HTTPException):
+            errors.append({"placeId": pid, "status": outcome.status_code, "detail": outcome.detail})
+        elif isinstance(outcome, Exception):
+            raise outcome
+        else:
+            results.append(outcome)
+    return {"results": results, "errors": errors}
+